@@ -0,0 +1,324 @@
+"""
+Request micro-batching and inference scheduling for TweetMoodAI
+Coalesces concurrent single-tweet predictions into batched model calls and
+runs CPU-bound inference off the asyncio event loop with bounded concurrency
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.monitoring import metrics, current_timings, start_timings, StageTimings
+
+logger = logging.getLogger(__name__)
+
+# Micro-batching configuration
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "True").lower() == "true"
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "5"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "32"))
+
+# Inference executor configuration
+# PyTorch already parallelizes inside each forward pass, so one worker
+# thread is usually enough; extra workers let that many micro-batches (and
+# other requests) run at once, which helps with many small batches
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_MAX_INFLIGHT = int(os.getenv("INFERENCE_MAX_INFLIGHT", "64"))
+INFERENCE_RETRY_AFTER_SECONDS = int(os.getenv("INFERENCE_RETRY_AFTER_SECONDS", "1"))
+
+
+class InferenceOverloadedError(Exception):
+    """Raised when the inference in-flight limit has been reached."""
+
+    def __init__(self, retry_after: int = INFERENCE_RETRY_AFTER_SECONDS):
+        super().__init__("Inference capacity exhausted, please retry later")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for model inference with an in-flight limit.
+
+    Requests are admitted with ``admit()``; once ``max_inflight`` requests are
+    being served, new ones fail fast with InferenceOverloadedError instead of
+    queueing without bound. Work runs in the pool via ``run()`` so the event
+    loop stays free for health checks and metrics.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = INFERENCE_WORKERS,
+        max_inflight: int = INFERENCE_MAX_INFLIGHT
+    ):
+        self.max_workers = max(1, max_workers)
+        self.max_inflight = max_inflight
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def inflight(self) -> int:
+        """Number of requests currently admitted."""
+        return self._inflight
+
+    @contextmanager
+    def admit(self):
+        """
+        Reserve an in-flight slot for the duration of the block.
+
+        Raises:
+            InferenceOverloadedError: If the in-flight limit is reached
+        """
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                metrics.record_rejection()
+                raise InferenceOverloadedError()
+            self._inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Create the thread pool on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="inference"
+                )
+            return self._executor
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Run ``fn(*args)`` in the inference thread pool and await its result.
+
+        The caller's context variables (such as its stage timings) are
+        visible to ``fn``.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(context.run, fn, *args))
+
+    def shutdown(self):
+        """Shut down the thread pool (it is recreated on next use)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+# Global inference executor instance
+inference_executor = InferenceExecutor()
+
+
+# Queued micro-batch item: (text, future, caller's stage timings, enqueue time)
+_Pending = Tuple[str, asyncio.Future, Optional[StageTimings], float]
+
+
+def _fail_stopped(batch: List[_Pending]):
+    """Fail the callers of a batch the stopped micro-batcher will not run."""
+    for _, future, _, _ in batch:
+        if not future.done():
+            future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+
+def _analyze_batch(texts: List[str]) -> List[Dict[str, Any]]:
+    """Run the batched inference engine (imported lazily like in app.main)."""
+    from app.sentiment_analyzer import analyze_batch_optimized
+    return analyze_batch_optimized(texts)
+
+
+class MicroBatcher:
+    """
+    Collects single-text requests arriving within a short window and runs
+    them through the model as one batch.
+
+    The first request of a batch waits at most ``max_wait_ms`` for others to
+    join; a batch is dispatched early once ``max_batch_size`` items are queued.
+    Batches run on ``executor`` so the event loop keeps collecting the next
+    one; up to one batch per executor worker runs at a time, and a collected
+    batch waiting for a free worker takes in requests queued meanwhile. Each
+    caller's future is resolved with its own result, and the
+    batch's stage timings plus the caller's ``queue`` wait are added to the
+    caller's timings.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], List[Dict[str, Any]]] = _analyze_batch,
+        max_batch_size: int = MICROBATCH_MAX_SIZE,
+        max_wait_ms: float = MICROBATCH_MAX_WAIT_MS,
+        executor: Optional[InferenceExecutor] = None
+    ):
+        self.batch_fn = batch_fn
+        self.executor = executor or inference_executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+
+        self._queue: Optional[asyncio.Queue] = None
+        # Set by submit() so the collector can wait for arrivals without
+        # cancelling a pending queue.get() (wait_for may lose its item)
+        self._arrived: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Batches dispatched to the executor and not finished yet
+        self._batches: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self):
+        """Start the collector task on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._arrived = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, text: str) -> Dict[str, Any]:
+        """
+        Queue a text for the next batch and wait for its result.
+
+        Args:
+            text: Validated text to analyze
+
+        Returns:
+            Sentiment analysis result for this text
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future, current_timings(), time.perf_counter()))  # type: ignore[union-attr]
+        self._arrived.set()  # type: ignore[union-attr]
+        return await future
+
+    async def _collect(self) -> List[_Pending]:
+        """Wait for the first item, then gather more until the window closes."""
+        queue = self._queue
+        arrived = self._arrived
+        batch = [await queue.get()]  # type: ignore[union-attr]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_ms / 1000
+        try:
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued without waiting
+                if not queue.empty():  # type: ignore[union-attr]
+                    batch.append(queue.get_nowait())  # type: ignore[union-attr]
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                # Only the wakeup is cancelled on timeout, never a dequeue
+                arrived.clear()  # type: ignore[union-attr]
+                try:
+                    await asyncio.wait_for(arrived.wait(), timeout)  # type: ignore[union-attr]
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Stopped mid-window: collected requests are no longer in the queue
+            _fail_stopped(batch)
+            raise
+
+        # Drop requests whose callers went away while waiting
+        return [item for item in batch if not item[1].done()]
+
+    async def _process(self, batch: List[_Pending]):
+        """Run one batch and resolve every caller's future."""
+        texts = [item[0] for item in batch]
+        # The collector task outlives requests, so each batch times its own stages
+        batch_timings = start_timings()
+        for _, _, timings, enqueued_at in batch:
+            if timings is not None:
+                timings.add("queue", (batch_timings.start - enqueued_at) * 1000)
+        try:
+            results = await self.executor.run(self.batch_fn, texts)
+        except asyncio.CancelledError:
+            _fail_stopped(batch)
+            raise
+        except Exception as e:
+            logger.error(f"Micro-batch inference failed: {e}", exc_info=True)
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        metrics.record_microbatch(len(batch))
+        for (_, future, timings, _), result in zip(batch, results):
+            if timings is not None:
+                timings.merge(batch_timings.stages)
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self):
+        """Collector loop: form batches and dispatch them to free executor workers."""
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        workers = asyncio.Semaphore(self.executor.max_workers)
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                await workers.acquire()
+            except asyncio.CancelledError:
+                _fail_stopped(batch)
+                raise
+            # Requests queued while waiting for a worker join this batch
+            while len(batch) < self.max_batch_size and not queue.empty():  # type: ignore[union-attr]
+                batch.append(queue.get_nowait())  # type: ignore[union-attr]
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                workers.release()
+                continue
+
+            task = loop.create_task(self._process(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+            task.add_done_callback(lambda _: workers.release())
+
+    async def stop(self):
+        """Stop the collector task and fail any requests still queued or running."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        for task in list(self._batches):
+            task.cancel()
+        for task in list(self._batches):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._batches = set()
+
+        if self._queue is not None:
+            while not self._queue.empty():
+                future = self._queue.get_nowait()[1]
+                if not future.done():
+                    future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+        self._worker = None
+        self._queue = None
+        self._arrived = None
+        self._loop = None
+
+
+# Global micro-batcher instance
+batcher = MicroBatcher()
+
+__all__ = [
+    "batcher",
+    "MicroBatcher",
+    "MICROBATCH_ENABLED",
+    "inference_executor",
+    "InferenceExecutor",
+    "InferenceOverloadedError"
+]
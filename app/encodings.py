@@ -0,0 +1,257 @@
+"""
+Request/response encodings for TweetMoodAI prediction endpoints
+MessagePack and Arrow IPC stream bodies are negotiated with the
+Content-Type and Accept headers; JSON stays the default and is rendered
+with orjson when it is installed
+"""
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from fastapi import HTTPException, Request, status
+from fastapi.routing import APIRoute
+from starlette.responses import JSONResponse, Response
+
+# orjson (optional, pip install orjson)
+try:
+    import orjson  # type: ignore
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None  # type: ignore
+
+# MessagePack (optional, pip install msgpack)
+try:
+    import msgpack  # type: ignore
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    msgpack = None  # type: ignore
+
+# Arrow IPC (optional, pip install pyarrow)
+try:
+    import pyarrow as pa  # type: ignore
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+    pa = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+_MEDIA_TYPE_ALIASES = {"application/x-msgpack": MSGPACK_MEDIA_TYPE}
+
+# Sentiment codes (Arrow dictionary indices, compact JSON responses) index this list
+SENTIMENTS = ["positive", "negative", "neutral"]
+SENTIMENT_CODES = {sentiment: code for code, sentiment in enumerate(SENTIMENTS)}
+# Arrow request column holding the tweets (first match)
+ARROW_TEXT_COLUMNS = ["tweets", "tweet_text", "text"]
+# Optional caller id column of Arrow bodies, echoed in Arrow responses
+ARROW_ID_COLUMN = "id"
+
+
+def _media_type(header: Optional[str]) -> str:
+    media_type = (header or "").split(";")[0].strip().lower()
+    return _MEDIA_TYPE_ALIASES.get(media_type, media_type)
+
+
+def _available(media_type: str) -> bool:
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return MSGPACK_AVAILABLE
+    if media_type == ARROW_MEDIA_TYPE:
+        return ARROW_AVAILABLE
+    return media_type == JSON_MEDIA_TYPE
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """
+    Pick the response encoding from an Accept header.
+
+    Args:
+        accept: Accept header value
+
+    Returns:
+        The available media type with the highest quality (the earliest
+        listed on ties), or JSON if none is available
+    """
+    candidates = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type = _media_type(part)
+        quality = 1.0
+        for param in part.split(";")[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0 and _available(media_type):
+            candidates.append((-quality, position, media_type))
+    return min(candidates)[2] if candidates else JSON_MEDIA_TYPE
+
+
+def decode_body(body: bytes, media_type: str) -> Any:
+    """
+    Decode a MessagePack or Arrow request body into the JSON request shape.
+
+    MessagePack bodies carry the same map as the JSON body. Arrow bodies are
+    an IPC stream with a string column named ``tweets`` (or ``tweet_text`` /
+    ``text``).
+
+    Raises:
+        ValueError: If the body cannot be decoded
+    """
+    if media_type == MSGPACK_MEDIA_TYPE:
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack body: {e}")
+
+    if media_type == ARROW_MEDIA_TYPE:
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+        except Exception as e:
+            raise ValueError(f"Invalid Arrow IPC stream: {e}")
+        for name in ARROW_TEXT_COLUMNS:
+            if name in table.column_names:
+                content = {"tweets": table.column(name).to_pylist()}
+                if ARROW_ID_COLUMN in table.column_names:
+                    content["ids"] = table.column(ARROW_ID_COLUMN).to_pylist()
+                return content
+        raise ValueError(f"Arrow body needs one of the columns {ARROW_TEXT_COLUMNS}")
+
+    raise ValueError(f"Unsupported media type: {media_type}")
+
+
+def dumps_json(content: Any) -> bytes:
+    """Compact UTF-8 JSON, with orjson if available (same output as JSONResponse)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by ``dumps_json``.
+
+    Returned directly from hot endpoints, it skips FastAPI's response model
+    validation and ``jsonable_encoder``, so content must already be plain
+    JSON types shaped like the route's ``response_model`` (which still
+    documents the response in OpenAPI).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+def encode_msgpack(content: Dict[str, Any]) -> Response:
+    """MessagePack response with the same shape as the JSON response."""
+    return Response(msgpack.packb(content, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE)
+
+
+def encode_arrow(
+    results: List[Dict[str, Any]],
+    metadata: Dict[str, Any],
+    ids: Optional[List[Union[str, int]]] = None
+) -> Response:
+    """
+    Columnar Arrow IPC stream response.
+
+    One row per tweet in request order with ``sentiment`` (int8 codes into
+    a dictionary of sentiment names), ``confidence`` (float32) and ``tier``.
+    Tweet texts are not echoed. Batch totals are stored as schema metadata.
+
+    Args:
+        results: Per-tweet results
+        metadata: Batch totals
+        ids: Caller ids, one per tweet; added as a leading ``id`` column
+            (int64 if all ids are integers, otherwise strings)
+    """
+    codes = pa.array([SENTIMENT_CODES[result['sentiment']] for result in results], type=pa.int8())
+    tiers = pa.array([result.get('tier') for result in results], type=pa.string())
+    columns = [
+        pa.DictionaryArray.from_arrays(codes, pa.array(SENTIMENTS)),
+        pa.array([result['confidence'] for result in results], type=pa.float32()),
+        tiers.dictionary_encode()
+    ]
+    names = ["sentiment", "confidence", "tier"]
+    if ids is not None:
+        if all(isinstance(id_, int) and not isinstance(id_, bool) for id_ in ids):
+            columns.insert(0, pa.array(ids, type=pa.int64()))
+        else:
+            columns.insert(0, pa.array([str(id_) for id_ in ids], type=pa.string()))
+        names.insert(0, ARROW_ID_COLUMN)
+    batch = pa.RecordBatch.from_arrays(columns, names=names)
+    batch = batch.replace_schema_metadata({key: str(value) for key, value in metadata.items()})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return Response(sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE)
+
+
+class _DecodedBodyRequest(Request):
+    """Request whose binary body is handed to FastAPI as already-parsed JSON."""
+
+    body_media_type: str = JSON_MEDIA_TYPE
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            try:
+                self._json = decode_body(await self.body(), self.body_media_type)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return self._json
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Route that also accepts MessagePack and Arrow request bodies.
+
+    Binary bodies are decoded into the JSON request shape before FastAPI
+    validates them against the endpoint's pydantic model, so validation and
+    the OpenAPI schema are the same as for JSON. Unsupported or unavailable
+    encodings get 415.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request) -> Response:
+            media_type = _media_type(request.headers.get("content-type"))
+            if media_type in (MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE):
+                if not _available(media_type):
+                    raise HTTPException(
+                        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        detail=f"{media_type} is not supported on this server"
+                    )
+                # FastAPI only parses bodies it considers JSON
+                headers = [
+                    (name, b"application/json" if name == b"content-type" else value)
+                    for name, value in request.scope["headers"]
+                ]
+                request = _DecodedBodyRequest({**request.scope, "headers": headers}, request.receive)
+                request.body_media_type = media_type
+            return await handler(request)
+
+        return negotiated_handler
+
+
+__all__ = [
+    "FastJSONResponse",
+    "dumps_json",
+    "NegotiatedRoute",
+    "negotiate_media_type",
+    "decode_body",
+    "encode_msgpack",
+    "encode_arrow",
+    "MSGPACK_MEDIA_TYPE",
+    "ARROW_MEDIA_TYPE",
+    "SENTIMENTS",
+    "SENTIMENT_CODES",
+    "ORJSON_AVAILABLE",
+    "MSGPACK_AVAILABLE",
+    "ARROW_AVAILABLE"
+]
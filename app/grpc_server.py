@@ -0,0 +1,231 @@
+"""
+gRPC server for TweetMoodAI
+Exposes unary and bidirectional-streaming Predict RPCs for service-to-service
+calls. Requests go through the same micro-batcher, inference executor and
+model as the FastAPI app: set GRPC_ENABLED=True to serve gRPC from the API
+process, or run ``python -m app.grpc_server`` as a standalone entry point.
+"""
+import asyncio
+import os
+import time
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+# gRPC (optional, pip install grpcio protobuf). The generated stubs raise
+# RuntimeError or protobuf's VersionError when grpcio/protobuf are too old,
+# so any import failure disables gRPC instead of failing the import.
+try:
+    import grpc  # type: ignore
+    from app.protos import sentiment_pb2, sentiment_pb2_grpc
+    GRPC_AVAILABLE = True
+    GRPC_UNAVAILABLE_REASON = ""
+except Exception as e:
+    GRPC_AVAILABLE = False
+    GRPC_UNAVAILABLE_REASON = f"{type(e).__name__}: {e}"
+    grpc = None  # type: ignore
+    sentiment_pb2 = sentiment_pb2_grpc = None  # type: ignore
+
+from app.batching import InferenceOverloadedError, batcher, inference_executor
+from app.monitoring import metrics
+from app.streaming import parse_record
+
+logger = logging.getLogger(__name__)
+
+if not GRPC_AVAILABLE:
+    logger.info(f"gRPC disabled: {GRPC_UNAVAILABLE_REASON}")
+
+# gRPC configuration
+# Serve gRPC from the FastAPI process (sharing its model and batcher)
+GRPC_ENABLED = os.getenv("GRPC_ENABLED", "False").lower() == "true"
+GRPC_HOST = os.getenv("GRPC_HOST", "0.0.0.0")
+GRPC_PORT = int(os.getenv("GRPC_PORT", "50051"))
+# Tweets a PredictStream call may have in flight before the server stops reading
+GRPC_STREAM_WINDOW = int(os.getenv("GRPC_STREAM_WINDOW", "256"))
+
+
+async def _submit(text: str) -> Dict[str, Any]:
+    """Score one tweet through the shared micro-batcher, with admission control."""
+    with inference_executor.admit():
+        return await batcher.submit(text)
+
+
+def _response(request_id: str, result: Dict[str, Any]) -> "sentiment_pb2.PredictResponse":
+    return sentiment_pb2.PredictResponse(
+        id=request_id,
+        sentiment=result['sentiment'],
+        confidence=round(result['confidence'], 4),
+        label=result['label'],
+        tier=result.get('tier') or ""
+    )
+
+
+if GRPC_AVAILABLE:
+
+    class SentimentServicer(sentiment_pb2_grpc.SentimentServiceServicer):
+        """
+        SentimentService implementation.
+
+        Tweets are validated like /predict and /predict/stream input. Predict
+        maps rejections to gRPC status codes (INVALID_ARGUMENT,
+        RESOURCE_EXHAUSTED, INTERNAL); PredictStream answers them with an
+        ``error`` response and keeps the stream open.
+        """
+
+        def __init__(
+            self,
+            submit: Callable[[str], Awaitable[Dict[str, Any]]] = _submit,
+            stream_window: int = GRPC_STREAM_WINDOW
+        ):
+            self.submit = submit
+            self.stream_window = max(1, stream_window)
+
+        async def Predict(self, request, context):
+            start_time = time.time()
+            _, _, text, error = parse_record(request.tweet_text, 1)
+            if text is None:
+                metrics.record_request("/grpc/Predict", (time.time() - start_time) * 1000, success=False)
+                await context.abort(grpc.StatusCode.INVALID_ARGUMENT, error)
+
+            try:
+                result = await self.submit(text)
+            except InferenceOverloadedError as e:
+                metrics.record_request("/grpc/Predict", (time.time() - start_time) * 1000, success=False)
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+            except Exception as e:
+                logger.error(f"Error in gRPC Predict: {e}", exc_info=True)
+                metrics.record_error("/grpc/Predict", str(e))
+                metrics.record_request("/grpc/Predict", (time.time() - start_time) * 1000, success=False)
+                await context.abort(grpc.StatusCode.INTERNAL, "Internal error while analyzing tweet")
+
+            metrics.record_request(
+                "/grpc/Predict", (time.time() - start_time) * 1000, sentiment=result['sentiment'], success=True
+            )
+            return _response(request.id, result)
+
+        async def PredictStream(self, request_iterator, context):
+            """
+            Score tweets as they arrive and yield responses as they finish.
+
+            At most ``stream_window`` tweets are in flight; beyond that the
+            server stops reading and HTTP/2 flow control pushes back on the
+            client.
+            """
+            responses: asyncio.Queue = asyncio.Queue()
+            window = asyncio.Semaphore(self.stream_window)
+            tasks = set()
+
+            async def score(request):
+                start_time = time.time()
+                _, _, text, error = parse_record(request.tweet_text, 1)
+                result: Optional[Dict[str, Any]] = None
+                if text is not None:
+                    try:
+                        result = await self.submit(text)
+                    except InferenceOverloadedError as e:
+                        error = str(e)
+                    except Exception as e:
+                        logger.error(f"Error in gRPC PredictStream: {e}", exc_info=True)
+                        metrics.record_error("/grpc/PredictStream", str(e))
+                        error = "Internal error while analyzing tweet"
+                metrics.record_request(
+                    "/grpc/PredictStream",
+                    (time.time() - start_time) * 1000,
+                    sentiment=result['sentiment'] if result else None,
+                    success=result is not None
+                )
+                if result is None:
+                    await responses.put(sentiment_pb2.PredictResponse(id=request.id, error=error))
+                else:
+                    await responses.put(_response(request.id, result))
+
+            async def read():
+                try:
+                    async for request in request_iterator:
+                        await window.acquire()
+                        task = asyncio.ensure_future(score(request))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    # Wait for the last tweets before ending the stream
+                    await asyncio.gather(*list(tasks))
+                finally:
+                    responses.put_nowait(None)
+
+            reader = asyncio.ensure_future(read())
+            try:
+                while True:
+                    response = await responses.get()
+                    if response is None:
+                        break
+                    yield response
+                    window.release()
+                await reader
+            finally:
+                reader.cancel()
+                for task in list(tasks):
+                    task.cancel()
+
+
+async def start_grpc_server(
+    host: str = GRPC_HOST,
+    port: int = GRPC_PORT,
+    servicer: Optional["SentimentServicer"] = None
+) -> Tuple["grpc.aio.Server", int]:
+    """
+    Start an asyncio gRPC server on the running event loop.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        servicer: Service implementation (defaults to the shared batcher)
+
+    Returns:
+        Tuple of (started server, bound port); call ``await server.stop(grace)``
+        to stop the server
+
+    Raises:
+        RuntimeError: If grpcio is not installed
+    """
+    if not GRPC_AVAILABLE:
+        raise RuntimeError(
+            f"gRPC is not available ({GRPC_UNAVAILABLE_REASON}). "
+            "Install it with: pip install -r requirements-optional.txt"
+        )
+    server = grpc.aio.server()
+    sentiment_pb2_grpc.add_SentimentServiceServicer_to_server(servicer or SentimentServicer(), server)
+    bound_port = server.add_insecure_port(f"{host}:{port}")
+    await server.start()
+    logger.info(f"gRPC server listening on {host}:{bound_port}")
+    return server, bound_port
+
+
+async def serve():
+    """Standalone entry point: load the model, then serve gRPC until stopped."""
+    from app.sentiment_analyzer import get_model
+    if get_model() is None:
+        logger.warning("⚠️  Model not loaded - will use placeholder")
+    server, _ = await start_grpc_server()
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(5)
+        await batcher.stop()
+        inference_executor.shutdown()
+
+
+__all__ = [
+    "start_grpc_server",
+    "serve",
+    "GRPC_AVAILABLE",
+    "GRPC_ENABLED",
+    "GRPC_PORT"
+]
+if GRPC_AVAILABLE:
+    __all__.append("SentimentServicer")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(serve())
@@ -0,0 +1,175 @@
+"""
+Zero-downtime model hot-swap for TweetMoodAI
+Loads a new model version in the background, warms it up and swaps it in
+while the current model keeps serving. Swaps are triggered by the admin
+endpoint or by a watcher polling models/sentiment_model for new files.
+"""
+import asyncio
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.sentiment_analyzer import (
+    MODEL_PATH,
+    ModelSwapInProgressError,
+    hot_swap_model,
+    model_files_fingerprint
+)
+
+logger = logging.getLogger(__name__)
+
+# Model directory watcher configuration
+MODEL_WATCH_ENABLED = os.getenv("MODEL_WATCH_ENABLED", "False").lower() == "true"
+MODEL_WATCH_INTERVAL_SECONDS = float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "30"))
+MODEL_SWAP_WARMUP = os.getenv("MODEL_SWAP_WARMUP", "True").lower() == "true"
+
+
+class ModelChangeDetector:
+    """
+    Decides when changed model files are ready to load.
+
+    Fed one fingerprint per poll, it reports a change only once the files
+    differ from the loaded version and were unchanged since the previous
+    poll, so a model still being copied into place is never loaded.
+    """
+
+    def __init__(self, fingerprint: str):
+        self.current = fingerprint
+        self.candidate = fingerprint
+
+    def settled_change(self, fingerprint: str) -> bool:
+        """Whether ``fingerprint`` is a new version that has stopped changing."""
+        if fingerprint == self.current or not fingerprint:
+            self.candidate = self.current
+            return False
+        if fingerprint != self.candidate:
+            # Changed since the last poll; wait until it settles
+            self.candidate = fingerprint
+            return False
+        return True
+
+    def accept(self):
+        """Mark the settled version as loaded."""
+        self.current = self.candidate
+
+
+class ModelSwapper:
+    """
+    Runs model hot-swaps in the background and watches the model directory.
+
+    At most one swap runs at a time. The watcher only swaps once the model
+    files have stopped changing for one polling interval, so a model that
+    is still being copied into place is never loaded half-written.
+    """
+
+    def __init__(
+        self,
+        model_path: Path = MODEL_PATH,
+        interval_seconds: float = MODEL_WATCH_INTERVAL_SECONDS,
+        warmup: bool = MODEL_SWAP_WARMUP
+    ):
+        self.model_path = model_path
+        self.interval_seconds = max(0.1, interval_seconds)
+        self.warmup = warmup
+        self.status: Dict[str, Any] = {"state": "idle"}
+
+        self._swap_task: Optional[asyncio.Task] = None
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def swapping(self) -> bool:
+        """Whether a swap is currently running."""
+        return self._swap_task is not None and not self._swap_task.done()
+
+    def request_swap(self, reason: str = "admin") -> bool:
+        """
+        Start a background swap on the running event loop.
+
+        Args:
+            reason: What triggered the swap (reported in ``status``)
+
+        Returns:
+            False if a swap is already running, True otherwise
+        """
+        if self.swapping:
+            return False
+        self.status = {"state": "loading", "reason": reason, "started_at": time.time()}
+        self._swap_task = asyncio.get_running_loop().create_task(self._swap())
+        return True
+
+    async def _swap(self):
+        """Load, warm up and swap in the model off the event loop."""
+        try:
+            # Not the inference executor: loading must not block predictions
+            model_data = await asyncio.to_thread(hot_swap_model, self.warmup)
+        except ModelSwapInProgressError as e:
+            self.status.update(state="skipped", error=str(e), finished_at=time.time())
+            return
+        except Exception as e:
+            logger.error(f"Model hot-swap failed: {e}", exc_info=True)
+            self.status.update(state="failed", error=str(e), finished_at=time.time())
+            return
+
+        if model_data is None:
+            self.status.update(state="failed", error="Model could not be loaded", finished_at=time.time())
+            return
+        self.status.update(
+            state="swapped",
+            version=model_data.get('version'),
+            load_time_ms=model_data.get('load_time_ms'),
+            warmup_ms=model_data.get('warmup_ms'),
+            finished_at=time.time()
+        )
+
+    async def wait(self):
+        """Wait for the running swap, if any, to finish."""
+        if self._swap_task is not None:
+            await asyncio.shield(self._swap_task)
+
+    def start_watching(self):
+        """Start polling the model directory on the running event loop."""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.get_running_loop().create_task(self._watch())
+            logger.info(f"Watching {self.model_path} for new model versions every {self.interval_seconds}s")
+
+    async def _watch(self):
+        """Swap when the model files changed and then stayed unchanged."""
+        detector = ModelChangeDetector(model_files_fingerprint(self.model_path))
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                fingerprint = await asyncio.to_thread(model_files_fingerprint, self.model_path)
+            except OSError as e:
+                logger.warning(f"Could not read {self.model_path}: {e}")
+                continue
+
+            if detector.settled_change(fingerprint) and self.request_swap(reason="watcher"):
+                logger.info(f"New model files detected in {self.model_path}, hot-swapping")
+                detector.accept()
+
+    async def stop(self):
+        """Stop the watcher and wait for a running swap to finish."""
+        if self._watch_task is not None and not self._watch_task.done():
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+        self._watch_task = None
+
+        if self.swapping:
+            await self.wait()
+
+
+# Global model swapper instance
+model_swapper = ModelSwapper()
+
+__all__ = [
+    "model_swapper",
+    "ModelSwapper",
+    "ModelChangeDetector",
+    "MODEL_WATCH_ENABLED",
+    "MODEL_WATCH_INTERVAL_SECONDS"
+]
@@ -0,0 +1,504 @@
+"""
+Background bulk scoring jobs for TweetMoodAI
+Uploaded CSV/JSON/NDJSON files are stored on disk and scored by background
+workers through the batched engine. Job state and NDJSON results are kept
+next to the upload, so jobs outlive the client connection and resume after
+a server restart. Job state on disk is shared by all server processes: any
+worker process can report on any job, and a job is run by whichever process
+claims its lock first.
+"""
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import struct
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.monitoring import metrics
+from app.streaming import encode_record, result_record
+from app.tweet_files import iter_tweet_records
+
+# Advisory file locks (POSIX); they are released automatically if the process dies
+try:
+    import fcntl  # type: ignore
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Bulk job configuration
+JOBS_DIR = Path(os.getenv("JOBS_DIR", str(Path(__file__).parent.parent / "data" / "jobs")))
+# Records scored per inference call
+JOBS_BATCH_SIZE = int(os.getenv("JOBS_BATCH_SIZE", "512"))
+# Jobs scored at the same time
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "1"))
+JOBS_MAX_UPLOAD_MB = float(os.getenv("JOBS_MAX_UPLOAD_MB", "200"))
+# Finished jobs (and their files) are deleted after this many hours
+JOBS_RETENTION_HOURS = float(os.getenv("JOBS_RETENTION_HOURS", "24"))
+# Seconds between scans for unfinished jobs no process is running (e.g. after a worker died)
+JOBS_RESCAN_SECONDS = float(os.getenv("JOBS_RESCAN_SECONDS", "30"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+STATUS_FILE = "job.json"
+RESULTS_FILE = "results.ndjson"
+# Checkpoints (records written, results byte offset) after every sub-batch
+INDEX_FILE = "results.idx"
+LOCK_FILE = "job.lock"
+_INDEX_ENTRY = struct.Struct("<QQ")
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobUploadTooLargeError(ValueError):
+    """Raised when a job upload exceeds JOBS_MAX_UPLOAD_MB."""
+
+
+async def _analyze_with_engine(texts: List[str]) -> List[Dict[str, Any]]:
+    """Score texts with the batched engine on the inference executor."""
+    from app.batching import inference_executor
+    from app.sentiment_analyzer import analyze_batch_optimized
+    return await inference_executor.run(analyze_batch_optimized, texts)
+
+
+def _take(records: Iterator, count: int) -> List:
+    return list(itertools.islice(records, count))
+
+
+class JobManager:
+    """
+    Stores bulk scoring jobs on disk and runs them in background workers.
+
+    Each job lives in its own directory holding the upload, ``job.json``
+    (state and progress), ``results.ndjson`` and ``results.idx``. Progress is
+    saved after every sub-batch together with the results file size, so an
+    interrupted job resumes where it stopped instead of starting over.
+
+    ``job.json`` is the source of truth and is re-read on every lookup, so
+    with several server processes (pre-fork or ``uvicorn --workers``) every
+    process sees every job. Before running a job a worker takes an
+    exclusive lock on its ``job.lock``; the lock dies with its process, and
+    a periodic rescan lets another process resume the job. Without
+    ``fcntl`` (Windows) locks only exclude workers of the same process.
+    """
+
+    def __init__(
+        self,
+        jobs_dir: Path = JOBS_DIR,
+        batch_size: int = JOBS_BATCH_SIZE,
+        concurrency: int = JOBS_CONCURRENCY,
+        max_upload_bytes: int = int(JOBS_MAX_UPLOAD_MB * 1024 * 1024),
+        retention_hours: float = JOBS_RETENTION_HOURS,
+        analyze: Callable[[List[str]], Any] = _analyze_with_engine,
+        rescan_seconds: float = JOBS_RESCAN_SECONDS
+    ):
+        self.jobs_dir = Path(jobs_dir)
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_upload_bytes = max_upload_bytes
+        self.retention_hours = retention_hours
+        self.analyze = analyze
+        self.rescan_seconds = rescan_seconds
+
+        self._queue: Optional[asyncio.Queue] = None
+        # Job ids waiting in this process's queue
+        self._queued: Set[str] = set()
+        # Job ids claimed in this process (the only claims without fcntl)
+        self._claimed: Set[str] = set()
+        self._workers: List[asyncio.Task] = []
+
+    def job_dir(self, job_id: str) -> Path:
+        """Directory of a job (ids are validated to keep paths inside jobs_dir)."""
+        if not _JOB_ID_PATTERN.match(job_id):
+            raise KeyError(job_id)
+        return self.jobs_dir / job_id
+
+    def results_path(self, job_id: str) -> Path:
+        return self.job_dir(job_id) / RESULTS_FILE
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Read a job's state from disk, or None if unknown."""
+        try:
+            path = self.job_dir(job_id) / STATUS_FILE
+        except KeyError:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job's state and progress, or None if unknown."""
+        job = self._load(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if not key.startswith("_")}
+
+    def _save(self, job: Dict[str, Any]):
+        """Write job.json atomically."""
+        path = self.job_dir(job["job_id"]) / STATUS_FILE
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    async def create(
+        self,
+        chunks: AsyncIterator[bytes],
+        file_format: str,
+        filename: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Store an upload and queue it for scoring.
+
+        Args:
+            chunks: Request body chunks, written to disk as they arrive
+            file_format: "csv", "json" or "ndjson"
+            filename: Original file name, if known
+
+        Returns:
+            Public view of the new job
+
+        Raises:
+            JobUploadTooLargeError: If the upload exceeds max_upload_bytes
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        await asyncio.to_thread(job_dir.mkdir, parents=True)
+        input_path = job_dir / f"input.{file_format}"
+
+        size = 0
+        try:
+            f = await asyncio.to_thread(open, input_path, 'wb')
+            try:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise JobUploadTooLargeError(
+                            f"Upload exceeds {self.max_upload_bytes // (1024 * 1024)} MB"
+                        )
+                    # Disk writes stay off the event loop
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            await asyncio.to_thread((job_dir / RESULTS_FILE).touch)
+            await asyncio.to_thread((job_dir / INDEX_FILE).touch)
+        except BaseException:
+            await asyncio.to_thread(shutil.rmtree, job_dir, True)
+            raise
+
+        job = {
+            "job_id": job_id,
+            "state": JOB_QUEUED,
+            "format": file_format,
+            "filename": filename,
+            "upload_bytes": size,
+            "total": None,
+            "records_done": 0,
+            "processed": 0,
+            "errors": 0,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "_results_bytes": 0,
+            "_index_bytes": 0
+        }
+        await asyncio.to_thread(self._save, job)
+        self._enqueue(job_id)
+        logger.info(f"Queued job {job_id} ({file_format}, {size} bytes)")
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def _enqueue(self, job_id: str):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    def _enqueue_unfinished(self):
+        """Queue unfinished jobs on disk that are not queued or running here."""
+        unfinished = []
+        for status_path in self.jobs_dir.glob(f"*/{STATUS_FILE}"):
+            job_id = status_path.parent.name
+            if not _JOB_ID_PATTERN.match(job_id) or job_id in self._queued or job_id in self._claimed:
+                continue
+            job = self._load(job_id)
+            if job is None:
+                logger.warning(f"Skipping unreadable job {job_id}")
+            elif job["state"] not in FINISHED_STATES:
+                unfinished.append(job)
+        for job in sorted(unfinished, key=lambda job: job["created_at"]):
+            self._enqueue(job["job_id"])
+
+    def start(self):
+        """Queue unfinished jobs from disk and start the workers."""
+        if self._workers:
+            return
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.cleanup()
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        self._enqueue_unfinished()
+
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        if self.rescan_seconds > 0:
+            self._workers.append(loop.create_task(self._rescan()))
+
+    async def stop(self):
+        """Stop the workers; running jobs resume on the next start."""
+        for task in self._workers:
+            task.cancel()
+        for task in self._workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        self._queue = None
+        self._queued = set()
+
+    def cleanup(self):
+        """Delete finished jobs older than the retention period."""
+        if self.retention_hours <= 0 or not self.jobs_dir.exists():
+            return
+        cutoff = time.time() - self.retention_hours * 3600
+        for status_path in self.jobs_dir.glob(f"*/{STATUS_FILE}"):
+            job = self._load(status_path.parent.name)
+            if job is None:
+                continue
+            if job.get("state") in FINISHED_STATES and (job.get("finished_at") or 0) < cutoff:
+                shutil.rmtree(status_path.parent, ignore_errors=True)
+
+    async def _rescan(self):
+        """Periodically pick up jobs whose process went away."""
+        while True:
+            await asyncio.sleep(self.rescan_seconds)
+            try:
+                await asyncio.to_thread(self._enqueue_unfinished)
+            except OSError as e:
+                logger.warning(f"Could not scan {self.jobs_dir}: {e}")
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()  # type: ignore[union-attr]
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()  # type: ignore[union-attr]
+            await asyncio.to_thread(self.cleanup)
+
+    def _claim(self, job_id: str) -> Optional[Callable[[], None]]:
+        """
+        Take the job's lock.
+
+        Returns:
+            Function releasing the lock, or None if another worker holds it
+        """
+        if job_id in self._claimed:
+            return None
+        lock_file = None
+        if FCNTL_AVAILABLE:
+            try:
+                lock_file = open(self.job_dir(job_id) / LOCK_FILE, 'a')
+            except OSError:
+                return None
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return None
+        self._claimed.add(job_id)
+
+        def release():
+            self._claimed.discard(job_id)
+            if lock_file is not None:
+                lock_file.close()
+        return release
+
+    async def _run(self, job_id: str):
+        """Claim a job and score it, unless another worker has it or it is finished."""
+        release = self._claim(job_id)
+        if release is None:
+            return
+        try:
+            # Re-read under the lock: another process may have finished it
+            job = self._load(job_id)
+            if job is None or job["state"] in FINISHED_STATES:
+                return
+            try:
+                await self._score(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+                job.update(state=JOB_FAILED, error=str(e), finished_at=time.time())
+                self._save(job)
+        finally:
+            release()
+
+    async def _score(self, job: Dict[str, Any]):
+        """Score a job's upload in sub-batches, appending results as they finish."""
+        job_id = job["job_id"]
+        job_dir = self.job_dir(job_id)
+        input_path = job_dir / f"input.{job['format']}"
+        job.update(state=JOB_RUNNING, started_at=job["started_at"] or time.time())
+        self._save(job)
+
+        try:
+            if job["total"] is None:
+                job["total"] = await asyncio.to_thread(
+                    lambda: sum(1 for _ in iter_tweet_records(input_path, job["format"]))
+                )
+                self._save(job)
+        except ValueError as e:
+            job.update(state=JOB_FAILED, error=str(e), finished_at=time.time())
+            self._save(job)
+            return
+
+        if job["records_done"]:
+            logger.info(f"Resuming job {job_id} at record {job['records_done']}")
+        records = iter_tweet_records(input_path, job["format"])
+        # Skip records already scored before an interruption
+        await asyncio.to_thread(_take, records, job["records_done"])
+
+        with open(job_dir / RESULTS_FILE, 'ab') as results_file, open(job_dir / INDEX_FILE, 'ab') as index_file:
+            # Drop results written after the last saved progress
+            results_file.truncate(job["_results_bytes"])
+            index_file.truncate(job["_index_bytes"])
+            while True:
+                batch = await asyncio.to_thread(_take, records, self.batch_size)
+                if not batch:
+                    break
+                texts = [item[2] for item in batch if item[2] is not None]
+                scored = iter(await self.analyze(texts) if texts else [])
+
+                sentiment_counts: Dict[str, int] = {}
+                lines = []
+                for item in batch:
+                    result = next(scored) if item[2] is not None else None
+                    if result is None:
+                        job["errors"] += 1
+                    else:
+                        job["processed"] += 1
+                        sentiment_counts[result['sentiment']] = sentiment_counts.get(result['sentiment'], 0) + 1
+                    lines.append(encode_record(result_record(item, result)))
+                metrics.record_sentiments(sentiment_counts)
+
+                # One result record per input record
+                job["records_done"] += len(batch)
+                await asyncio.to_thread(self._append_batch, job, results_file, index_file, lines)
+
+        job.update(state=JOB_COMPLETED, finished_at=time.time())
+        await asyncio.to_thread(self._save, job)
+        logger.info(f"Job {job_id} completed: {job['processed']} tweets, {job['errors']} errors")
+
+    def _append_batch(self, job: Dict[str, Any], results_file: BinaryIO, index_file: BinaryIO, lines: List[bytes]):
+        """Append a scored sub-batch and its checkpoint, then save the progress."""
+        results_file.write(b"".join(lines))
+        results_file.flush()
+        job["_results_bytes"] = results_file.tell()
+        index_file.write(_INDEX_ENTRY.pack(job["records_done"], job["_results_bytes"]))
+        index_file.flush()
+        job["_index_bytes"] = index_file.tell()
+        self._save(job)
+
+    def _checkpoint(self, job_id: str, index_bytes: int, offset: int) -> Tuple[int, int]:
+        """
+        Latest checkpoint at or before a result offset.
+
+        Binary search over the fixed-size entries of results.idx.
+
+        Returns:
+            (records before the checkpoint, byte offset in results.ndjson)
+        """
+        best = (0, 0)
+        with open(self.job_dir(job_id) / INDEX_FILE, 'rb') as index_file:
+            low, high = 0, index_bytes // _INDEX_ENTRY.size
+            while low < high:
+                middle = (low + high) // 2
+                index_file.seek(middle * _INDEX_ENTRY.size)
+                entry = _INDEX_ENTRY.unpack(index_file.read(_INDEX_ENTRY.size))
+                if entry[0] <= offset:
+                    best = entry
+                    low = middle + 1
+                else:
+                    high = middle
+        return best
+
+    def read_results(self, job_id: str, offset: int = 0, limit: int = 1000) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Read a page of results.
+
+        The page starts at the nearest sub-batch checkpoint, so reading a
+        page costs at most one sub-batch of skipped records however far into
+        the results it is.
+
+        Args:
+            job_id: Job to read
+            offset: Number of result records to skip
+            limit: Maximum number of records to return
+
+        Returns:
+            Tuple of (records, whether more records exist or may still arrive)
+        """
+        job = self._load(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        # Only read results covered by the last saved progress
+        available = job["_results_bytes"]
+        index, position = self._checkpoint(job_id, job["_index_bytes"], offset)
+        records: List[Dict[str, Any]] = []
+        with open(self.results_path(job_id), 'rb') as f:
+            f.seek(position)
+            while position < available:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                if index >= offset:
+                    if len(records) >= limit:
+                        return records, True
+                    records.append(json.loads(line))
+                index += 1
+        return records, job["state"] not in FINISHED_STATES
+
+    async def iter_results(self, job_id: str, chunk_size: int = 65536) -> AsyncIterator[bytes]:
+        """Stream the results written so far as NDJSON."""
+        job = self._load(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        available = job["_results_bytes"]
+        with open(self.results_path(job_id), 'rb') as f:
+            while available > 0:
+                chunk = await asyncio.to_thread(f.read, min(chunk_size, available))
+                if not chunk:
+                    break
+                available -= len(chunk)
+                yield chunk
+
+
+# Global job manager instance
+job_manager = JobManager()
+
+__all__ = [
+    "job_manager",
+    "JobManager",
+    "JobUploadTooLargeError",
+    "FINISHED_STATES"
+]
@@ -2,15 +2,47 @@
 FastAPI Backend for TweetMoodAI
 Provides API endpoints for tweet sentiment analysis using fine-tuned DistilBERT model
 """
-from fastapi import FastAPI, HTTPException, status
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
+from contextlib import ExitStack
+import asyncio
+import hmac
+import itertools
 import os
+import threading
 import time
 from dotenv import load_dotenv
-from app.monitoring import metrics
+from app.monitoring import metrics, mark_stage, timed_stage, ServerTimingMiddleware
+from app.batching import (
+    batcher,
+    inference_executor,
+    InferenceOverloadedError,
+    MICROBATCH_ENABLED
+)
+from app.encodings import (
+    FastJSONResponse,
+    NegotiatedRoute,
+    negotiate_media_type,
+    encode_msgpack,
+    encode_arrow,
+    MSGPACK_MEDIA_TYPE,
+    ARROW_MEDIA_TYPE,
+    SENTIMENTS,
+    SENTIMENT_CODES
+)
+from app.streaming import (
+    stream_predictions,
+    summarize_predictions,
+    spool_output,
+    iter_spool,
+    DuplexStreamingResponse,
+    NDJSON_MEDIA_TYPE,
+    PLAIN_TEXT_MEDIA_TYPES
+)
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +65,15 @@ except ImportError:
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+# Token required by /admin endpoints (unset = admin endpoints disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Run synthetic batches through the model before /healthz reports ready
+STARTUP_WARMUP_ENABLED = os.getenv("STARTUP_WARMUP_ENABLED", "True").lower() == "true"
+# Serve gRPC from the API process (app.grpc_server is only imported when enabled)
+GRPC_ENABLED = os.getenv("GRPC_ENABLED", "False").lower() == "true"
+
+# Set once the startup warm-up has finished (or was skipped)
+warmup_complete = threading.Event()
 
 app = FastAPI(
     title="TweetMoodAI API",
@@ -53,6 +94,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage latency breakdown (Server-Timing header and /metrics stage histograms)
+app.add_middleware(ServerTimingMiddleware)
+
+@app.exception_handler(InferenceOverloadedError)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloadedError):
+    """Fail fast with 503 and Retry-After when inference capacity is exhausted."""
+    logger.warning(f"Rejecting {request.url.path}: inference capacity exhausted")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Request/Response Models
 class TweetRequest(BaseModel):
     tweet_text: str = Field(
@@ -76,6 +130,7 @@ class SentimentResponse(BaseModel):
     sentiment: str = Field(..., description="Sentiment label: positive, negative, or neutral")
     confidence: float = Field(..., ge=0.0, le=1.0, description="Confidence score between 0 and 1")
     label: str = Field(..., description="Short label: POS, NEG, or NEU")
+    tier: Optional[str] = Field(None, description="Tier that answered: fast (TF-IDF), model (DistilBERT) or placeholder")
     processing_time_ms: Optional[float] = Field(None, description="Processing time in milliseconds")
 
 class BatchTweetRequest(BaseModel):
@@ -85,6 +140,10 @@ class BatchTweetRequest(BaseModel):
         max_items=100, 
         description="List of tweet texts to analyze (max 100 tweets per batch)"
     )
+    ids: Optional[List[Union[str, int]]] = Field(
+        None,
+        description="Optional caller ids, one per tweet, echoed in compact responses"
+    )
     
     @validator('tweets')
     def validate_tweets(cls, v):
@@ -110,18 +169,53 @@ class BatchTweetRequest(BaseModel):
             raise ValueError("No valid tweets found in the list")
         
         return valid_tweets
+    
+    @validator('ids')
+    def validate_ids(cls, v, values):
+        """Validate there is one id per tweet."""
+        tweets = values.get('tweets')
+        if v is not None and tweets is not None and len(v) != len(tweets):
+            raise ValueError(f"ids has {len(v)} entries but tweets has {len(tweets)}")
+        return v
 
 class BatchSentimentResponse(BaseModel):
     results: List[SentimentResponse] = Field(..., description="List of sentiment analysis results")
     total_processed: int = Field(..., description="Total number of tweets processed")
+    unique_processed: Optional[int] = Field(None, description="Unique tweets run through the model (duplicates, cached tweets and fast-tier answers are not counted)")
+    processing_time_ms: float = Field(..., description="Total processing time in milliseconds")
+    average_time_per_tweet_ms: Optional[float] = Field(None, description="Average processing time per tweet")
+
+class CompactBatchResponse(BaseModel):
+    sentiments: List[str] = Field(..., description="Sentiment names indexed by sentiment_codes")
+    sentiment_codes: List[int] = Field(..., description="Sentiment code per tweet, in request order")
+    confidences: List[float] = Field(..., description="Confidence per tweet, in request order")
+    ids: Optional[List[Union[str, int]]] = Field(None, description="Caller ids from the request, if given")
+    total_processed: int = Field(..., description="Total number of tweets processed")
+    unique_processed: Optional[int] = Field(None, description="Unique tweets run through the model (duplicates, cached tweets and fast-tier answers are not counted)")
     processing_time_ms: float = Field(..., description="Total processing time in milliseconds")
     average_time_per_tweet_ms: Optional[float] = Field(None, description="Average processing time per tweet")
 
+def _result_dict(tweet_text: str, result: dict, processing_time_ms: Optional[float] = None) -> dict:
+    """
+    SentimentResponse as a plain dict for FastJSONResponse.
+    
+    Requests are validated by their pydantic models; engine results are
+    trusted, so hot endpoints skip building and re-validating response models.
+    """
+    return {
+        "tweet_text": tweet_text,
+        "sentiment": result['sentiment'],
+        "confidence": round(float(result['confidence']), 4),
+        "label": result['label'],
+        "tier": result.get('tier'),
+        "processing_time_ms": processing_time_ms
+    }
+
 # Root endpoint
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
-    from app.sentiment_analyzer import get_model
+    from app.sentiment_analyzer import get_model, get_inference_engine
     model_data = get_model()
     
     return {
@@ -130,13 +224,20 @@ async def root():
         "status": "running",
         "model": "DistilBERT-base-uncased",
         "model_loaded": model_data is not None,
+        "inference_engine": get_inference_engine(model_data),
         "endpoints": {
             "predict": "/predict",
             "predict_batch": "/predict/batch",
+            "predict_stream": "/predict/stream",
+            "predict_summary": "/predict/summary",
+            "predict_file": "/predict/file",
+            "ws_predict": "/ws/predict (WebSocket)",
+            "jobs": "/jobs",
             "analyze": "/analyze (deprecated)",
             "analyze_batch": "/analyze/batch (deprecated)",
             "health": "/health",
             "healthz": "/healthz",
+            "reload_model": "/admin/reload-model (admin)",
             "docs": "/docs"
         }
     }
@@ -146,12 +247,16 @@ async def root():
 async def health_check():
     """Health check endpoint with detailed status."""
     try:
-        from app.sentiment_analyzer import get_model
+        from app.sentiment_analyzer import get_model, get_inference_engine
         model_data = get_model()
         
         return {
             "status": "healthy",
             "model_loaded": model_data is not None,
+            "inference_engine": get_inference_engine(model_data),
+            "model_version": model_data.get('version') if model_data else None,
+            "model_loaded_at": model_data.get('loaded_at') if model_data else None,
+            "model_load_time_ms": model_data.get('load_time_ms') if model_data else None,
             "timestamp": time.time(),
             "version": "1.0.0"
         }
@@ -183,6 +288,12 @@ async def healthz():
                 content={"status": "unhealthy", "reason": "Model not loaded"}
             )
         
+        if not warmup_complete.is_set():
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"status": "unhealthy", "reason": "Warming up"}
+            )
+        
         return {"status": "ok"}
     except Exception as e:
         logger.error(f"Healthz check failed: {e}")
@@ -197,7 +308,8 @@ async def predict_sentiment(request: TweetRequest):
     """
     Predict sentiment of a single tweet using fine-tuned DistilBERT model.
     
-    This endpoint is optimized for low latency inference.
+    This endpoint is optimized for low latency inference. Concurrent requests
+    are coalesced into micro-batches (see MICROBATCH_* settings).
     
     Args:
         request: JSON payload with tweet_text field (1-1000 characters)
@@ -222,14 +334,23 @@ async def predict_sentiment(request: TweetRequest):
             "processing_time_ms": 45.2
         }
         ```
+    
+    The Server-Timing response header breaks the latency down by stage
+    (validation, queue, tokenize, forward, softmax, serialize, total).
     """
+    # Request parsing and validation ends when the handler starts
+    mark_stage("validation")
     start_time = time.time()
     
     try:
-        from app.sentiment_analyzer import analyze_text
-        
-        # Analyze sentiment using trained model
-        result = analyze_text(request.tweet_text)
+        # Analyze sentiment using trained model (off the event loop)
+        with inference_executor.admit():
+            if MICROBATCH_ENABLED:
+                # Share a forward pass with concurrent requests
+                result = await batcher.submit(request.tweet_text)
+            else:
+                from app.sentiment_analyzer import analyze_text
+                result = await inference_executor.run(analyze_text, request.tweet_text)
         
         # Calculate processing time
         processing_time = (time.time() - start_time) * 1000  # Convert to milliseconds
@@ -242,14 +363,12 @@ async def predict_sentiment(request: TweetRequest):
             success=True
         )
         
-        return SentimentResponse(
-            tweet_text=request.tweet_text,
-            sentiment=result['sentiment'],
-            confidence=round(result['confidence'], 4),
-            label=result['label'],
-            processing_time_ms=round(processing_time, 2)
-        )
+        with timed_stage("serialize"):
+            return FastJSONResponse(_result_dict(request.tweet_text, result, round(processing_time, 2)))
         
+    except InferenceOverloadedError:
+        metrics.record_request("/predict", (time.time() - start_time) * 1000, success=False)
+        raise
     except ValueError as e:
         logger.warning(f"Validation error: {e}")
         metrics.record_error("/predict", str(e))
@@ -268,16 +387,42 @@ async def predict_sentiment(request: TweetRequest):
         )
 
 # Batch prediction endpoint (optimized for efficiency)
-@app.post("/predict/batch", response_model=BatchSentimentResponse, status_code=status.HTTP_200_OK)
-async def predict_batch(request: BatchTweetRequest):
+# MessagePack and Arrow bodies are accepted alongside JSON
+batch_router = APIRouter(route_class=NegotiatedRoute)
+
+@batch_router.post(
+    "/predict/batch",
+    response_model=Union[BatchSentimentResponse, CompactBatchResponse],
+    status_code=status.HTTP_200_OK,
+    responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}, ARROW_MEDIA_TYPE: {}}}}
+)
+async def predict_batch(
+    request: BatchTweetRequest,
+    http_request: Request,
+    format: Optional[str] = Query(None, description="Set to compact for parallel arrays of sentiment codes and confidences")
+):
     """
     Predict sentiment of multiple tweets in batch (optimized for efficiency).
     
     Processes up to 100 tweets per request. Use this endpoint for analyzing
     multiple tweets efficiently.
     
+    The body may also be sent as MessagePack (``Content-Type:
+    application/msgpack``, same map as JSON) or as an Arrow IPC stream with
+    a ``tweets`` string column and an optional ``id`` column
+    (``application/vnd.apache.arrow.stream``). The response encoding follows
+    the Accept header: MessagePack has the JSON shape; Arrow is columnar
+    (``id`` when ids were sent, ``sentiment`` dictionary codes,
+    ``confidence``, ``tier``) without the tweet texts, with the totals in
+    the schema metadata. JSON is the default.
+    
+    With ``format=compact`` the tweets are not echoed back: the response
+    holds parallel ``sentiment_codes`` and ``confidences`` arrays in request
+    order, the ``sentiments`` code table and the request's ``ids``, if any.
+    
     Args:
-        request: JSON payload with tweets list (1-100 tweets)
+        request: JSON payload with tweets list (1-100 tweets) and optional ids
+        format: Response shape, "compact" or the default per-tweet results
     
     Returns:
         List of sentiment analysis results with total processing time
@@ -306,39 +451,25 @@ async def predict_batch(request: BatchTweetRequest):
                 ...
             ],
             "total_processed": 3,
+            "unique_processed": 3,
             "processing_time_ms": 120.5,
             "average_time_per_tweet_ms": 40.17
         }
         ```
     """
+    mark_stage("validation")
     start_time = time.time()
     
     try:
-        from app.sentiment_analyzer import analyze_text
+        from app.sentiment_analyzer import analyze_batch_with_stats
         
-        # Process all tweets
-        results = []
-        for tweet_text in request.tweets:
-            try:
-                result = analyze_text(tweet_text)
-                results.append(SentimentResponse(
-                    tweet_text=tweet_text,
-                    sentiment=result['sentiment'],
-                    confidence=round(result['confidence'], 4),
-                    label=result['label']
-                ))
-            except Exception as e:
-                logger.error(f"Error processing tweet '{tweet_text[:50]}...': {e}")
-                # Continue processing other tweets even if one fails
-                results.append(SentimentResponse(
-                    tweet_text=tweet_text,
-                    sentiment="neutral",
-                    confidence=0.0,
-                    label="NEU"
-                ))
+        # Process all tweets with batched inference (off the event loop);
+        # duplicate tweets are only run once
+        with inference_executor.admit():
+            batch_results, batch_stats = await inference_executor.run(analyze_batch_with_stats, request.tweets)
         
         processing_time = (time.time() - start_time) * 1000
-        avg_time = processing_time / len(results) if results else 0
+        avg_time = processing_time / len(batch_results) if batch_results else 0
         
         # Record metrics for batch
         metrics.record_request(
@@ -347,21 +478,49 @@ async def predict_batch(request: BatchTweetRequest):
             success=True
         )
         # Record sentiment counts from batch
-        for result in results:
+        for result in batch_results:
             metrics.record_request(
                 endpoint="/predict/batch",
                 latency_ms=avg_time,
-                sentiment=result.sentiment,
+                sentiment=result['sentiment'],
                 success=True
             )
         
-        return BatchSentimentResponse(
-            results=results,
-            total_processed=len(results),
-            processing_time_ms=round(processing_time, 2),
-            average_time_per_tweet_ms=round(avg_time, 2)
-        )
+        totals = {
+            "total_processed": len(batch_results),
+            "unique_processed": batch_stats['inferred_texts'],
+            "processing_time_ms": round(processing_time, 2),
+            "average_time_per_tweet_ms": round(avg_time, 2)
+        }
+        with timed_stage("serialize"):
+            media_type = negotiate_media_type(http_request.headers.get("accept"))
+            if media_type == ARROW_MEDIA_TYPE:
+                return encode_arrow(batch_results, totals, request.ids)
+            
+            if format == "compact":
+                compact = {
+                    "sentiments": SENTIMENTS,
+                    "sentiment_codes": [SENTIMENT_CODES[result['sentiment']] for result in batch_results],
+                    "confidences": [round(float(result['confidence']), 4) for result in batch_results],
+                    "ids": request.ids,
+                    **totals
+                }
+                if media_type == MSGPACK_MEDIA_TYPE:
+                    return encode_msgpack(compact)
+                return FastJSONResponse(compact)
+            
+            # Plain dicts shaped like BatchSentimentResponse, without pydantic models
+            content = {
+                "results": [_result_dict(tweet_text, result) for tweet_text, result in zip(request.tweets, batch_results)],
+                **totals
+            }
+            if media_type == MSGPACK_MEDIA_TYPE:
+                return encode_msgpack(content)
+            return FastJSONResponse(content)
         
+    except InferenceOverloadedError:
+        metrics.record_request("/predict/batch", (time.time() - start_time) * 1000, success=False)
+        raise
     except ValueError as e:
         logger.warning(f"Validation error: {e}")
         metrics.record_error("/predict/batch", str(e))
@@ -379,6 +538,422 @@ async def predict_batch(request: BatchTweetRequest):
             detail=f"Internal server error while analyzing batch. Please try again later."
         )
 
+app.include_router(batch_router)
+
+# Streaming batch endpoint (no tweet limit)
+@app.post(
+    "/predict/stream",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}}}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string", "description": "One JSON string or {\"tweet_text\", \"id\"} object per line"}},
+                "text/plain": {"schema": {"type": "string", "description": "One tweet per line"}}
+            }
+        }
+    }
+)
+async def predict_stream(
+    request: Request,
+    duplex: bool = Query(False, description="Stream results while the body is still uploading (the client must read concurrently)")
+):
+    """
+    Predict sentiment of any number of tweets streamed as newline-delimited input.
+    
+    The request body is read incrementally and scored in sub-batches of
+    STREAM_BATCH_SIZE lines. Results are spooled (to a temporary file past
+    STREAM_SPOOL_MEMORY_BYTES) and streamed back as NDJSON once the body
+    has been read, so any HTTP client works and server memory stays
+    constant however many tweets are sent.
+    
+    With ``duplex=true`` results are sent while the body is still being
+    uploaded instead. That saves the spool and the wait, but the client
+    must read the response while uploading; clients that only read after
+    sending (``requests``, ``curl --data-binary``) stall on large inputs.
+    
+    Send ``Content-Type: application/x-ndjson`` with one JSON string or
+    ``{"tweet_text": ..., "id": ...}`` object per line, or
+    ``Content-Type: text/plain`` with one tweet per line. Blank lines are
+    skipped.
+    
+    Returns:
+        One NDJSON line per input line, in input order, then a summary line.
+        Invalid lines get an ``error`` instead of a sentiment.
+    
+    Example Request (application/x-ndjson):
+        ```
+        {"id": 1, "tweet_text": "This is great!"}
+        "I hate this."
+        ```
+    
+    Example Response:
+        ```
+        {"line": 1, "id": 1, "tweet_text": "This is great!", "sentiment": "positive", "confidence": 0.92, "label": "POS", "tier": "model"}
+        {"line": 2, "tweet_text": "I hate this.", "sentiment": "negative", "confidence": 0.88, "label": "NEG", "tier": "model"}
+        {"summary": {"total_processed": 2, "errors": 0, "processing_time_ms": 85.1, "average_time_per_tweet_ms": 42.55}}
+        ```
+    """
+    from app.sentiment_analyzer import analyze_batch_optimized
+    
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    plain_text = content_type in PLAIN_TEXT_MEDIA_TYPES
+    
+    # The whole stream holds one in-flight slot; it is released when the response ends
+    slot = ExitStack()
+    try:
+        slot.enter_context(inference_executor.admit())
+    except InferenceOverloadedError:
+        metrics.record_request("/predict/stream", 0, success=False)
+        raise
+    
+    async def analyze(texts: List[str]):
+        return await inference_executor.run(analyze_batch_optimized, texts)
+    
+    results = stream_predictions(request.stream(), analyze, plain_text=plain_text)
+    if duplex:
+        return DuplexStreamingResponse(results, on_close=slot.close)
+    
+    # Read and score the whole body before responding
+    with slot:
+        spool = await spool_output(results)
+    return StreamingResponse(
+        iter_spool(spool),
+        media_type=NDJSON_MEDIA_TYPE,
+        background=BackgroundTask(spool.close)
+    )
+
+# Aggregate-only summary endpoint (no per-tweet rows)
+class SummaryExample(BaseModel):
+    line: int = Field(..., description="Input line number")
+    id: Optional[Union[str, int]] = Field(None, description="Caller id from the input line")
+    tweet_text: str = Field(..., description="Tweet text")
+    confidence: float = Field(..., ge=0.0, le=1.0, description="Confidence score between 0 and 1")
+
+class ConfidenceHistogram(BaseModel):
+    bin_edges: List[float] = Field(..., description="Bin edges over [0, 1] (bins + 1 values)")
+    counts: List[int] = Field(..., description="Tweets per bin")
+
+class SummaryResponse(BaseModel):
+    total_processed: int = Field(..., description="Tweets scored")
+    errors: int = Field(..., description="Input lines rejected or not scored")
+    sentiment_distribution: Dict[str, int] = Field(..., description="Tweets per sentiment")
+    mean_confidence: Optional[float] = Field(None, description="Mean confidence over all scored tweets")
+    mean_confidence_by_sentiment: Dict[str, float] = Field(..., description="Mean confidence per sentiment")
+    confidence_histogram: ConfidenceHistogram = Field(..., description="Confidence histogram")
+    top_positive: Optional[List[SummaryExample]] = Field(None, description="Most confident positive tweets (with top_k)")
+    top_negative: Optional[List[SummaryExample]] = Field(None, description="Most confident negative tweets (with top_k)")
+    processing_time_ms: float = Field(..., description="Total processing time in milliseconds")
+
+@app.post(
+    "/predict/summary",
+    response_model=SummaryResponse,
+    status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string", "description": "One JSON string or {\"tweet_text\", \"id\"} object per line"}},
+                "text/plain": {"schema": {"type": "string", "description": "One tweet per line"}}
+            }
+        }
+    }
+)
+async def predict_summary(
+    request: Request,
+    bins: int = Query(10, ge=1, le=100, description="Confidence histogram bins"),
+    top_k: int = Query(0, ge=0, le=100, description="Most confident positive and negative tweets to return")
+):
+    """
+    Corpus-level sentiment summary of any number of tweets.
+    
+    Takes the same body as /predict/stream and scores it the same way, but
+    returns only aggregates: sentiment counts, mean confidence, a confidence
+    histogram and, with ``top_k``, the most confident positive and negative
+    tweets. Memory use and response size do not depend on the input size.
+    
+    Example Response:
+        ```json
+        {
+            "total_processed": 3,
+            "errors": 0,
+            "sentiment_distribution": {"positive": 2, "negative": 1},
+            "mean_confidence": 0.87,
+            "mean_confidence_by_sentiment": {"positive": 0.9, "negative": 0.81},
+            "confidence_histogram": {"bin_edges": [0.0, 0.5, 1.0], "counts": [0, 3]},
+            "processing_time_ms": 95.2
+        }
+        ```
+    """
+    from app.sentiment_analyzer import analyze_batch_optimized
+    
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    plain_text = content_type in PLAIN_TEXT_MEDIA_TYPES
+    
+    async def analyze(texts: List[str]):
+        return await inference_executor.run(analyze_batch_optimized, texts)
+    
+    try:
+        with inference_executor.admit():
+            return await summarize_predictions(
+                request.stream(), analyze, plain_text=plain_text, bins=bins, top_k=top_k
+            )
+    except InferenceOverloadedError:
+        metrics.record_request("/predict/summary", 0, success=False)
+        raise
+
+# File scoring endpoint (annotated CSV/NDJSON download)
+@app.post(
+    "/predict/file",
+    response_class=DuplexStreamingResponse,
+    status_code=status.HTTP_200_OK,
+    responses={200: {"content": {"text/csv": {}}}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string", "format": "binary"}},
+                "application/json": {"schema": {"type": "string", "format": "binary"}},
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+)
+async def predict_file(
+    request: Request,
+    filename: Optional[str] = Query(None, description="Original file name (used to detect the format)"),
+    output: Optional[str] = Query(None, description="csv or ndjson (default: csv for CSV uploads, ndjson otherwise)")
+):
+    """
+    Score a CSV, JSON or NDJSON file and stream back the annotated records.
+    
+    The raw file is sent as the request body and read like ``POST /jobs``
+    (format from the Content-Type header or ``filename``, tweet text found
+    like in the UI's file upload). The upload is spooled to a temporary
+    file and scored in sub-batches while the results are streamed, so
+    neither side holds a CSV or NDJSON file in memory (JSON documents are
+    parsed whole). Use ``/jobs`` for files larger than FILE_MAX_UPLOAD_MB
+    or that should survive a disconnect.
+    
+    Returns:
+        One record per tweet in file order with ``line``, ``id`` and the
+        sentiment fields of ``/predict`` (or ``error``), as CSV with the
+        columns line, id, tweet_text, sentiment, confidence, label, tier,
+        error, or as NDJSON. A file found to be malformed part way through
+        ends with a trailer record: ``{"error", "records_scored"}`` in
+        NDJSON, or a CSV row with only ``error`` set
+    
+    Example:
+        ```bash
+        curl -X POST -H "Content-Type: text/csv" --data-binary @tweets.csv http://localhost:8000/predict/file -o scored.csv
+        ```
+    """
+    from app.sentiment_analyzer import analyze_batch_optimized
+    from app.tweet_files import detect_format, iter_tweet_records, spool_upload, score_records, UploadTooLargeError
+    
+    file_format = detect_format(request.headers.get("content-type"), filename)
+    if file_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv, application/json or application/x-ndjson (or a filename with a matching extension)"
+        )
+    if output is None:
+        output = "csv" if file_format == "csv" or "text/csv" in request.headers.get("accept", "") else "ndjson"
+    if output not in ("csv", "ndjson"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="output must be csv or ndjson")
+    
+    start_time = time.time()
+    try:
+        path = await spool_upload(request.stream(), file_format)
+    except UploadTooLargeError as e:
+        metrics.record_request("/predict/file", (time.time() - start_time) * 1000, success=False)
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"{e}; submit it to /jobs instead")
+    
+    # Holds the upload and one in-flight slot until the response ends
+    cleanup = ExitStack()
+    cleanup.callback(path.unlink, missing_ok=True)
+    try:
+        cleanup.enter_context(inference_executor.admit())
+        records = iter_tweet_records(path, file_format)
+        # Parse errors in the header or a JSON document are reported before streaming
+        first = await asyncio.to_thread(next, records, None)
+    except InferenceOverloadedError:
+        cleanup.close()
+        metrics.record_request("/predict/file", (time.time() - start_time) * 1000, success=False)
+        raise
+    except ValueError as e:
+        cleanup.close()
+        metrics.record_error("/predict/file", str(e))
+        metrics.record_request("/predict/file", (time.time() - start_time) * 1000, success=False)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    async def analyze(texts: List[str]):
+        return await inference_executor.run(analyze_batch_optimized, texts)
+    
+    return DuplexStreamingResponse(
+        score_records(itertools.chain([first] if first else [], records), analyze, output=output),
+        on_close=cleanup.close,
+        media_type="text/csv" if output == "csv" else NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="scored.{output}"'}
+    )
+
+# WebSocket endpoint for continuous scoring
+@app.websocket("/ws/predict")
+async def ws_predict(websocket: WebSocket):
+    """
+    Score a continuous stream of tweets over one WebSocket connection.
+    
+    The server first sends ``{"type": "ready", "credit": N}``. The client
+    then sends JSON frames, each holding a tweet (``{"id": ..., "tweet_text":
+    ...}`` or a string) or an array of tweets. Every tweet gets one result
+    frame with its ``id``, shaped like a /predict/stream record. Results
+    arrive as soon as they are ready, not necessarily in send order.
+    
+    At most N tweets may be outstanding: each result frame returns one
+    credit, and a client that sends more is closed with code 1008. Tweets
+    are batched with other traffic by the shared micro-batcher; when the
+    server is overloaded, single tweets get an ``error`` result and can be
+    retried.
+    """
+    from app.websocket_predict import PredictionSession
+    
+    async def submit(text: str):
+        with inference_executor.admit():
+            return await batcher.submit(text)
+    
+    await websocket.accept()
+    await PredictionSession(websocket, submit).run()
+
+# Bulk scoring jobs
+class JobResponse(BaseModel):
+    job_id: str = Field(..., description="Job id")
+    state: str = Field(..., description="queued, running, completed or failed")
+    format: str = Field(..., description="Upload format: csv, json or ndjson")
+    filename: Optional[str] = Field(None, description="Uploaded file name")
+    upload_bytes: int = Field(..., description="Upload size in bytes")
+    total: Optional[int] = Field(None, description="Tweets found in the upload (known once scoring starts)")
+    records_done: int = Field(..., description="Tweets scored or rejected so far")
+    processed: int = Field(..., description="Tweets scored so far")
+    errors: int = Field(..., description="Tweets rejected so far (e.g. too long)")
+    created_at: float = Field(..., description="Unix time the job was created")
+    started_at: Optional[float] = Field(None, description="Unix time scoring started")
+    finished_at: Optional[float] = Field(None, description="Unix time the job finished")
+    error: Optional[str] = Field(None, description="Why the job failed")
+
+class JobResultsResponse(BaseModel):
+    job_id: str = Field(..., description="Job id")
+    state: str = Field(..., description="Job state")
+    offset: int = Field(..., description="Index of the first result in this page")
+    results: List[dict] = Field(..., description="Result records in upload order")
+    next_offset: Optional[int] = Field(None, description="Offset of the next page, or null once the job is finished and all results were read")
+
+def _get_job(job_id: str) -> dict:
+    from app.jobs import job_manager
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@app.post(
+    "/jobs",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string", "format": "binary"}},
+                "application/json": {"schema": {"type": "string", "format": "binary"}},
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+)
+async def create_job(request: Request, filename: Optional[str] = Query(None, description="Original file name (used to detect the format)")):
+    """
+    Submit a CSV, JSON or NDJSON file for background scoring.
+    
+    The raw file is sent as the request body; its format comes from the
+    Content-Type header or the ``filename`` extension. Tweet text is found
+    like in the UI's file upload: the first of ``text``, ``tweet_text``,
+    ``content``, ``tweet``, ``message`` or ``body`` (CSV), or of
+    ``cleaned_text``, ``content``, ``text``, ... (JSON).
+    
+    The job id is returned immediately. Scoring continues if the client
+    disconnects; poll ``GET /jobs/{job_id}`` and download results from
+    ``GET /jobs/{job_id}/results``.
+    
+    Example:
+        ```bash
+        curl -X POST -H "Content-Type: text/csv" --data-binary @tweets.csv http://localhost:8000/jobs
+        ```
+    """
+    from app.jobs import job_manager, JobUploadTooLargeError
+    from app.tweet_files import detect_format
+    
+    file_format = detect_format(request.headers.get("content-type"), filename)
+    if file_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv, application/json or application/x-ndjson (or a filename with a matching extension)"
+        )
+    
+    start_time = time.time()
+    try:
+        job = await job_manager.create(request.stream(), file_format, filename)
+    except JobUploadTooLargeError as e:
+        metrics.record_request("/jobs", (time.time() - start_time) * 1000, success=False)
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    metrics.record_request("/jobs", (time.time() - start_time) * 1000, success=True)
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Progress of a bulk scoring job."""
+    return _get_job(job_id)
+
+@app.get(
+    "/jobs/{job_id}/results",
+    response_model=JobResultsResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}}
+)
+async def get_job_results(
+    job_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0, description="Results to skip"),
+    limit: int = Query(1000, ge=1, le=10000, description="Results per page"),
+    format: Optional[str] = Query(None, description="Set to ndjson to download all results as a stream")
+):
+    """
+    Results of a bulk scoring job, available while the job is still running.
+    
+    Results are records in upload order with ``line`` (1-based record number),
+    optional ``id`` and either the sentiment fields of ``/predict`` or an
+    ``error``. By default a JSON page of ``limit`` results from ``offset`` is
+    returned. With ``format=ndjson`` (or ``Accept: application/x-ndjson``)
+    every result written so far is streamed as NDJSON.
+    """
+    from app.jobs import job_manager
+    job = _get_job(job_id)
+    
+    if format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            job_manager.iter_results(job_id),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{job_id}.ndjson"'}
+        )
+    
+    results, more = await asyncio.to_thread(job_manager.read_results, job_id, offset, limit)
+    return JobResultsResponse(
+        job_id=job_id,
+        state=job["state"],
+        offset=offset,
+        results=results,
+        next_offset=offset + len(results) if more else None
+    )
+
 # Legacy endpoints (for backward compatibility)
 @app.post("/analyze", response_model=SentimentResponse, deprecated=True)
 async def analyze_sentiment(request: TweetRequest):
@@ -391,14 +966,64 @@ async def analyze_sentiment(request: TweetRequest):
     return await predict_sentiment(request)
 
 @app.post("/analyze/batch", response_model=BatchSentimentResponse, deprecated=True)
-async def analyze_batch(request: BatchTweetRequest):
+async def analyze_batch(request: BatchTweetRequest, http_request: Request):
     """
     Legacy endpoint - use /predict/batch instead.
     
     This endpoint is deprecated and will be removed in a future version.
     Please migrate to /predict/batch endpoint.
     """
-    return await predict_batch(request)
+    return await predict_batch(request, http_request, format=None)
+
+# Admin endpoints
+def _require_admin(token: Optional[str]):
+    """Reject admin requests without the configured ADMIN_TOKEN."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them."
+        )
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
+
+@app.post("/admin/reload-model", status_code=status.HTTP_202_ACCEPTED)
+async def admin_reload_model(x_admin_token: Optional[str] = Header(None)):
+    """
+    Hot-swap the model from models/sentiment_model without downtime.
+    
+    The new version is loaded and warmed up in the background while the
+    current one keeps serving, then swapped in atomically. Poll
+    GET /admin/reload-model or /health for the result.
+    
+    Under the pre-fork server the request is passed to the master, which
+    loads the new version once and replaces the workers so they keep
+    sharing one copy of the weights.
+    
+    Requires the X-Admin-Token header to match ADMIN_TOKEN.
+    """
+    _require_admin(x_admin_token)
+    from app.hot_swap import model_swapper
+    from app.prefork import is_prefork_worker, request_master_reload
+    
+    if is_prefork_worker():
+        request_master_reload()
+        logger.info("Model reload requested via admin endpoint, passed to the pre-fork master")
+        return {"state": "forwarded", "reason": "admin", "started_at": time.time()}
+    
+    if not model_swapper.request_swap(reason="admin"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A model swap is already in progress"
+        )
+    logger.info("Model hot-swap requested via admin endpoint")
+    return model_swapper.status
+
+@app.get("/admin/reload-model")
+async def admin_reload_status(x_admin_token: Optional[str] = Header(None)):
+    """Status of the last model hot-swap (requires X-Admin-Token)."""
+    _require_admin(x_admin_token)
+    from app.hot_swap import model_swapper
+    return model_swapper.status
 
 # Monitoring endpoint
 @app.get("/metrics")
@@ -412,10 +1037,20 @@ async def get_metrics():
         - total_requests: Total number of requests
         - total_errors: Total number of errors
         - error_rate: Error rate percentage
+        - rejected_requests: Requests rejected with 503 due to overload
         - avg_latency_ms: Average request latency
         - p95_latency_ms: 95th percentile latency
         - sentiment_distribution: Count of each sentiment
         - endpoint_usage: Usage count per endpoint
+        - sequence_bucket_hits: Inference batches per padded sequence length
+        - padding: Real vs padded tokens and padding efficiency percentage
+        - cascade: Tweets answered by the fast tier and escalation rate to DistilBERT
+        - near_duplicates: Near-duplicate reuse rate and sampled agreement with the model
+        - prediction_cache: Prediction cache hits, misses and evictions
+        - microbatch: Achieved batch sizes for coalesced /predict requests
+        - startup: Warm-up duration and first-request latency
+        - stages: Per-stage latency histograms (validation, queue, tokenize, forward, softmax, serialize, total)
+        - process_memory: RSS/PSS of the serving process (per worker in pre-fork mode)
         - recent_errors: Last 10 errors
     """
     return metrics.get_stats()
@@ -433,14 +1068,35 @@ async def get_sentiment_timeseries(hours: int = 24):
     """
     return metrics.get_sentiment_timeseries(hours=hours)
 
+async def run_startup_warmup(model_data: dict):
+    """
+    Warm up the model on the inference executor, then mark the API ready.
+    
+    Runs every WARMUP_BATCH_SIZES batch in every sequence bucket on the same
+    threads that serve requests, so the first real requests don't pay for
+    allocator growth, thread-pool start-up and kernel selection.
+    """
+    try:
+        from app.sentiment_analyzer import warm_up_model, WARMUP_BATCH_SIZES
+        logger.info(f"Warming up model (batch sizes {WARMUP_BATCH_SIZES})...")
+        duration_ms = await inference_executor.run(warm_up_model, model_data, WARMUP_BATCH_SIZES)
+        metrics.record_warmup(duration_ms)
+        logger.info(f"✅ Model warm-up finished in {duration_ms:.0f} ms")
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {e}")
+    finally:
+        warmup_complete.set()
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    """Initialize model on startup for faster first inference."""
+    """Initialize and warm up the model on startup for faster first inference."""
     logger.info("Starting TweetMoodAI API...")
     logger.info(f"Environment: {'DEBUG' if DEBUG else 'PRODUCTION'}")
+    warmup_complete.clear()
     
     # Pre-load model to reduce first request latency
+    model_data = None
     try:
         from app.sentiment_analyzer import get_model
         logger.info("Pre-loading model...")
@@ -452,12 +1108,41 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error loading model on startup: {e}")
         logger.warning("Will attempt to load on first request")
+    
+    # Warm up in the background; /healthz reports ready once it is done
+    if model_data and STARTUP_WARMUP_ENABLED:
+        app.state.warmup_task = asyncio.get_running_loop().create_task(run_startup_warmup(model_data))
+    else:
+        warmup_complete.set()
+    
+    # Pre-fork workers share the master's model; the master watches instead
+    from app.hot_swap import model_swapper, MODEL_WATCH_ENABLED
+    from app.prefork import is_prefork_worker
+    if MODEL_WATCH_ENABLED and not is_prefork_worker():
+        model_swapper.start_watching()
+    
+    # Resume bulk jobs interrupted by the last shutdown
+    from app.jobs import job_manager
+    job_manager.start()
+    
+    # Serve gRPC from this process so it shares the model and micro-batcher
+    if GRPC_ENABLED:
+        from app.grpc_server import start_grpc_server
+        app.state.grpc_server, app.state.grpc_port = await start_grpc_server()
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
     logger.info("Shutting down TweetMoodAI API...")
+    from app.hot_swap import model_swapper
+    from app.jobs import job_manager
+    await model_swapper.stop()
+    await job_manager.stop()
+    if getattr(app.state, "grpc_server", None) is not None:
+        await app.state.grpc_server.stop(5)
+    await batcher.stop()
+    inference_executor.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -2,13 +2,161 @@
 Monitoring and metrics collection for TweetMoodAI
 Tracks API requests, latencies, sentiment distributions, and system health
 """
+import os
 import time
+import bisect
+import contextvars
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 from collections import defaultdict, deque
 from datetime import datetime, timedelta
 from pathlib import Path
 import json
 
+# Fields reported by /proc/<pid>/smaps_rollup (Linux 4.14+), in kB
+SMAPS_ROLLUP_FIELDS = (
+    "Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"
+)
+
+# Add a Server-Timing header with the per-stage breakdown to API responses
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "True").lower() == "true"
+
+# Upper bounds (ms) of the per-stage latency histogram buckets; the last bucket is open
+STAGE_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+def read_process_memory(pid: str = "self") -> Dict[str, float]:
+    """
+    Read a process's memory footprint from /proc/<pid>/smaps_rollup.
+
+    RSS counts every resident page, including pages shared copy-on-write with
+    the pre-fork master and sibling workers; PSS divides shared pages evenly
+    between the processes mapping them, so summing PSS over all workers gives
+    the real memory used.
+
+    Args:
+        pid: Process id, or "self" for the current process
+
+    Returns:
+        Dictionary with pid, rss_mb, pss_mb, shared_mb and private_mb, or an
+        empty dictionary when smaps_rollup is unavailable (non-Linux)
+    """
+    path = Path("/proc") / str(pid) / "smaps_rollup"
+    values_kb: Dict[str, int] = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                field, _, rest = line.partition(":")
+                if field in SMAPS_ROLLUP_FIELDS:
+                    values_kb[field] = int(rest.split()[0])
+    except (OSError, ValueError, IndexError):
+        return {}
+    
+    def to_mb(*fields: str) -> float:
+        return round(sum(values_kb.get(field, 0) for field in fields) / 1024, 1)
+    
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_mb": to_mb("Rss"),
+        "pss_mb": to_mb("Pss"),
+        "shared_mb": to_mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": to_mb("Private_Clean", "Private_Dirty")
+    }
+
+
+class StageTimings:
+    """
+    Milliseconds spent in each stage of one request.
+
+    Durations come from the monotonic ``time.perf_counter`` clock. A stage
+    entered more than once (e.g. tokenization of several sub-batches) adds
+    up. Only the thread currently working on the request writes to it.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._last_mark = self.start
+
+    def add(self, stage: str, duration_ms: float):
+        """Add time spent in a stage."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration_ms
+
+    def merge(self, stages: Dict[str, float]):
+        """Add the stages of work done on the request's behalf (e.g. a shared micro-batch)."""
+        for stage, duration_ms in stages.items():
+            self.add(stage, duration_ms)
+
+    def mark(self, stage: str):
+        """Charge the time since the request started (or since the last mark) to a stage."""
+        now = time.perf_counter()
+        self.add(stage, (now - self._last_mark) * 1000)
+        self._last_mark = now
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the request started."""
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, total_ms: Optional[float] = None) -> str:
+        """
+        Format the stages as a Server-Timing header value.
+
+        Args:
+            total_ms: Whole request duration, appended as a ``total`` metric
+
+        Returns:
+            Header value such as ``tokenize;dur=0.41, forward;dur=12.30, total;dur=14.02``
+        """
+        metrics_list = [f"{stage};dur={duration_ms:.2f}" for stage, duration_ms in self.stages.items()]
+        if total_ms is not None:
+            metrics_list.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(metrics_list)
+
+
+# Timings of the request being served; copied into executor threads by InferenceExecutor.run
+_current_timings: contextvars.ContextVar[Optional[StageTimings]] = contextvars.ContextVar(
+    "stage_timings", default=None
+)
+
+
+def current_timings() -> Optional[StageTimings]:
+    """Stage timings of the current request, or None outside a timed request."""
+    return _current_timings.get()
+
+
+def start_timings() -> StageTimings:
+    """Start timing stages for the current context (a request or a micro-batch)."""
+    timings = StageTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """
+    Add the duration of the block to a stage of the current request.
+
+    Does nothing (beyond one context variable lookup) outside a timed
+    request, e.g. during startup warm-up or background jobs.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, (time.perf_counter() - start) * 1000)
+
+
+def mark_stage(stage: str):
+    """Charge the time since the last mark of the current request to a stage."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.mark(stage)
+
+
 class MetricsCollector:
     """Collects and stores application metrics"""
     
@@ -30,6 +178,39 @@ class MetricsCollector:
         # Endpoint usage
         self.endpoint_usage: Dict[str, int] = defaultdict(int)
         
+        # Inference batches per padded sequence length bucket
+        self.sequence_bucket_hits: Dict[int, int] = defaultdict(int)
+        
+        # Real vs padded tokens fed to the model (padding efficiency)
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        
+        # Confidence cascade: tweets answered by the fast tier vs escalated
+        self.cascade_fast_count = 0
+        self.cascade_escalated_count = 0
+        
+        # Near-duplicate reuse events (lookup, reuse, agree, disagree)
+        self.near_duplicate_events: Dict[str, int] = defaultdict(int)
+        
+        # Prediction cache events (hit, miss, eviction, expiration)
+        self.cache_events: Dict[str, int] = defaultdict(int)
+        
+        # Requests rejected because inference capacity was exhausted
+        self.rejected_count = 0
+        
+        # Startup: model warm-up duration and duration of the first model
+        # forward pass on real tweets (warm-up batches excluded)
+        self.warmup_ms: Optional[float] = None
+        self.first_model_inference_ms: Optional[float] = None
+        
+        # Achieved micro-batch sizes for coalesced /predict requests
+        self.microbatch_sizes: deque = deque(maxlen=max_history)
+        self.microbatch_count = 0
+        
+        # Per-stage latency histograms (counts per STAGE_BUCKETS_MS bucket)
+        self.stage_histograms: Dict[str, List[int]] = {}
+        self.stage_totals_ms: Dict[str, float] = defaultdict(float)
+        
     def record_request(
         self, 
         endpoint: str, 
@@ -48,6 +229,11 @@ class MetricsCollector:
         if sentiment:
             self.sentiment_counts[sentiment] += 1
     
+    def record_sentiments(self, sentiment_counts: Dict[str, int]):
+        """Add sentiment counts for tweets scored within a single request"""
+        for sentiment, count in sentiment_counts.items():
+            self.sentiment_counts[sentiment] += count
+    
     def record_error(self, endpoint: str, error: str):
         """Record an error"""
         self.errors.append({
@@ -56,12 +242,95 @@ class MetricsCollector:
             "error": error
         })
     
+    def record_warmup(self, duration_ms: float):
+        """Record how long the startup model warm-up took"""
+        self.warmup_ms = duration_ms
+    
+    def record_model_inference(self, duration_ms: float):
+        """Record a model forward pass on real tweets (only the first one is kept)"""
+        if self.first_model_inference_ms is None:
+            self.first_model_inference_ms = duration_ms
+    
+    def record_sequence_bucket(self, bucket: int):
+        """Record the padded sequence length used by an inference batch"""
+        self.sequence_bucket_hits[bucket] += 1
+    
+    def record_padding(self, real_tokens: int, padded_tokens: int):
+        """Record the real and padded token counts of an inference batch"""
+        self.real_tokens += real_tokens
+        self.padded_tokens += padded_tokens
+    
+    def record_cascade(self, fast: int, escalated: int):
+        """Record tweets answered by the cascade fast tier and those escalated"""
+        self.cascade_fast_count += fast
+        self.cascade_escalated_count += escalated
+    
+    def record_near_duplicate(self, event: str):
+        """Record a near-duplicate event: lookup, reuse, or a sampled agree/disagree check"""
+        self.near_duplicate_events[event] += 1
+    
+    def record_cache_event(self, event: str):
+        """Record a prediction cache event: hit, miss, eviction or expiration"""
+        self.cache_events[event] += 1
+    
+    def record_rejection(self):
+        """Record a request rejected due to inference overload"""
+        self.rejected_count += 1
+    
+    def record_microbatch(self, batch_size: int):
+        """Record the size of a coalesced micro-batch"""
+        self.microbatch_count += 1
+        self.microbatch_sizes.append(batch_size)
+    
+    def record_stages(self, stages: Dict[str, float]):
+        """Add one request's stage durations (ms) to the per-stage histograms"""
+        for stage, duration_ms in stages.items():
+            histogram = self.stage_histograms.get(stage)
+            if histogram is None:
+                histogram = self.stage_histograms[stage] = [0] * (len(STAGE_BUCKETS_MS) + 1)
+            histogram[bisect.bisect_left(STAGE_BUCKETS_MS, duration_ms)] += 1
+            self.stage_totals_ms[stage] += duration_ms
+    
+    def _stage_stats(self) -> Dict[str, Dict]:
+        """Count, mean and bucket-bound percentiles of every recorded stage"""
+        
+        def percentile(histogram: List[int], count: int, fraction: float) -> Optional[float]:
+            # Upper bound of the bucket holding the percentile (None: open last bucket)
+            rank = fraction * count
+            seen = 0
+            for bound, bucket_count in zip(STAGE_BUCKETS_MS, histogram):
+                seen += bucket_count
+                if seen >= rank:
+                    return bound
+            return None
+        
+        stats = {}
+        for stage, histogram in self.stage_histograms.items():
+            count = sum(histogram)
+            stats[stage] = {
+                "count": count,
+                "avg_ms": round(self.stage_totals_ms[stage] / count, 3),
+                "p50_ms": percentile(histogram, count, 0.5),
+                "p95_ms": percentile(histogram, count, 0.95),
+                "p99_ms": percentile(histogram, count, 0.99),
+                "histogram": histogram
+            }
+        return stats
+    
     def get_stats(self) -> Dict:
         """Get current statistics"""
         latencies_list = list(self.latencies)
         avg_latency = sum(latencies_list) / len(latencies_list) if latencies_list else 0
         p95_latency = sorted(latencies_list)[int(len(latencies_list) * 0.95)] if latencies_list else 0
         
+        batch_sizes_list = list(self.microbatch_sizes)
+        avg_batch_size = sum(batch_sizes_list) / len(batch_sizes_list) if batch_sizes_list else 0
+        
+        cache_lookups = self.cache_events["hit"] + self.cache_events["miss"]
+        cascade_scored = self.cascade_fast_count + self.cascade_escalated_count
+        near_dup = self.near_duplicate_events
+        agreement_samples = near_dup["agree"] + near_dup["disagree"]
+        
         uptime_seconds = time.time() - self.start_time
         uptime_hours = uptime_seconds / 3600
         
@@ -71,10 +340,51 @@ class MetricsCollector:
             "total_requests": self.request_count,
             "total_errors": self.error_count,
             "error_rate": round(self.error_count / self.request_count * 100, 2) if self.request_count > 0 else 0,
+            "rejected_requests": self.rejected_count,
             "avg_latency_ms": round(avg_latency, 2),
             "p95_latency_ms": round(p95_latency, 2),
             "sentiment_distribution": dict(self.sentiment_counts),
             "endpoint_usage": dict(self.endpoint_usage),
+            "sequence_bucket_hits": dict(sorted(self.sequence_bucket_hits.items())),
+            "padding": {
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "efficiency": round(self.real_tokens / self.padded_tokens * 100, 2) if self.padded_tokens > 0 else 0
+            },
+            "cascade": {
+                "scored": cascade_scored,
+                "fast_tier": self.cascade_fast_count,
+                "escalated": self.cascade_escalated_count,
+                "escalation_rate": round(self.cascade_escalated_count / cascade_scored * 100, 2) if cascade_scored > 0 else 0
+            },
+            "near_duplicates": {
+                "lookups": near_dup["lookup"],
+                "reused": near_dup["reuse"],
+                "reuse_rate": round(near_dup["reuse"] / near_dup["lookup"] * 100, 2) if near_dup["lookup"] > 0 else 0,
+                "agreement_samples": agreement_samples,
+                "agreement_rate": round(near_dup["agree"] / agreement_samples * 100, 2) if agreement_samples > 0 else None
+            },
+            "prediction_cache": {
+                "hits": self.cache_events["hit"],
+                "misses": self.cache_events["miss"],
+                "evictions": self.cache_events["eviction"],
+                "expirations": self.cache_events["expiration"],
+                "hit_rate": round(self.cache_events["hit"] / cache_lookups * 100, 2) if cache_lookups > 0 else 0
+            },
+            "microbatch": {
+                "total_batches": self.microbatch_count,
+                "avg_batch_size": round(avg_batch_size, 2),
+                "max_batch_size": max(batch_sizes_list) if batch_sizes_list else 0
+            },
+            "startup": {
+                "warmup_ms": round(self.warmup_ms, 2) if self.warmup_ms is not None else None,
+                "first_inference_ms": round(self.first_model_inference_ms, 2) if self.first_model_inference_ms is not None else None
+            },
+            "stages": {
+                "buckets_ms": list(STAGE_BUCKETS_MS),
+                "latency": self._stage_stats()
+            },
+            "process_memory": read_process_memory(),
             "recent_errors": list(self.errors)[-10:]  # Last 10 errors
         }
     
@@ -94,5 +404,61 @@ class MetricsCollector:
 # Global metrics collector instance
 metrics = MetricsCollector()
 
-__all__ = ["metrics", "MetricsCollector"]
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that times request stages and reports them.
+
+    Every HTTP request gets a fresh StageTimings in its context, so
+    ``timed_stage`` and ``mark_stage`` anywhere on the request path (including
+    inference threads) record into it. When the response starts, the stages
+    and the ``total`` duration are sent in a ``Server-Timing`` header (if
+    SERVER_TIMING_ENABLED) and, for requests that recorded any stage, added
+    to the per-stage histograms. Streaming responses only report the stages
+    finished before their first chunk.
+    """
+
+    def __init__(self, app, collector: Optional[MetricsCollector] = None, enabled: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.collector = collector
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = StageTimings()
+        token = _current_timings.set(timings)
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start":
+                total_ms = timings.elapsed_ms()
+                if self.enabled:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing(total_ms).encode("latin-1")))
+                    message = {**message, "headers": headers}
+                if timings.stages:
+                    (self.collector or metrics).record_stages({**timings.stages, "total": total_ms})
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _current_timings.reset(token)
+
+
+__all__ = [
+    "metrics",
+    "MetricsCollector",
+    "read_process_memory",
+    "StageTimings",
+    "ServerTimingMiddleware",
+    "current_timings",
+    "start_timings",
+    "timed_stage",
+    "mark_stage",
+    "SERVER_TIMING_ENABLED",
+    "STAGE_BUCKETS_MS"
+]
 
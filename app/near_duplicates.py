@@ -0,0 +1,201 @@
+"""
+Near-duplicate prediction reuse for TweetMoodAI
+MinHash signatures with an LSH band index over recently scored tweets, so
+tweets that differ only by a URL, a mention or a few characters can reuse
+an earlier prediction instead of running the model again
+"""
+import hashlib
+import os
+import random
+import threading
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.monitoring import metrics
+
+# numpy computes the MinHash permutations (optional, index disabled without it)
+try:
+    import numpy as np  # type: ignore
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None  # type: ignore
+
+# Same cleaning as the training data (scripts/preprocess_tweets.py)
+try:
+    from scripts.preprocess_tweets import preprocess_text  # type: ignore
+except ImportError:
+    preprocess_text = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate reuse configuration
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "False").lower() == "true"
+# Minimum estimated Jaccard similarity of character shingles to reuse a prediction
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "10000"))
+# Fraction of reused predictions re-checked against the model
+NEAR_DUP_AGREEMENT_SAMPLE_RATE = float(os.getenv("NEAR_DUP_AGREEMENT_SAMPLE_RATE", "0.05"))
+
+# MinHash/LSH shape: 8 bands of 8 rows make ~0.77 similarity the point where
+# tweets become candidates; candidates are then checked against the threshold
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 8
+SHINGLE_SIZE = 4
+# Shorter texts flip meaning with a single word ("not bad" / "not sad")
+MIN_TEXT_LENGTH = 20
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_for_similarity(text: str) -> str:
+    """Clean a tweet like the training data (URLs, mentions, hashtags, emojis) and case-fold it."""
+    if preprocess_text is not None:
+        text = preprocess_text(text)
+    return " ".join(text.split()).casefold()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Character n-grams of a normalized text."""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LRU index from MinHash signatures to predictions.
+
+    Lookups hash the new text into the LSH bands, collect candidates sharing
+    at least one band and reuse the prediction of the most similar one if
+    its estimated Jaccard similarity reaches ``threshold``. Entries record
+    the model version that produced them and never match another version.
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        max_entries: int = NEAR_DUP_MAX_ENTRIES,
+        num_permutations: int = NUM_PERMUTATIONS,
+        num_bands: int = NUM_BANDS,
+        enabled: bool = NEAR_DUP_ENABLED,
+        seed: int = 42
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.num_bands = num_bands
+        self.rows_per_band = num_permutations // num_bands
+        self._enabled = enabled and NUMPY_AVAILABLE
+
+        self._entries: "OrderedDict[int, Tuple[Any, str, Dict[str, Any]]]" = OrderedDict()
+        self._bands: Dict[Tuple[int, bytes], Set[int]] = defaultdict(set)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        if self._enabled:
+            rng = random.Random(seed)
+            self._a = np.array([rng.randrange(1, _MERSENNE_PRIME) for _ in range(num_permutations)], dtype=np.uint64)
+            self._b = np.array([rng.randrange(0, _MERSENNE_PRIME) for _ in range(num_permutations)], dtype=np.uint64)
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled and self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def signature(self, normalized: str) -> Optional[Any]:
+        """MinHash signature of a normalized text, or None if it is too short."""
+        if len(normalized) < MIN_TEXT_LENGTH:
+            return None
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little')
+             for s in shingles(normalized)],
+            dtype=np.uint64
+        )
+        # (a * x + b) mod p for every permutation and shingle, wrapping in uint64
+        # like datasketch does; without large multipliers short hashes always win
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: Any) -> List[Tuple[int, bytes]]:
+        rows = self.rows_per_band
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.num_bands)]
+
+    def lookup(self, text: str, version: str = "") -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Find a prediction for a near-duplicate of ``text``.
+
+        Args:
+            text: Validated tweet text
+            version: Model version the prediction must come from
+
+        Returns:
+            Tuple of (copy of the reused result, estimated similarity), or None
+        """
+        if not self.enabled:
+            return None
+        metrics.record_near_duplicate("lookup")
+        signature = self.signature(normalize_for_similarity(text))
+        if signature is None:
+            return None
+
+        best: Optional[Tuple[int, float]] = None
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._bands.get(key, ()))
+            for entry_id in candidates:
+                entry_signature, entry_version, _ = self._entries[entry_id]
+                if entry_version != version:
+                    continue
+                similarity = float((entry_signature == signature).mean())
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (entry_id, similarity)
+
+            if best is None:
+                return None
+            self._entries.move_to_end(best[0])
+            reused = dict(self._entries[best[0]][2])
+        metrics.record_near_duplicate("reuse")
+        return reused, best[1]
+
+    def add(self, text: str, result: Dict[str, Any], version: str = ""):
+        """Index the prediction for ``text``, evicting the least recently used entry when full."""
+        if not self.enabled:
+            return
+        signature = self.signature(normalize_for_similarity(text))
+        if signature is None:
+            return
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (signature, version, dict(result))
+            for key in self._band_keys(signature):
+                self._bands[key].add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                evicted_id, (evicted_signature, _, _) = self._entries.popitem(last=False)
+                for key in self._band_keys(evicted_signature):
+                    bucket = self._bands.get(key)
+                    if bucket is not None:
+                        bucket.discard(evicted_id)
+                        if not bucket:
+                            del self._bands[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+
+    def should_sample(self) -> bool:
+        """Whether a reused prediction should be re-checked against the model."""
+        return random.random() < NEAR_DUP_AGREEMENT_SAMPLE_RATE
+
+
+# Global near-duplicate index instance
+near_duplicate_index = NearDuplicateIndex()
+
+__all__ = ["near_duplicate_index", "NearDuplicateIndex", "normalize_for_similarity"]
@@ -0,0 +1,496 @@
+"""
+Pre-fork multi-worker server for TweetMoodAI
+The master process loads the model once, freezes it and forks the uvicorn
+workers, so all workers share the model weights copy-on-write instead of each
+loading its own copy. New model versions are loaded by the master too, which
+then replaces the workers with fresh forks sharing the new weights.
+
+Usage:
+    python -m app.prefork --workers 4 --port 8000
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.monitoring import read_process_memory
+
+logger = logging.getLogger(__name__)
+
+# Pre-fork configuration
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", str(os.cpu_count() or 1)))
+# PyTorch threads per worker (0 = split the CPU cores evenly between workers)
+PREFORK_TORCH_THREADS = int(os.getenv("PREFORK_TORCH_THREADS", "0"))
+# Seconds after startup before the master logs the per-worker memory report (0 = disabled)
+PREFORK_MEMORY_REPORT_DELAY = float(os.getenv("PREFORK_MEMORY_REPORT_DELAY", "10"))
+PREFORK_GRACEFUL_TIMEOUT = float(os.getenv("PREFORK_GRACEFUL_TIMEOUT", "30"))
+
+# Index of this worker, set after fork (None in the master or without pre-fork)
+_worker_index: Optional[int] = None
+
+
+def is_prefork_worker() -> bool:
+    """Whether this process is a worker forked by the pre-fork master."""
+    return _worker_index is not None
+
+
+def request_master_reload():
+    """Ask the pre-fork master to load the model on disk and replace the workers."""
+    os.kill(os.getppid(), signal.SIGHUP)
+
+
+def prepare_engine_artifacts() -> bool:
+    """
+    Build the ONNX export or the checked int8 model in a spawned process.
+
+    Both run the model (tracing, or forward passes for the agreement check).
+    That would start PyTorch's thread pool in the master, and forked workers
+    could then deadlock in it, so the work runs in a fresh interpreter and
+    the master only loads the resulting files.
+
+    Returns:
+        False if the artifacts could not be built (the master then serves fp32)
+    """
+    from app import sentiment_analyzer
+
+    engine = sentiment_analyzer.INFERENCE_ENGINE
+    if engine not in ("onnx", "torch-int8"):
+        return True
+    logger.info(f"Preparing {engine} engine in a separate process...")
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        ready = pool.apply(
+            sentiment_analyzer.prepare_engine_artifacts,
+            (sentiment_analyzer.MODEL_PATH, engine, sentiment_analyzer.AGREEMENT_DATA_PATH)
+        )
+    if not ready:
+        logger.warning(f"Could not prepare the {engine} engine")
+    return ready
+
+
+def _load_inference_free() -> Optional[Dict[str, Any]]:
+    """Load the model from prepared artifacts without running it."""
+    from app.sentiment_analyzer import _load_timed_model
+
+    prepare_engine_artifacts()
+    model_data = _load_timed_model(run_inference=False)
+    if model_data is not None:
+        model = model_data['model']
+        if hasattr(model, 'requires_grad_'):
+            model.requires_grad_(False)
+    return model_data
+
+
+def load_shared_model() -> Optional[Dict[str, Any]]:
+    """
+    Load the model in the master process and freeze it for sharing.
+
+    No inference runs here: a forward pass would start PyTorch's thread pool,
+    which does not survive fork. The ONNX export and the int8 agreement check
+    run in a separate process (see ``prepare_engine_artifacts``). After
+    loading, every object allocated so far is moved to the permanent GC
+    generation with ``gc.freeze()`` so garbage collections in the workers
+    never write to (and thereby copy) those pages.
+
+    Returns:
+        Model dictionary, or None if the model could not be loaded
+    """
+    from app.sentiment_analyzer import get_inference_engine, swap_model
+
+    model_data = _load_inference_free()
+    if model_data is None:
+        logger.warning("⚠️  Model not loaded in master - workers will use placeholder")
+    else:
+        swap_model(model_data)
+        logger.info(f"✅ Model loaded in master ({get_inference_engine(model_data)} engine)")
+
+    _freeze_heap()
+    return model_data
+
+
+def _freeze_heap():
+    """Collect garbage (including a previous frozen model) and freeze what is left."""
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def reload_shared_model() -> Optional[Dict[str, Any]]:
+    """
+    Load the model on disk in the master and make it the one new forks get.
+
+    Like ``load_shared_model``, no inference runs in the master; workers warm
+    the model up after they are forked.
+
+    Returns:
+        The new model dictionary, or None if loading failed (the current
+        model is kept)
+    """
+    from app.sentiment_analyzer import swap_model
+
+    model_data = _load_inference_free()
+    if model_data is None:
+        logger.error("Model reload aborted: new model could not be loaded")
+        return None
+    swap_model(model_data)
+    _freeze_heap()
+    logger.info(f"✅ Loaded model version {model_data.get('version')} in master")
+    return model_data
+
+
+def _reinit_worker(torch_threads: int):
+    """
+    Re-create per-process inference state after fork.
+
+    Args:
+        torch_threads: PyTorch intra-op threads for this worker
+    """
+    from app import sentiment_analyzer
+
+    if sentiment_analyzer.torch is not None and torch_threads > 0:
+        sentiment_analyzer.torch.set_num_threads(torch_threads)
+
+    # ONNX Runtime sessions own thread pools that do not survive fork,
+    # so each worker opens its own session on the exported model
+    model_data = sentiment_analyzer._model
+    if model_data and model_data.get('engine') == 'onnx':
+        onnx_path = sentiment_analyzer.MODEL_PATH / sentiment_analyzer.ONNX_MODEL_NAME
+        model_data['model'] = sentiment_analyzer.create_onnx_session(onnx_path)
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """
+    Bind the listening socket shared by all workers.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        backlog: Listen backlog
+
+    Returns:
+        Listening socket, inherited by the forked workers
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def memory_report(pids: List[int]) -> Dict[str, Any]:
+    """
+    Build a memory report for the master and worker processes.
+
+    Summed RSS counts shared model pages once per process; summed PSS is
+    the real footprint. The difference is what copy-on-write sharing saves.
+
+    Args:
+        pids: Process ids to include
+
+    Returns:
+        Dictionary with per-process memory and totals in MB
+    """
+    processes = [usage for usage in (read_process_memory(str(pid)) for pid in pids) if usage]
+    total_rss = sum(usage["rss_mb"] for usage in processes)
+    total_pss = sum(usage["pss_mb"] for usage in processes)
+    return {
+        "processes": processes,
+        "total_rss_mb": round(total_rss, 1),
+        "total_pss_mb": round(total_pss, 1),
+        "shared_savings_mb": round(total_rss - total_pss, 1)
+    }
+
+
+class PreforkServer:
+    """
+    Master process that forks and supervises uvicorn workers.
+
+    Workers that exit unexpectedly are replaced with a fresh fork of the
+    master, so they too start with the shared model already in memory.
+    SIGTERM/SIGINT stop all workers; SIGUSR1 logs the memory report.
+
+    SIGHUP (sent by a worker's /admin/reload-model) or, with ``watch``, a
+    settled change of the model files makes the master load the new model
+    and roll the workers: a new fork is started for every worker before the
+    old one is asked to stop, so the shared socket is always served.
+    Workers never swap models on their own, which would give each its own
+    private copy of the weights.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        sock: socket.socket,
+        workers: int = PREFORK_WORKERS,
+        torch_threads: int = PREFORK_TORCH_THREADS,
+        log_level: str = "info",
+        watch: bool = False
+    ):
+        self.app = app
+        self.sock = sock
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.log_level = log_level
+        self.watch = watch
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        # Workers replaced by a reload, shutting down
+        self.retiring: Dict[int, int] = {}
+        self._stopping = False
+        self._report_requested = False
+        self._reload_requested = False
+
+    def _spawn(self, index: int):
+        """Fork worker ``index``; the child never returns."""
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            logger.info(f"Started worker {index} (pid {pid})")
+            return
+
+        # Child: restore default signal handling (uvicorn installs its own)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        global _worker_index
+        _worker_index = index
+        exit_code = 0
+        try:
+            import uvicorn
+            _reinit_worker(self.torch_threads)
+            config = uvicorn.Config(self.app, log_level=self.log_level)
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException as e:
+            logger.error(f"Worker {index} crashed: {e}", exc_info=True)
+            exit_code = 1
+        finally:
+            # Skip the master's atexit handlers and buffered state
+            os._exit(exit_code)
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_report(self, signum, frame):
+        self._report_requested = True
+
+    def _handle_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _reap(self):
+        """Collect exited workers and replace them unless shutting down."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            if self.retiring.pop(pid, None) is not None:
+                logger.info(f"Replaced worker (pid {pid}) exited")
+                continue
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            if not self._stopping:
+                logger.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+                self._spawn(index)
+
+    def reload(self) -> bool:
+        """
+        Load the model on disk and replace every worker with a fresh fork.
+
+        Returns:
+            False if the model could not be loaded (workers are kept)
+        """
+        if reload_shared_model() is None:
+            return False
+        old_workers = dict(self.children)
+        self.children = {}
+        self.retiring.update(old_workers)
+        for pid, index in sorted(old_workers.items(), key=lambda item: item[1]):
+            self._spawn(index)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        return True
+
+    def log_memory_report(self) -> Dict[str, Any]:
+        """Log RSS/PSS for the master and every worker."""
+        report = memory_report([os.getpid()] + sorted(self.children))
+        logger.info("Memory report (MB):    pid      rss      pss   shared  private")
+        for usage in report["processes"]:
+            role = "master" if usage["pid"] == os.getpid() else "worker"
+            logger.info(
+                f"  {role:<18}{usage['pid']:>7}{usage['rss_mb']:>9}{usage['pss_mb']:>9}"
+                f"{usage['shared_mb']:>9}{usage['private_mb']:>9}"
+            )
+        logger.info(
+            f"Total RSS {report['total_rss_mb']} MB, total PSS {report['total_pss_mb']} MB "
+            f"({report['shared_savings_mb']} MB shared copy-on-write)"
+        )
+        return report
+
+    def stop_workers(self):
+        """Ask workers to shut down gracefully, then kill stragglers."""
+        self.children.update(self.retiring)
+        self.retiring.clear()
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + PREFORK_GRACEFUL_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+
+        for pid in list(self.children):
+            logger.warning(f"Worker pid {pid} did not stop in time, killing")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children.clear()
+
+    def run(self, memory_report_delay: float = PREFORK_MEMORY_REPORT_DELAY):
+        """
+        Fork the workers and supervise them until SIGTERM/SIGINT.
+
+        Args:
+            memory_report_delay: Seconds before logging the memory report (0 = never)
+        """
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGUSR1, self._handle_report)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        for index in range(self.workers):
+            self._spawn(index)
+
+        detector = watch_at = None
+        if self.watch:
+            from app.hot_swap import ModelChangeDetector, MODEL_WATCH_INTERVAL_SECONDS
+            from app.sentiment_analyzer import MODEL_PATH, model_files_fingerprint
+            detector = ModelChangeDetector(model_files_fingerprint(MODEL_PATH))
+            watch_interval = max(0.1, MODEL_WATCH_INTERVAL_SECONDS)
+            watch_at = time.monotonic() + watch_interval
+            logger.info(f"Watching {MODEL_PATH} for new model versions every {watch_interval}s")
+
+        report_at = time.monotonic() + memory_report_delay if memory_report_delay > 0 else None
+        try:
+            while not self._stopping:
+                self._reap()
+                if detector is not None and time.monotonic() >= watch_at:
+                    watch_at = time.monotonic() + watch_interval
+                    try:
+                        fingerprint = model_files_fingerprint(MODEL_PATH)
+                    except OSError as e:
+                        logger.warning(f"Could not read {MODEL_PATH}: {e}")
+                        fingerprint = detector.current
+                    if detector.settled_change(fingerprint):
+                        logger.info(f"New model files detected in {MODEL_PATH}, reloading workers")
+                        detector.accept()
+                        self._reload_requested = True
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                if self._report_requested or (report_at is not None and time.monotonic() >= report_at):
+                    self._report_requested = False
+                    report_at = None
+                    self.log_memory_report()
+                time.sleep(0.2)
+        finally:
+            logger.info("Stopping workers...")
+            self.stop_workers()
+            self.sock.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Serve the TweetMoodAI API with pre-forked workers sharing one model copy",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m app.prefork
+  python -m app.prefork --workers 4 --port 8000
+  kill -USR1 <master pid>    # log the per-worker memory report again
+  kill -HUP <master pid>     # load the model on disk and replace the workers
+        """
+    )
+
+    parser.add_argument(
+        '--host',
+        type=str,
+        default=os.getenv("API_HOST", "0.0.0.0"),
+        help='Interface to bind (default: API_HOST or 0.0.0.0)'
+    )
+
+    parser.add_argument(
+        '--port', '-p',
+        type=int,
+        default=int(os.getenv("PORT", os.getenv("API_PORT", "8000"))),
+        help='Port to bind (default: PORT, API_PORT or 8000)'
+    )
+
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=PREFORK_WORKERS,
+        help='Number of worker processes (default: PREFORK_WORKERS or CPU count)'
+    )
+
+    parser.add_argument(
+        '--torch-threads',
+        type=int,
+        default=PREFORK_TORCH_THREADS,
+        help='PyTorch threads per worker (default: CPU count / workers)'
+    )
+
+    parser.add_argument(
+        '--memory-report-delay',
+        type=float,
+        default=PREFORK_MEMORY_REPORT_DELAY,
+        help='Seconds before logging the per-worker memory report, 0 to disable (default: 10)'
+    )
+
+    args = parser.parse_args(argv)
+
+    # Importing app.main configures logging; it must not run inference
+    from app.main import app
+    from app.hot_swap import MODEL_WATCH_ENABLED
+
+    if not hasattr(os, "fork"):
+        logger.error("Pre-fork mode requires a POSIX system (os.fork)")
+        return 1
+
+    load_shared_model()
+    sock = bind_socket(args.host, args.port)
+    logger.info(
+        f"Pre-fork master (pid {os.getpid()}) listening on {args.host}:{sock.getsockname()[1]} "
+        f"with {args.workers} workers"
+    )
+
+    server = PreforkServer(
+        app,
+        sock,
+        workers=args.workers,
+        torch_threads=args.torch_threads,
+        log_level=os.getenv("LOG_LEVEL", "info").lower(),
+        watch=MODEL_WATCH_ENABLED
+    )
+    server.run(memory_report_delay=args.memory_report_delay)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
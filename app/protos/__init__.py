@@ -0,0 +1,4 @@
+"""
+Protocol buffer definitions for the TweetMoodAI gRPC service
+sentiment_pb2*.py are generated from sentiment.proto (see the command in it)
+"""
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: app/protos/sentiment.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'app/protos/sentiment.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1a\x61pp/protos/sentiment.proto\x12\ttweetmood\"0\n\x0ePredictRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\x12\n\ntweet_text\x18\x02 \x01(\t\"p\n\x0fPredictResponse\x12\n\n\x02id\x18\x01 \x01(\t\x12\x11\n\tsentiment\x18\x02 \x01(\t\x12\x12\n\nconfidence\x18\x03 \x01(\x02\x12\r\n\x05label\x18\x04 \x01(\t\x12\x0c\n\x04tier\x18\x05 \x01(\t\x12\r\n\x05\x65rror\x18\x06 \x01(\t2\xa0\x01\n\x10SentimentService\x12@\n\x07Predict\x12\x19.tweetmood.PredictRequest\x1a\x1a.tweetmood.PredictResponse\x12J\n\rPredictStream\x12\x19.tweetmood.PredictRequest\x1a\x1a.tweetmood.PredictResponse(\x01\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'app.protos.sentiment_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_PREDICTREQUEST']._serialized_start=41
+  _globals['_PREDICTREQUEST']._serialized_end=89
+  _globals['_PREDICTRESPONSE']._serialized_start=91
+  _globals['_PREDICTRESPONSE']._serialized_end=203
+  _globals['_SENTIMENTSERVICE']._serialized_start=206
+  _globals['_SENTIMENTSERVICE']._serialized_end=366
+# @@protoc_insertion_point(module_scope)
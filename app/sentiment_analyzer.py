@@ -3,64 +3,612 @@ Sentiment Analysis Model Integration
 Loads trained model and performs sentiment analysis on text
 """
 import os
+import copy
 import json
+import time
+import hashlib
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Optional, List, Any
+from typing import Dict, Optional, List, Any, Tuple
+import inspect
 import logging
+import threading
 
-# Try to import torch and transformers (may not be available in all environments)
+from app.monitoring import metrics, timed_stage
+from app.near_duplicates import near_duplicate_index
+
+# Inference engine: "torch" (default), "torch-int8" (dynamically quantized
+# Linear layers) or "onnx" (ONNX Runtime on CPU; torch is then only needed
+# once, to export the model if model.onnx is missing)
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "torch").strip().lower()
+
+# Try to import the tokenizer (may not be available in all environments)
 try:
-    import torch  # type: ignore
-    from transformers import DistilBertTokenizer, DistilBertForSequenceClassification  # type: ignore
-    TORCH_AVAILABLE = True
+    from transformers import DistilBertTokenizer  # type: ignore
 except ImportError:
-    TORCH_AVAILABLE = False
-    torch = None  # type: ignore
     DistilBertTokenizer = None  # type: ignore
-    DistilBertForSequenceClassification = None  # type: ignore
+
+# Fast (Rust) tokenizer backend, needs the `tokenizers` package
+try:
+    from transformers import DistilBertTokenizerFast  # type: ignore
+except ImportError:
+    DistilBertTokenizerFast = None  # type: ignore
+
+# PyTorch and the DistilBERT model class (may not be available in all environments)
+torch = None  # type: ignore
+DistilBertForSequenceClassification = None  # type: ignore
+TORCH_AVAILABLE = False
+
+def _import_torch() -> bool:
+    """Import torch and the DistilBERT model class on first use."""
+    global torch, DistilBertForSequenceClassification, TORCH_AVAILABLE
+    if not TORCH_AVAILABLE:
+        try:
+            import torch as torch_module  # type: ignore
+            from transformers import DistilBertForSequenceClassification as model_class  # type: ignore
+        except ImportError:
+            return False
+        torch, DistilBertForSequenceClassification = torch_module, model_class
+        TORCH_AVAILABLE = True
+    return True
+
+# The ONNX engine serves without torch, so skip importing it at startup
+if INFERENCE_ENGINE != "onnx":
+    _import_torch()
+
+# Try to import ONNX Runtime (optional inference engine)
+try:
+    import numpy as np  # type: ignore
+    import onnxruntime as ort  # type: ignore
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+    np = None  # type: ignore
+    ort = None  # type: ignore
+
+# Try to import joblib for the TF-IDF fast tier (optional, see CASCADE_ENABLED)
+try:
+    import joblib  # type: ignore
+    JOBLIB_AVAILABLE = True
+except ImportError:
+    JOBLIB_AVAILABLE = False
+    joblib = None  # type: ignore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Model paths
 MODEL_DIR = Path(__file__).parent.parent / "models"
+DATA_DIR = Path(__file__).parent.parent / "data"
 MODEL_PATH = MODEL_DIR / "sentiment_model"  # Trained DistilBERT model
 LABEL_MAP_PATH = MODEL_PATH / "label_map.json"
+TOKENIZER_JSON_NAME = "tokenizer.json"  # Serialized fast tokenizer (generated on first load)
+ONNX_MODEL_NAME = "model.onnx"  # ONNX export (generated on first load with INFERENCE_ENGINE=onnx)
+QUANTIZED_MODEL_NAME = "model_int8.pt"  # Quantized model cache (INFERENCE_ENGINE=torch-int8)
+WEIGHT_FILE_NAMES = ("model.safetensors", "pytorch_model.bin")
+FAST_TIER_MODEL_PATH = MODEL_DIR / "sentiment_model.pkl"  # scripts/train_model.py classifier
+FAST_TIER_VECTORIZER_PATH = MODEL_DIR / "vectorizer.pkl"  # scripts/train_model.py TF-IDF vectorizer
+
+# Labeled tweets used for the int8 agreement check
+AGREEMENT_DATA_PATH = DATA_DIR / "tweets_labeled.json"
+# Minimum fraction of labels the int8 model must share with fp32 to be served
+QUANTIZATION_MIN_AGREEMENT = float(os.getenv("QUANTIZATION_MIN_AGREEMENT", "0.98"))
+# Number of held-out tweets used for the agreement check
+QUANTIZATION_CHECK_SAMPLES = int(os.getenv("QUANTIZATION_CHECK_SAMPLES", "200"))
+
+# ONNX Runtime intra-op threads (0 lets ONNX Runtime decide)
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+# Use the fast tokenizer for serving (falls back to the slow one if unavailable)
+USE_FAST_TOKENIZER = os.getenv("USE_FAST_TOKENIZER", "True").lower() == "true"
+
+# Confidence cascade: the TF-IDF/LogisticRegression model scores every tweet
+# and only tweets below the confidence threshold are escalated to DistilBERT
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "False").lower() == "true"
+CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.9"))
+
+# Which tier answered a prediction (the "tier" field of results)
+TIER_FAST = "fast"
+TIER_MODEL = "model"
+TIER_PLACEHOLDER = "placeholder"
+
+def load_tokenizer(model_path: Path = MODEL_PATH, use_fast: bool = USE_FAST_TOKENIZER):
+    """
+    Load the tokenizer for the model at ``model_path``.
+    
+    The fast tokenizer is built from vocab.txt the first time and cached as
+    tokenizer.json next to the model so later loads skip the conversion.
+    
+    Args:
+        model_path: Model directory containing vocab.txt / tokenizer.json
+        use_fast: Prefer the fast (Rust) tokenizer
+    
+    Returns:
+        Tokenizer instance
+    """
+    if use_fast and DistilBertTokenizerFast is not None:
+        try:
+            tokenizer = DistilBertTokenizerFast.from_pretrained(str(model_path))
+        except Exception as e:
+            logger.warning(f"Fast tokenizer unavailable, using slow tokenizer: {e}")
+        else:
+            tokenizer_json = model_path / TOKENIZER_JSON_NAME
+            if not tokenizer_json.exists():
+                try:
+                    tokenizer.backend_tokenizer.save(str(tokenizer_json))
+                    logger.info(f"Cached fast tokenizer at {tokenizer_json}")
+                except OSError as e:
+                    logger.warning(f"Could not cache fast tokenizer: {e}")
+            return tokenizer
+    
+    return DistilBertTokenizer.from_pretrained(str(model_path))
+
+def check_tokenizer_parity(texts: List[str], model_path: Path = MODEL_PATH) -> Dict[str, Any]:
+    """
+    Compare token ids from the fast and slow tokenizers.
+    
+    Args:
+        texts: Texts to tokenize with both tokenizers
+        model_path: Model directory to load the tokenizers from
+    
+    Returns:
+        Dictionary with total, matched and the mismatching texts
+    """
+    fast = load_tokenizer(model_path, use_fast=True)
+    slow = load_tokenizer(model_path, use_fast=False)
+    if getattr(slow, "is_fast", False):
+        # transformers>=5 maps DistilBertTokenizer to the fast implementation;
+        # compare against the pure-Python WordPiece tokenizer instead
+        from transformers.models.bert.tokenization_bert_legacy import BertTokenizerLegacy  # type: ignore
+        slow = BertTokenizerLegacy.from_pretrained(str(model_path))
+    
+    fast_ids = fast(texts, truncation=True, max_length=MAX_SEQUENCE_LENGTH)['input_ids']
+    slow_ids = slow(texts, truncation=True, max_length=MAX_SEQUENCE_LENGTH)['input_ids']
+    
+    mismatches = [
+        {"text": text, "fast": fast_row, "slow": slow_row}
+        for text, fast_row, slow_row in zip(texts, fast_ids, slow_ids)
+        if fast_row != slow_row
+    ]
+    return {
+        "fast_tokenizer": type(fast).__name__,
+        "slow_tokenizer": type(slow).__name__,
+        "total": len(texts),
+        "matched": len(texts) - len(mismatches),
+        "mismatches": mismatches
+    }
+
+def _read_label_map() -> Dict:
+    """Load the id -> label name map saved next to the model."""
+    label_map = {}
+    if LABEL_MAP_PATH.exists():
+        with open(LABEL_MAP_PATH, 'r') as f:
+            label_map = json.load(f)
+    return label_map
+
+def _build_model_data(model: Any, tokenizer: Any, engine: str) -> Dict[str, Any]:
+    """Bundle a loaded model with what inference needs to use it."""
+    return {
+        'model': model,
+        'tokenizer': tokenizer,
+        'label_map': _read_label_map(),
+        'engine': engine,
+        # Uncased models give identical predictions regardless of case
+        'lowercase': bool(getattr(tokenizer, 'do_lower_case', False)),
+        'fast_tier': load_fast_tier() if CASCADE_ENABLED else None,
+        'version': model_version(),
+        'loaded_at': time.time()
+    }
+
+def model_files_fingerprint(model_path: Path = MODEL_PATH) -> str:
+    """
+    Identify the model files a new training run replaces.
+    
+    Files generated while loading (tokenizer.json, ONNX export, int8 cache)
+    are left out so loading a model never looks like a new version.
+    """
+    parts = []
+    for name in WEIGHT_FILE_NAMES + ("config.json", "label_map.json"):
+        path = model_path / name
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+def model_version(model_path: Path = MODEL_PATH) -> str:
+    """Short identifier of the model version on disk."""
+    return hashlib.blake2b(model_files_fingerprint(model_path).encode('utf-8'), digest_size=6).hexdigest()
+
+def load_fast_tier(
+    model_path: Path = FAST_TIER_MODEL_PATH,
+    vectorizer_path: Path = FAST_TIER_VECTORIZER_PATH
+) -> Optional[Dict[str, Any]]:
+    """
+    Load the TF-IDF/LogisticRegression model trained by scripts/train_model.py.
+    
+    Returns:
+        Dictionary with classifier, vectorizer and label_map, or None if the
+        files or joblib are not available (the cascade is then skipped)
+    """
+    if not JOBLIB_AVAILABLE:
+        logger.warning("joblib not installed. Cascade fast tier disabled.")
+        return None
+    if not model_path.exists() or not vectorizer_path.exists():
+        logger.warning(f"Fast tier not found at {model_path} / {vectorizer_path}. Cascade disabled.")
+        return None
+    
+    try:
+        classifier = joblib.load(model_path)
+        vectorizer = joblib.load(vectorizer_path)
+    except Exception as e:
+        logger.error(f"Error loading fast tier: {e}")
+        return None
+    
+    logger.info(f"✅ Cascade fast tier loaded from {model_path}")
+    return {
+        'classifier': classifier,
+        'vectorizer': vectorizer,
+        'label_map': {i: str(label) for i, label in enumerate(classifier.classes_)}
+    }
+
+def predict_fast_tier(fast_tier: Dict[str, Any], texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Score texts with the sparse linear model.
+    
+    Args:
+        fast_tier: Dictionary from load_fast_tier()
+        texts: Validated texts
+    
+    Returns:
+        List of sentiment analysis results (tier "fast"), in input order
+    """
+    probabilities = fast_tier['classifier'].predict_proba(fast_tier['vectorizer'].transform(texts))
+    results = []
+    for row in probabilities:
+        predicted_id = int(row.argmax())
+        result = _format_prediction(predicted_id, float(row[predicted_id]), fast_tier['label_map'])
+        result['tier'] = TIER_FAST
+        results.append(result)
+    return results
 
-def load_model():
+def export_onnx_model(model: Any, onnx_path: Path):
+    """
+    Export a DistilBERT classifier to ONNX with dynamic batch and sequence axes.
+    
+    Args:
+        model: DistilBertForSequenceClassification in eval mode
+        onnx_path: Destination .onnx file
+    """
+    if torch is None:
+        raise RuntimeError("PyTorch not available")
+    
+    dummy_ids = torch.ones((2, 16), dtype=torch.long)
+    dummy_mask = torch.ones((2, 16), dtype=torch.long)
+    
+    export_kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # The TorchScript exporter honours dynamic_axes directly
+        export_kwargs['dynamo'] = False
+    
+    # Write to a temporary file first so a failed export leaves nothing behind
+    tmp_path = onnx_path.with_suffix(".onnx.tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy_ids, dummy_mask),
+            str(tmp_path),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'logits': {0: 'batch'}
+            },
+            opset_version=14,
+            **export_kwargs
+        )
+    os.replace(tmp_path, onnx_path)
+    logger.info(f"Exported ONNX model to {onnx_path}")
+
+def create_onnx_session(onnx_path: Path):
+    """Create a CPU ONNX Runtime session for an exported model."""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+    return ort.InferenceSession(str(onnx_path), sess_options=options, providers=['CPUExecutionProvider'])
+
+def _onnx_export_stale(onnx_path: Path, model_path: Path) -> bool:
+    """Whether the weights were replaced after the ONNX export was written."""
+    export_mtime = onnx_path.stat().st_mtime_ns
+    return any(
+        (model_path / name).exists() and (model_path / name).stat().st_mtime_ns > export_mtime
+        for name in WEIGHT_FILE_NAMES
+    )
+
+def _load_onnx_model(model_path: Path = MODEL_PATH, export: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Load the ONNX Runtime engine, exporting the model first if needed.
+    
+    Args:
+        model_path: Model directory
+        export: Export the model if model.onnx is missing or stale (the
+            export traces the model, see prepare_engine_artifacts)
+    
+    Returns:
+        Model dictionary, or None if ONNX Runtime cannot be used
+    """
+    if not ONNX_AVAILABLE:
+        logger.warning("onnxruntime not installed. Cannot use ONNX engine.")
+        return None
+    
+    onnx_path = model_path / ONNX_MODEL_NAME
+    if not onnx_path.exists() or _onnx_export_stale(onnx_path, model_path):
+        if not export:
+            logger.warning(f"{onnx_path} is missing or older than the weights")
+            return None
+        if not _import_torch():
+            logger.warning(f"{onnx_path} not found and PyTorch is not available to export it")
+            return None
+        logger.info(f"Exporting {model_path} to ONNX...")
+        model = DistilBertForSequenceClassification.from_pretrained(str(model_path))
+        model.eval()
+        export_onnx_model(model, onnx_path)
+    
+    logger.info(f"Loading ONNX model from {onnx_path}")
+    session = create_onnx_session(onnx_path)
+    tokenizer = load_tokenizer(model_path)
+    return _build_model_data(session, tokenizer, 'onnx')
+
+def _weights_fingerprint(model_path: Path) -> str:
+    """Identify the fp32 weights (and torch version) a cached artifact was built from."""
+    parts = [f"torch={torch.__version__}"]
+    for name in WEIGHT_FILE_NAMES:
+        weights = model_path / name
+        if weights.exists():
+            stat = weights.stat()
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+def quantize_model(model: Any) -> Any:
+    """Apply dynamic int8 quantization to the Linear layers of a model."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _int8_skeleton(model: Any) -> Any:
+    """
+    Copy of ``model`` with every Linear replaced by an empty dynamic int8
+    Linear, ready to receive cached quantized weights.
+    """
+    skeleton = copy.deepcopy(model)
+    
+    def swap(module):
+        for name, child in module.named_children():
+            if isinstance(child, torch.nn.Linear):
+                setattr(module, name, torch.ao.nn.quantized.dynamic.Linear(
+                    child.in_features,
+                    child.out_features,
+                    bias_=child.bias is not None,
+                    dtype=torch.qint8
+                ))
+            else:
+                swap(child)
+    
+    swap(skeleton)
+    return skeleton
+
+def _quantized_linear_weights(quantized: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Weights of every dynamic int8 Linear, by module name, stored as plain
+    int8 values plus per-tensor scale/zero point so they save and load
+    with ``weights_only=True``.
+    """
+    weights = {}
+    for name, module in quantized.named_modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            weight = module.weight()
+            weights[name] = {
+                'int_repr': weight.int_repr(),
+                'scale': weight.q_scale(),
+                'zero_point': weight.q_zero_point(),
+                'bias': module.bias()
+            }
+    return weights
+
+def load_agreement_texts(limit: int = QUANTIZATION_CHECK_SAMPLES, data_path: Path = AGREEMENT_DATA_PATH) -> List[str]:
+    """
+    Load held-out tweets for checking a converted model against fp32.
+    
+    Uses the same 80/20 split (random_state=42) as train.py so the texts
+    were not seen in training; falls back to the tail of the dataset if
+    scikit-learn is not installed.
+    """
+    with open(data_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    tweets = data['tweets'] if isinstance(data, dict) and 'tweets' in data else data
+    
+    texts, labels = [], []
+    for tweet in tweets:
+        if isinstance(tweet, dict):
+            text = tweet.get('cleaned_text') or tweet.get('content') or tweet.get('text', '')
+            if text:
+                texts.append(text)
+                labels.append(str(tweet.get('sentiment_label', '')).lower())
+    
+    try:
+        from sklearn.model_selection import train_test_split  # type: ignore
+        try:
+            _, held_out = train_test_split(texts, test_size=0.2, random_state=42, stratify=labels)
+        except ValueError:
+            _, held_out = train_test_split(texts, test_size=0.2, random_state=42)
+    except ImportError:
+        held_out = texts[-max(1, len(texts) // 5):]
+    
+    return held_out[:limit]
+
+def check_label_agreement(reference_model: Any, candidate_model: Any, tokenizer: Any, texts: List[str]) -> float:
+    """
+    Fraction of texts for which two torch models predict the same label.
+    
+    Args:
+        reference_model: Model treated as ground truth (fp32)
+        candidate_model: Converted model to check
+        tokenizer: Tokenizer shared by both models
+        texts: Texts to compare on
+    """
+    if not texts:
+        return 1.0
+    
+    agreed = 0
+    for start in range(0, len(texts), INFERENCE_BATCH_SIZE):
+        inputs = tokenizer(
+            texts[start:start + INFERENCE_BATCH_SIZE],
+            truncation=True,
+            padding='longest',
+            max_length=MAX_SEQUENCE_LENGTH,
+            return_tensors='pt'
+        )
+        with torch.no_grad():
+            reference_ids = reference_model(**inputs).logits.argmax(dim=-1)
+            candidate_ids = candidate_model(**inputs).logits.argmax(dim=-1)
+        agreed += int((reference_ids == candidate_ids).sum().item())
+    return agreed / len(texts)
+
+def _load_quantized_model(
+    model: Any,
+    tokenizer: Any,
+    model_path: Path = MODEL_PATH,
+    check_agreement: bool = True,
+    agreement_data_path: Path = AGREEMENT_DATA_PATH
+) -> Optional[Any]:
+    """
+    Build (or load from cache) the int8 model and check it against fp32.
+    
+    The measured agreement is stored in the cache. With
+    ``check_agreement=False`` no forward pass runs and nothing is
+    quantized: only a cache holding a recorded agreement is used.
+    
+    Args:
+        model: fp32 model
+        tokenizer: Tokenizer of the model
+        model_path: Model directory holding the cache
+        check_agreement: Run the fp32/int8 agreement check
+        agreement_data_path: Labeled tweets for the agreement check
+    
+    Returns:
+        Quantized model, or None if it fails the agreement check (or, without
+        the check, if there is no checked cache for these weights)
+    """
+    cache_path = model_path / QUANTIZED_MODEL_NAME
+    fingerprint = _weights_fingerprint(model_path)
+    
+    quantized = agreement = None
+    if cache_path.exists():
+        try:
+            cached = torch.load(str(cache_path), weights_only=True)
+            if cached.get('fingerprint') == fingerprint:
+                # Only Linear layers change; everything else comes from fp32
+                quantized = _int8_skeleton(model)
+                for name, entry in cached['linear_weights'].items():
+                    weight = torch._make_per_tensor_quantized_tensor(
+                        entry['int_repr'], entry['scale'], entry['zero_point']
+                    )
+                    quantized.get_submodule(name).set_weight_bias(weight, entry['bias'])
+                agreement = cached.get('agreement')
+                logger.info(f"Loaded quantized model from {cache_path}")
+            else:
+                logger.info("Quantized model cache is stale, re-quantizing")
+        except Exception as e:
+            logger.warning(f"Could not read quantized model cache: {e}")
+            quantized = agreement = None
+    
+    if not check_agreement:
+        if quantized is None or agreement is None:
+            logger.warning(f"No checked quantized model for these weights at {cache_path}")
+            return None
+        quantized.eval()
+    else:
+        if quantized is None:
+            logger.info("Applying dynamic int8 quantization...")
+            quantized = quantize_model(model)
+        quantized.eval()
+        cached_agreement = agreement
+        agreement = check_label_agreement(
+            model, quantized, tokenizer, load_agreement_texts(data_path=agreement_data_path)
+        )
+        if agreement != cached_agreement:
+            try:
+                tmp_path = cache_path.with_suffix(".pt.tmp")
+                torch.save({
+                    'fingerprint': fingerprint,
+                    'linear_weights': _quantized_linear_weights(quantized),
+                    'agreement': agreement
+                }, str(tmp_path))
+                os.replace(tmp_path, cache_path)
+                logger.info(f"Cached quantized model at {cache_path}")
+            except OSError as e:
+                logger.warning(f"Could not cache quantized model: {e}")
+    
+    logger.info(f"int8/fp32 label agreement: {agreement:.2%} (minimum {QUANTIZATION_MIN_AGREEMENT:.2%})")
+    if agreement < QUANTIZATION_MIN_AGREEMENT:
+        logger.error("Quantized model failed the agreement check, refusing to serve it")
+        return None
+    return quantized
+
+def load_model(run_inference: bool = True):
     """
     Load the trained DistilBERT sentiment analysis model.
+    
+    Uses the engine selected by INFERENCE_ENGINE; when the ONNX engine
+    cannot be set up the PyTorch model is served instead.
+    
+    Args:
+        run_inference: Allow running the model while loading (the ONNX
+            export and the int8 agreement check). Without it those engines
+            only load the artifacts built by prepare_engine_artifacts and
+            fall back to fp32 if they are missing.
     """
-    if not TORCH_AVAILABLE:
-        logger.warning("PyTorch/Transformers not available. Cannot load model.")
+    if DistilBertTokenizer is None:
+        logger.warning("Transformers not available. Cannot load model.")
         return None
     
     try:
         
         if MODEL_PATH.exists():
+            if INFERENCE_ENGINE == "onnx":
+                try:
+                    model_data = _load_onnx_model(MODEL_PATH, export=run_inference)
+                except Exception as e:
+                    logger.error(f"Error loading ONNX model: {e}")
+                    model_data = None
+                if model_data is not None:
+                    logger.info("✅ Model loaded successfully (ONNX Runtime)")
+                    return model_data
+                logger.warning("Falling back to PyTorch engine")
+            
+            if not _import_torch():
+                logger.warning("PyTorch/Transformers not available. Cannot load model.")
+                return None
+            
             logger.info(f"Loading trained model from {MODEL_PATH}")
             
             # Load tokenizer and model
-            if DistilBertTokenizer is None or DistilBertForSequenceClassification is None:
-                logger.error("Transformers library not available")
-                return None
-                
-            tokenizer = DistilBertTokenizer.from_pretrained(str(MODEL_PATH))
+            tokenizer = load_tokenizer(MODEL_PATH)
             model = DistilBertForSequenceClassification.from_pretrained(str(MODEL_PATH))
             model.eval()
             
-            # Load label map
-            label_map = {}
-            if LABEL_MAP_PATH.exists():
-                with open(LABEL_MAP_PATH, 'r') as f:
-                    label_map = json.load(f)
+            if INFERENCE_ENGINE == "torch-int8":
+                try:
+                    quantized = _load_quantized_model(model, tokenizer, MODEL_PATH, check_agreement=run_inference)
+                except Exception as e:
+                    logger.error(f"Error quantizing model: {e}")
+                    quantized = None
+                if quantized is not None:
+                    logger.info("✅ Model loaded successfully (dynamic int8)")
+                    return _build_model_data(quantized, tokenizer, 'torch-int8')
+                logger.warning("Serving the fp32 model instead")
             
             logger.info("✅ Model loaded successfully")
-            return {
-                'model': model,
-                'tokenizer': tokenizer,
-                'label_map': label_map
-            }
+            return _build_model_data(model, tokenizer, 'torch')
         else:
             logger.warning(f"Trained model not found at {MODEL_PATH}")
             logger.info("Using placeholder sentiment analysis")
@@ -72,14 +620,132 @@ def load_model():
 
 # Initialize model (lazy loading)
 _model = None
+# Inference threads and the event loop may both trigger the first load
+_model_lock = threading.Lock()
+
+_swap_lock = threading.Lock()
+
+class ModelSwapInProgressError(RuntimeError):
+    """Raised when a model hot-swap is requested while another is running."""
+
+def prepare_engine_artifacts(
+    model_path: Path = MODEL_PATH,
+    engine: str = INFERENCE_ENGINE,
+    agreement_data_path: Path = AGREEMENT_DATA_PATH
+) -> bool:
+    """
+    Build the files an engine loads from without running the model.
+    
+    Exports model.onnx for the ONNX engine, or quantizes and checks the
+    int8 model for torch-int8 (the agreement is stored with the cache).
+    Both run the model, so a process that forks afterwards (the pre-fork
+    master) calls this in a separate process and then loads with
+    ``load_model(run_inference=False)``.
+    
+    Returns:
+        True if the engine's artifacts are up to date
+    """
+    try:
+        if engine == "onnx":
+            onnx_path = model_path / ONNX_MODEL_NAME
+            if onnx_path.exists() and not _onnx_export_stale(onnx_path, model_path):
+                return True
+            if not _import_torch():
+                logger.warning(f"{onnx_path} not found and PyTorch is not available to export it")
+                return False
+            model = DistilBertForSequenceClassification.from_pretrained(str(model_path))
+            model.eval()
+            export_onnx_model(model, onnx_path)
+            return True
+        
+        if engine == "torch-int8":
+            if not _import_torch():
+                return False
+            tokenizer = load_tokenizer(model_path)
+            model = DistilBertForSequenceClassification.from_pretrained(str(model_path))
+            model.eval()
+            return _load_quantized_model(
+                model, tokenizer, model_path, agreement_data_path=agreement_data_path
+            ) is not None
+    except Exception as e:
+        logger.error(f"Error preparing {engine} engine: {e}")
+        return False
+    return True
+
+def _load_timed_model(run_inference: bool = True) -> Optional[Dict[str, Any]]:
+    """Load the model and record how long loading took."""
+    start = time.perf_counter()
+    model_data = load_model(run_inference=run_inference)
+    if model_data is not None:
+        model_data['load_time_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return model_data
 
 def get_model():
     """Get or load the sentiment analysis model."""
     global _model
     if _model is None:
-        _model = load_model()
+        with _model_lock:
+            if _model is None:
+                _model = _load_timed_model()
     return _model
 
+def swap_model(model_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Atomically replace the serving model.
+    
+    Requests that already fetched the previous model finish on it; new
+    requests get the new one.
+    
+    Returns:
+        The previous model dictionary
+    """
+    global _model
+    with _model_lock:
+        previous, _model = _model, model_data
+    prediction_cache.clear()
+    near_duplicate_index.clear()
+    return previous
+
+def hot_swap_model(warmup: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Load the model on disk next to the serving one, warm it up and swap it in.
+    
+    The current model keeps serving while the new one loads; if loading
+    fails it stays in place.
+    
+    Args:
+        warmup: Run synthetic batches in every sequence bucket before swapping
+    
+    Returns:
+        The new model dictionary, or None if loading failed
+    
+    Raises:
+        ModelSwapInProgressError: If another swap is running
+    """
+    if not _swap_lock.acquire(blocking=False):
+        raise ModelSwapInProgressError("Model swap already in progress")
+    try:
+        model_data = _load_timed_model()
+        if model_data is None:
+            logger.error("Hot-swap aborted: new model could not be loaded")
+            return None
+        
+        if warmup:
+            model_data['warmup_ms'] = round(warm_up_model(model_data, WARMUP_BATCH_SIZES), 2)
+        swap_model(model_data)
+        logger.info(f"✅ Swapped in model version {model_data['version']}")
+        return model_data
+    finally:
+        _swap_lock.release()
+
+def get_inference_engine(model_data: Optional[Dict[str, Any]] = None) -> str:
+    """Name of the engine serving predictions ("placeholder" without a model)."""
+    if model_data is None:
+        model_data = get_model()
+    if model_data is None:
+        return "placeholder"
+    return model_data.get('engine', 'torch')
+
 # Reverse label map for lookup
 def get_label_map_reverse():
     """Get reverse label map (name -> id)."""
@@ -88,21 +754,119 @@ def get_label_map_reverse():
         return {v: k for k, v in model_data['label_map'].items()}
     return {}
 
-def analyze_text(text: str) -> Dict[str, Any]:
+# Prediction cache configuration (size 0 disables the cache)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "3600"))
+
+class PredictionCache:
     """
-    Analyze sentiment of a given text using trained DistilBERT model.
-    Optimized for low latency inference.
+    Bounded LRU cache of prediction results with a per-entry TTL.
     
-    Args:
-        text: Text to analyze (will be trimmed to 1000 chars if longer)
+    Keys are hashes of normalized text (see normalize_cache_text). Hits,
+    misses, evictions and expirations are reported to the metrics collector.
+    """
     
-    Returns:
-        Dictionary with sentiment, confidence, and label
+    def __init__(self, max_size: int = PREDICTION_CACHE_SIZE, ttl_seconds: float = PREDICTION_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for ``key``, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                metrics.record_cache_event("miss")
+                return None
+            
+            stored_at, result = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                metrics.record_cache_event("expiration")
+                metrics.record_cache_event("miss")
+                return None
+            
+            self._entries.move_to_end(key)
+            metrics.record_cache_event("hit")
+            return dict(result)
+    
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a result, evicting least recently used entries when full."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                metrics.record_cache_event("eviction")
+    
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+
+# Global prediction cache instance
+prediction_cache = PredictionCache()
+
+def normalize_cache_text(text: str, lowercase: bool = False) -> str:
+    """Trim, collapse whitespace and (for uncased models) case-fold text."""
+    text = " ".join(text.split())
+    return text.casefold() if lowercase else text
+
+def _cache_key(text: str, lowercase: bool = False, version: str = "") -> str:
+    """Hash of the model version and normalized text used as prediction cache key."""
+    normalized = normalize_cache_text(text, lowercase)
+    return hashlib.blake2b(f"{version}\0{normalized}".encode('utf-8'), digest_size=16).hexdigest()
+
+# Input limits
+MAX_TEXT_LENGTH = 1000
+MAX_SEQUENCE_LENGTH = 128
+
+# Maximum texts per forward pass in batch inference
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "128"))
+
+# Maximum padded tokens (rows x padded length) per forward pass; batches are
+# sorted by token length and split so short tweets are not padded to long ones
+INFERENCE_TOKEN_BUDGET = int(os.getenv("INFERENCE_TOKEN_BUDGET", "4096"))
+
+def _parse_sequence_buckets(value: str) -> Tuple[int, ...]:
+    """Parse a comma-separated list of padded sequence lengths."""
+    buckets = {min(int(item), MAX_SEQUENCE_LENGTH) for item in value.split(",") if item.strip()}
+    buckets.add(MAX_SEQUENCE_LENGTH)
+    return tuple(sorted(bucket for bucket in buckets if bucket > 0))
+
+# Padded sequence lengths used for inference; a batch is padded to the
+# smallest bucket that fits its longest sequence so tensor shapes repeat
+SEQUENCE_BUCKETS = _parse_sequence_buckets(os.getenv("SEQUENCE_BUCKETS", "16,32,64,128"))
+
+# Rows per synthetic warm-up batch; each size is run once in every bucket
+WARMUP_BATCH_SIZES = tuple(
+    int(item) for item in os.getenv("WARMUP_BATCH_SIZES", "1,8,32").split(",") if item.strip() and int(item) > 0
+) or (1,)
+
+# Result returned for texts that fail validation inside a batch
+INVALID_TEXT_RESULT = {
+    "sentiment": "neutral",
+    "confidence": 0.0,
+    "label": "NEU"
+}
+
+def _prepare_text(text: str) -> str:
+    """
+    Validate and normalize a single input text.
     
     Raises:
         ValueError: If text is invalid or empty
     """
-    # Validate and preprocess input
     if not text or not isinstance(text, str):
         raise ValueError("Text must be a non-empty string")
     
@@ -111,9 +875,394 @@ def analyze_text(text: str) -> Dict[str, Any]:
         raise ValueError("Text cannot be empty or whitespace only")
     
     # Truncate if too long (for performance)
-    if len(text) > 1000:
-        text = text[:1000]
-        logger.debug("Text truncated to 1000 characters")
+    if len(text) > MAX_TEXT_LENGTH:
+        text = text[:MAX_TEXT_LENGTH]
+        logger.debug(f"Text truncated to {MAX_TEXT_LENGTH} characters")
+    
+    return text
+
+def _format_prediction(predicted_id: int, confidence: float, label_map: Dict) -> Dict[str, Any]:
+    """Map a predicted class id and its probability to the API result format."""
+    # Map label ID to label name
+    # Handle both string and int keys in label_map
+    label_name = None
+    if label_map:
+        label_name = label_map.get(str(predicted_id)) or label_map.get(predicted_id)
+    
+    # Fallback to default mapping if label_map not found or missing
+    if not label_name and predicted_id in [0, 1, 2]:
+        default_labels = ['positive', 'negative', 'neutral']
+        label_name = default_labels[predicted_id]
+    elif not label_name:
+        label_name = 'neutral'  # Safe fallback
+    
+    # Format response
+    sentiment_map = {
+        'positive': 'positive',
+        'negative': 'negative',
+        'neutral': 'neutral'
+    }
+    
+    sentiment = sentiment_map.get(label_name.lower(), 'neutral')
+    
+    # Map to short label
+    label_short_map = {
+        'positive': 'POS',
+        'negative': 'NEG',
+        'neutral': 'NEU'
+    }
+    label_short = label_short_map.get(sentiment, 'NEU')
+    
+    return {
+        "sentiment": sentiment,
+        "confidence": float(confidence),
+        "label": label_short
+    }
+
+def _select_sequence_bucket(length: int) -> int:
+    """Return the smallest sequence bucket that fits ``length`` tokens."""
+    for bucket in SEQUENCE_BUCKETS:
+        if length <= bucket:
+            return bucket
+    return SEQUENCE_BUCKETS[-1]
+
+def _collate_to_bucket(rows: List[List[int]], bucket: int, pad_token_id: int, as_numpy: bool) -> Dict[str, Any]:
+    """
+    Right-pad tokenized rows to ``bucket`` and build model inputs.
+    
+    Args:
+        rows: Token ids per text (already truncated to MAX_SEQUENCE_LENGTH)
+        bucket: Padded sequence length
+        pad_token_id: Token id used for padding
+        as_numpy: Build numpy arrays (ONNX Runtime) instead of torch tensors
+    
+    Returns:
+        Dictionary with input_ids and attention_mask
+    """
+    if as_numpy:
+        input_ids = np.full((len(rows), bucket), pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), bucket), dtype=np.int64)
+        for row, ids in enumerate(rows):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+    else:
+        input_ids = torch.full((len(rows), bucket), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), bucket), dtype=torch.long)
+        for row, ids in enumerate(rows):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+    return {'input_ids': input_ids, 'attention_mask': attention_mask}
+
+def form_token_budget_batches(
+    lengths: List[int],
+    token_budget: int,
+    max_batch_size: Optional[int] = None
+) -> List[List[int]]:
+    """
+    Group texts into sub-batches of similar token length.
+    
+    Positions are sorted by token length and split greedily so that each
+    sub-batch's padded size (rows x sequence bucket of its longest row) stays
+    within ``token_budget``. A single text always forms a batch on its own,
+    even if it alone exceeds the budget.
+    
+    Args:
+        lengths: Token length of each text
+        token_budget: Maximum padded tokens per forward pass
+        max_batch_size: Optional cap on rows per forward pass
+    
+    Returns:
+        Lists of positions into ``lengths``, one list per forward pass
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for position in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        # Sorted ascending, so the newcomer decides the padded length
+        padded_tokens = (len(current) + 1) * _select_sequence_bucket(lengths[position])
+        full = max_batch_size is not None and len(current) >= max_batch_size
+        if current and (full or padded_tokens > token_budget):
+            batches.append(current)
+            current = []
+        current.append(position)
+    if current:
+        batches.append(current)
+    return batches
+
+def _run_onnx(session: Any, inputs: Dict[str, Any]) -> Tuple[List[int], List[float]]:
+    """Run an ONNX Runtime session and return predicted ids and confidences."""
+    input_names = {node.name for node in session.get_inputs()}
+    feed = {key: value.astype(np.int64) for key, value in inputs.items() if key in input_names}
+    with timed_stage("forward"):
+        logits = session.run(None, feed)[0]
+    
+    with timed_stage("softmax"):
+        # Numerically stable softmax
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        predictions = exp / exp.sum(axis=-1, keepdims=True)
+        return predictions.argmax(axis=-1).tolist(), predictions.max(axis=-1).tolist()
+
+def _tokenize(tokenizer: Any, texts: List[str]) -> List[List[int]]:
+    """Tokenize texts without padding, truncated to MAX_SEQUENCE_LENGTH."""
+    with timed_stage("tokenize"):
+        return tokenizer(texts, truncation=True, max_length=MAX_SEQUENCE_LENGTH)['input_ids']
+
+def _forward(model_data: Dict[str, Any], inputs: Dict[str, Any]) -> Tuple[List[int], List[float]]:
+    """Run the model on collated inputs and return predicted ids and confidences."""
+    if model_data.get('engine') == 'onnx':
+        return _run_onnx(model_data['model'], inputs)
+    
+    if torch is None:
+        raise RuntimeError("PyTorch not available")
+    
+    # Get predictions (inference mode - no gradients)
+    with torch.no_grad():
+        with timed_stage("forward"):
+            outputs = model_data['model'](**inputs)
+        with timed_stage("softmax"):
+            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+            # Predicted label and confidence for every row at once
+            confidence_tensor, predicted_tensor = torch.max(predictions, dim=-1)
+            return predicted_tensor.tolist(), confidence_tensor.tolist()
+
+def _predict_encoded(model_data: Dict[str, Any], rows: List[List[int]]) -> List[Dict[str, Any]]:
+    """
+    Run a single forward pass over tokenized texts.
+    
+    Args:
+        model_data: Loaded model dictionary from get_model()
+        rows: Token ids per text
+    
+    Returns:
+        List of sentiment analysis results, in input order
+    """
+    tokenizer = model_data['tokenizer']
+    onnx_engine = model_data.get('engine') == 'onnx'
+    
+    if not onnx_engine and torch is None:
+        raise RuntimeError("PyTorch not available")
+    
+    # Pad only up to the bucket of the longest row so shapes stay reusable
+    real_tokens = sum(len(ids) for ids in rows)
+    bucket = _select_sequence_bucket(max(len(ids) for ids in rows))
+    inputs = _collate_to_bucket(rows, bucket, tokenizer.pad_token_id or 0, as_numpy=onnx_engine)
+    metrics.record_sequence_bucket(bucket)
+    metrics.record_padding(real_tokens, len(rows) * bucket)
+    
+    # Warm-up calls _forward directly, so this only times real tweets
+    forward_start = time.perf_counter()
+    predicted_ids, confidences = _forward(model_data, inputs)
+    metrics.record_model_inference((time.perf_counter() - forward_start) * 1000)
+    
+    results = []
+    for predicted_id, confidence in zip(predicted_ids, confidences):
+        result = _format_prediction(predicted_id, confidence, model_data['label_map'])
+        result['tier'] = TIER_MODEL
+        results.append(result)
+    return results
+
+def warm_up_model(
+    model_data: Dict[str, Any],
+    batch_sizes: Tuple[int, ...] = (1,),
+    buckets: Optional[Tuple[int, ...]] = None
+) -> float:
+    """
+    Run synthetic batches through a model before it serves traffic.
+    
+    Every batch size is run once in every sequence bucket so allocator
+    growth, thread-pool start-up and kernel selection happen here rather
+    than on real requests. Metrics are not recorded.
+    
+    Args:
+        model_data: Loaded model dictionary
+        batch_sizes: Rows per synthetic batch
+        buckets: Padded sequence lengths (default: SEQUENCE_BUCKETS)
+    
+    Returns:
+        Warm-up duration in milliseconds
+    """
+    start = time.perf_counter()
+    tokenizer = model_data['tokenizer']
+    onnx_engine = model_data.get('engine') == 'onnx'
+    
+    for bucket in buckets or SEQUENCE_BUCKETS:
+        ids = tokenizer("warm up " * bucket, truncation=True, max_length=bucket)['input_ids']
+        for batch_size in batch_sizes:
+            inputs = _collate_to_bucket([ids] * batch_size, bucket, tokenizer.pad_token_id or 0, as_numpy=onnx_engine)
+            _forward(model_data, inputs)
+    
+    if model_data.get('fast_tier') is not None:
+        predict_fast_tier(model_data['fast_tier'], ["warm up"] * max(batch_sizes))
+    
+    return (time.perf_counter() - start) * 1000
+
+def _predict_batch(model_data: Dict[str, Any], texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Run a single forward pass over a list of already validated texts.
+    
+    Args:
+        model_data: Loaded model dictionary from get_model()
+        texts: Validated texts (see _prepare_text)
+    
+    Returns:
+        List of sentiment analysis results, in input order
+    """
+    return _predict_encoded(model_data, _tokenize(model_data['tokenizer'], texts))
+
+def _predict_with_cache(
+    model_data: Dict[str, Any],
+    texts: List[str],
+    batch_size: Optional[int] = None,
+    stats: Optional[Dict[str, int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Predict validated texts, serving repeats from the prediction cache and
+    running the rest through the model in length-sorted sub-batches of at
+    most INFERENCE_TOKEN_BUDGET padded tokens (and ``batch_size`` rows).
+    
+    With near-duplicate reuse enabled, texts similar enough to a recently
+    scored one reuse its prediction; a sample of them is run anyway to
+    measure agreement. With the cascade enabled, the fast tier answers texts
+    it scores at or above CASCADE_CONFIDENCE_THRESHOLD and only the rest
+    reach the model.
+    
+    Results are scattered back to input order. Sub-batches that fail
+    inference fall back to placeholder analysis (not cached). If ``stats``
+    is given, the number of texts answered by the fast tier is stored in it
+    under "fast_tier_texts" and the number sent to the model under
+    "inferred_texts".
+    """
+    batch_size = batch_size or INFERENCE_BATCH_SIZE
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    keys: List[Optional[str]] = [None] * len(texts)
+    
+    pending = []
+    lowercase = model_data.get('lowercase', False)
+    version = model_data.get('version', '')
+    for i, text in enumerate(texts):
+        if prediction_cache.enabled:
+            # Keyed by version so requests finishing on a swapped-out model
+            # cannot leave stale entries behind
+            keys[i] = _cache_key(text, lowercase, version)
+            cached = prediction_cache.get(keys[i])  # type: ignore[arg-type]
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.append(i)
+    
+    # Reused predictions sampled for the agreement check, by position
+    sampled: Dict[int, Dict[str, Any]] = {}
+    if near_duplicate_index.enabled and pending:
+        still_pending = []
+        for i in pending:
+            match = near_duplicate_index.lookup(texts[i], version)
+            if match is None:
+                still_pending.append(i)
+            elif near_duplicate_index.should_sample():
+                sampled[i] = match[0]
+                still_pending.append(i)
+            else:
+                results[i] = match[0]
+        pending = still_pending
+    
+    inferred = list(pending)
+    failed = set()
+    
+    fast_tier = model_data.get('fast_tier')
+    if fast_tier is not None and pending:
+        try:
+            with timed_stage("fast_tier"):
+                fast_results = predict_fast_tier(fast_tier, [texts[i] for i in pending])
+        except Exception as e:
+            logger.error(f"Error in fast tier inference: {e}", exc_info=True)
+            fast_results = None
+        
+        if fast_results is not None:
+            escalated = []
+            for i, result in zip(pending, fast_results):
+                if result['confidence'] >= CASCADE_CONFIDENCE_THRESHOLD:
+                    results[i] = result
+                    if keys[i] is not None:
+                        prediction_cache.put(keys[i], result)  # type: ignore[arg-type]
+                else:
+                    escalated.append(i)
+            metrics.record_cascade(len(pending) - len(escalated), len(escalated))
+            if stats is not None:
+                stats['fast_tier_texts'] = len(pending) - len(escalated)
+            pending = escalated
+    
+    if stats is not None:
+        stats['inferred_texts'] = len(pending)
+    if pending:
+        _predict_pending(model_data, texts, pending, results, keys, batch_size, failed)
+    
+    for i in inferred:
+        if i in failed:
+            continue
+        near_duplicate_index.add(texts[i], results[i], version)  # type: ignore[arg-type]
+        if i in sampled:
+            agreed = sampled[i]['label'] == results[i]['label']  # type: ignore[index]
+            metrics.record_near_duplicate("agree" if agreed else "disagree")
+    
+    return results  # type: ignore[return-value]
+
+def _predict_pending(
+    model_data: Dict[str, Any],
+    texts: List[str],
+    pending: List[int],
+    results: List[Optional[Dict[str, Any]]],
+    keys: List[Optional[str]],
+    batch_size: int,
+    failed: set
+):
+    """
+    Run ``texts[i]`` for every ``i`` in ``pending`` through the model and
+    store results (and cache entries) in place. Positions that fell back
+    to placeholder analysis are added to ``failed``.
+    """
+    try:
+        # Tokenize once; token lengths decide how sub-batches are formed
+        rows = _tokenize(model_data['tokenizer'], [texts[i] for i in pending])
+    except Exception as e:
+        logger.error(f"Error tokenizing batch: {e}", exc_info=True)
+        for i in pending:
+            results[i] = placeholder_sentiment_analysis(texts[i])
+        failed.update(pending)
+        return
+    
+    lengths = [len(ids) for ids in rows]
+    for sub_batch in form_token_budget_batches(lengths, INFERENCE_TOKEN_BUDGET, batch_size):
+        positions = [pending[j] for j in sub_batch]
+        try:
+            sub_results = _predict_encoded(model_data, [rows[j] for j in sub_batch])
+        except Exception as e:
+            logger.error(f"Error in model inference: {e}", exc_info=True)
+            # Fallback to placeholder
+            for i in positions:
+                results[i] = placeholder_sentiment_analysis(texts[i])
+            failed.update(positions)
+            continue
+        
+        for i, result in zip(positions, sub_results):
+            results[i] = result
+            if keys[i] is not None:
+                prediction_cache.put(keys[i], result)  # type: ignore[arg-type]
+
+def analyze_text(text: str) -> Dict[str, Any]:
+    """
+    Analyze sentiment of a given text using trained DistilBERT model.
+    Optimized for low latency inference.
+    
+    Args:
+        text: Text to analyze (will be trimmed to 1000 chars if longer)
+    
+    Returns:
+        Dictionary with sentiment, confidence, and label
+    
+    Raises:
+        ValueError: If text is invalid or empty
+    """
+    # Validate and preprocess input
+    text = _prepare_text(text)
     
     model_data = get_model()
     
@@ -122,103 +1271,92 @@ def analyze_text(text: str) -> Dict[str, Any]:
         logger.warning("Model not loaded, using placeholder")
         return placeholder_sentiment_analysis(text)
     
-    try:
-        # Use trained model
-        model = model_data['model']
-        tokenizer = model_data['tokenizer']
-        label_map = model_data['label_map']
-        
-        # Tokenize input (optimized for inference)
-        inputs = tokenizer(
-            text,
-            truncation=True,
-            padding='max_length',
-            max_length=128,
-            return_tensors='pt'
-        )
-        
-        # Get predictions (inference mode - no gradients)
-        if torch is None:
-            logger.error("PyTorch not available")
-            return placeholder_sentiment_analysis(text)
-            
-        with torch.no_grad():
-            outputs = model(**inputs)
-            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        
-        # Get predicted label and confidence
-        predicted_id = torch.argmax(predictions, dim=-1).item()
-        confidence = predictions[0][predicted_id].item()
-        
-        # Map label ID to label name
-        # Handle both string and int keys in label_map
-        label_name = None
-        if label_map:
-            label_name = label_map.get(str(predicted_id)) or label_map.get(predicted_id)
-        
-        # Fallback to default mapping if label_map not found or missing
-        if not label_name and predicted_id in [0, 1, 2]:
-            default_labels = ['positive', 'negative', 'neutral']
-            label_name = default_labels[predicted_id]
-        elif not label_name:
-            label_name = 'neutral'  # Safe fallback
-        
-        # Format response
-        sentiment_map = {
-            'positive': 'positive',
-            'negative': 'negative',
-            'neutral': 'neutral'
-        }
-        
-        sentiment = sentiment_map.get(label_name.lower(), 'neutral')
+    return _predict_with_cache(model_data, [text])[0]
+
+def analyze_batch_with_stats(
+    texts: List[str],
+    batch_size: Optional[int] = None
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Batch analysis that also reports how much work the batch needed.
+    
+    Identical texts (compared like prediction cache keys) are analyzed once
+    and the result is copied to every position they appear at. See
+    analyze_batch_optimized for how the unique texts are batched.
+    
+    Args:
+        texts: List of texts to analyze
+        batch_size: Maximum texts per forward pass (default: INFERENCE_BATCH_SIZE)
+    
+    Returns:
+        Tuple of (results in input order, stats) where stats holds
+        total_texts, unique_texts, fast_tier_texts (unique texts answered by
+        the cascade fast tier) and inferred_texts (unique texts actually run
+        through the model, i.e. not served from the prediction cache, a
+        near-duplicate or the fast tier)
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    stats = {'total_texts': len(texts), 'unique_texts': 0, 'fast_tier_texts': 0, 'inferred_texts': 0}
+    
+    # Validate up front so bad inputs don't break the batch
+    valid_indices = []
+    valid_texts = []
+    for i, text in enumerate(texts):
+        try:
+            valid_texts.append(_prepare_text(text))
+            valid_indices.append(i)
+        except ValueError as e:
+            logger.warning(f"Skipping invalid text at index {i}: {e}")
+            results[i] = dict(INVALID_TEXT_RESULT)
+    
+    if valid_texts:
+        model_data = get_model()
+        lowercase = model_data.get('lowercase', False) if model_data else False
         
-        # Map to short label
-        label_short_map = {
-            'positive': 'POS',
-            'negative': 'NEG',
-            'neutral': 'NEU'
-        }
-        label_short = label_short_map.get(sentiment, 'NEU')
+        # Retweets and copypasta: run each unique text once
+        unique_slots: Dict[str, int] = {}
+        unique_texts = []
+        slots = []
+        for text in valid_texts:
+            normalized = normalize_cache_text(text, lowercase)
+            if normalized not in unique_slots:
+                unique_slots[normalized] = len(unique_texts)
+                unique_texts.append(text)
+            slots.append(unique_slots[normalized])
+        stats['unique_texts'] = len(unique_texts)
         
-        return {
-            "sentiment": sentiment,
-            "confidence": float(confidence),
-            "label": label_short
-        }
+        if model_data is None:
+            logger.warning("Model not loaded, using placeholder")
+            unique_results = [placeholder_sentiment_analysis(text) for text in unique_texts]
+            stats['inferred_texts'] = len(unique_texts)
+        else:
+            unique_results = _predict_with_cache(model_data, unique_texts, batch_size, stats)
         
-    except Exception as e:
-        logger.error(f"Error in model inference: {e}", exc_info=True)
-        # Fallback to placeholder
-        return placeholder_sentiment_analysis(text)
+        # Fan results out with a copy per position
+        for index, slot in zip(valid_indices, slots):
+            results[index] = dict(unique_results[slot])
+    
+    return results, stats  # type: ignore[return-value]
 
-def analyze_batch_optimized(texts: List[str]) -> List[Dict[str, Any]]:
+def analyze_batch_optimized(texts: List[str], batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
     """
-    Optimized batch analysis function for processing multiple texts.
-    Can be used for batch inference optimization in the future.
+    Batch analysis function for processing multiple texts.
+    
+    Duplicate texts are analyzed once. All unique valid texts not found in
+    the prediction cache are tokenized together, sorted by token length and
+    run through the model in sub-batches capped by INFERENCE_TOKEN_BUDGET
+    padded tokens, one forward pass per sub-batch. Results are returned in
+    input order. Invalid texts get a neutral result with 0.0 confidence
+    instead of failing the batch.
     
     Args:
         texts: List of texts to analyze
+        batch_size: Maximum texts per forward pass (default: INFERENCE_BATCH_SIZE)
     
     Returns:
-        List of sentiment analysis results
-    
-    Note: Future optimization can implement true batch inference
-    by tokenizing all texts together and processing in a single forward pass.
+        List of sentiment analysis results, in input order
     """
-    # For now, process sequentially
-    # Future: Can implement true batch inference with torch.no_grad() for all at once
-    results = []
-    for text in texts:
-        try:
-            results.append(analyze_text(text))
-        except ValueError as e:
-            logger.warning(f"Skipping invalid text: {e}")
-            results.append({
-                "sentiment": "neutral",
-                "confidence": 0.0,
-                "label": "NEU"
-            })
-    return results
+    return analyze_batch_with_stats(texts, batch_size)[0]
 
 def placeholder_sentiment_analysis(text: str) -> Dict[str, Any]:
     """
@@ -250,7 +1388,8 @@ def placeholder_sentiment_analysis(text: str) -> Dict[str, Any]:
     return {
         "sentiment": sentiment,
         "confidence": confidence,
-        "label": label
+        "label": label,
+        "tier": TIER_PLACEHOLDER
     }
 
 def format_result(model_output: Any) -> Optional[Dict[str, Any]]:
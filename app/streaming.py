@@ -0,0 +1,533 @@
+"""
+Streaming batch prediction for TweetMoodAI
+Reads newline-delimited tweets from a streamed request body and streams
+NDJSON results back sub-batch by sub-batch, so memory use does not grow
+with the size of the input
+"""
+import asyncio
+import heapq
+import json
+import os
+import tempfile
+import time
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+from app.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# Streaming configuration
+# Input lines collected from the request body per inference call
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "256"))
+# Longer lines are reported as errors without being buffered
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", "65536"))
+# Spooled results beyond this size are kept in a temporary file instead of memory
+STREAM_SPOOL_MEMORY_BYTES = int(os.getenv("STREAM_SPOOL_MEMORY_BYTES", "1048576"))
+# Spooled results are written and read back in blocks of this size
+SPOOL_BLOCK_BYTES = 65536
+
+# Same limit as TweetRequest / BatchTweetRequest
+MAX_TWEET_LENGTH = 1000
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Content types whose lines are raw tweet text instead of JSON
+PLAIN_TEXT_MEDIA_TYPES = ("text/plain", "text/csv")
+
+# A parsed input line: (line number, client id, tweet text or None, error or None)
+StreamItem = Tuple[int, Any, Optional[str], Optional[str]]
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int = STREAM_MAX_LINE_BYTES
+) -> AsyncIterator[Optional[bytes]]:
+    """
+    Split a byte stream into lines without buffering more than one line.
+
+    Args:
+        chunks: Request body chunks
+        max_line_bytes: Longest line kept; longer lines yield None
+
+    Yields:
+        Each line without its line terminator, or None for an oversized line
+    """
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        # Only the unfinished last line is carried over between chunks
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline < 0:
+                break
+            line = buffer[start:newline]
+            start = newline + 1
+            if oversized:
+                oversized = False
+                yield None
+            elif len(line) > max_line_bytes:
+                yield None
+            else:
+                yield line.rstrip(b"\r")
+        buffer = buffer[start:]
+        if len(buffer) > max_line_bytes:
+            # Drop the rest of this line as it arrives
+            oversized = True
+            buffer = b""
+    if oversized:
+        yield None
+    elif buffer.strip():
+        yield buffer.rstrip(b"\r")
+
+
+def parse_line(line: Optional[bytes], line_number: int, plain_text: bool = False) -> Optional[StreamItem]:
+    """
+    Parse and validate one input line.
+
+    NDJSON lines are either a JSON string or an object with ``tweet_text``
+    (or ``text``) and an optional ``id`` echoed back in the result. Plain
+    text lines are the tweet itself.
+
+    Args:
+        line: Raw line, or None if it exceeded the line size limit
+        line_number: 1-based line number in the request body
+        plain_text: Whether lines are raw text instead of JSON
+
+    Returns:
+        StreamItem, or None for blank lines
+    """
+    if line is None:
+        return line_number, None, None, f"Line exceeds {STREAM_MAX_LINE_BYTES} bytes"
+    try:
+        decoded = line.decode("utf-8")
+    except UnicodeDecodeError:
+        return line_number, None, None, "Line is not valid UTF-8"
+    if not decoded.strip():
+        return None
+
+    if plain_text:
+        return parse_record(decoded, line_number)
+    try:
+        value = json.loads(decoded)
+    except ValueError:
+        return line_number, None, None, "Line is not valid JSON"
+    return parse_record(value, line_number)
+
+
+def parse_record(value: Any, line_number: int) -> StreamItem:
+    """
+    Validate one decoded input record.
+
+    Args:
+        value: A tweet string, or an object with ``tweet_text`` (or ``text``)
+            and an optional ``id``
+        line_number: 1-based position of the record in its stream
+
+    Returns:
+        StreamItem with either the stripped tweet text or an error
+    """
+    tweet_id = None
+    if isinstance(value, dict):
+        tweet_id = value.get("id")
+        text = value.get("tweet_text", value.get("text"))
+    else:
+        text = value
+    if not isinstance(text, str):
+        return line_number, tweet_id, None, "Expected a string or an object with tweet_text"
+
+    text = text.strip()
+    if not text:
+        return line_number, tweet_id, None, "Tweet is empty or whitespace only"
+    if len(text) > MAX_TWEET_LENGTH:
+        return line_number, tweet_id, None, f"Tweet exceeds {MAX_TWEET_LENGTH} characters"
+    return line_number, tweet_id, text, None
+
+
+async def iter_sub_batches(
+    chunks: AsyncIterator[bytes],
+    plain_text: bool = False,
+    batch_size: int = STREAM_BATCH_SIZE
+) -> AsyncIterator[List[StreamItem]]:
+    """
+    Group parsed input lines into sub-batches of at most ``batch_size`` lines.
+
+    Invalid lines travel with the sub-batch they were read in, so results
+    keep the input order.
+    """
+    batch: List[StreamItem] = []
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        item = parse_line(line, line_number, plain_text)
+        if item is None:
+            continue
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    """Encode a record as one NDJSON line."""
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def result_record(item: StreamItem, result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the output record for an input line and its result (None = error)."""
+    line_number, tweet_id, text, error = item
+    record: Dict[str, Any] = {"line": line_number}
+    if tweet_id is not None:
+        record["id"] = tweet_id
+    if result is None:
+        record["error"] = error or "Internal error while analyzing tweet"
+        return record
+    record.update(
+        tweet_text=text,
+        sentiment=result['sentiment'],
+        confidence=round(result['confidence'], 4),
+        label=result['label'],
+        tier=result.get('tier')
+    )
+    return record
+
+
+async def scored_batches(
+    chunks: AsyncIterator[bytes],
+    analyze: Callable[[List[str]], Any],
+    plain_text: bool = False,
+    batch_size: int = STREAM_BATCH_SIZE,
+    endpoint: str = "/predict/stream"
+) -> AsyncIterator[Tuple[List[StreamItem], List[Optional[Dict[str, Any]]]]]:
+    """
+    Score a streamed request body sub-batch by sub-batch.
+
+    Reading the next sub-batch overlaps with inference on the current one;
+    at most two sub-batches are held at a time.
+
+    Args:
+        chunks: Request body chunks
+        analyze: Awaitable batch scorer taking a list of tweets
+        plain_text: Whether input lines are raw text instead of JSON
+        batch_size: Input lines per inference call
+        endpoint: Endpoint name for error metrics
+
+    Yields:
+        (sub-batch, results) in input order; a result is None for invalid
+        lines and for sub-batches that failed to score
+    """
+    async def score(batch: List[StreamItem]) -> List[Optional[Dict[str, Any]]]:
+        texts = [item[2] for item in batch if item[2] is not None]
+        if not texts:
+            return [None] * len(batch)
+        try:
+            scored = iter(await analyze(texts))
+        except Exception as e:
+            logger.error(f"Error analyzing stream sub-batch: {e}", exc_info=True)
+            metrics.record_error(endpoint, str(e))
+            return [None] * len(batch)
+        return [next(scored) if item[2] is not None else None for item in batch]
+
+    batches = iter_sub_batches(chunks, plain_text, batch_size)
+    pending: Optional[Tuple[List[StreamItem], asyncio.Task]] = None
+    try:
+        while True:
+            try:
+                batch = await batches.__anext__()
+            except StopAsyncIteration:
+                batch = None
+
+            if pending is not None:
+                previous, task = pending
+                pending = None
+                yield previous, await task
+
+            if batch is None:
+                break
+            pending = (batch, asyncio.ensure_future(score(batch)))
+    finally:
+        if pending is not None:
+            pending[1].cancel()
+        await batches.aclose()
+
+
+async def stream_predictions(
+    chunks: AsyncIterator[bytes],
+    analyze: Callable[[List[str]], Any],
+    plain_text: bool = False,
+    batch_size: int = STREAM_BATCH_SIZE,
+    endpoint: str = "/predict/stream"
+) -> AsyncIterator[bytes]:
+    """
+    Score a streamed request body and yield NDJSON result lines.
+
+    One result line is written per non-blank input line (with ``error`` set
+    for invalid lines), followed by a ``summary`` line once the input is
+    exhausted.
+
+    Args:
+        chunks: Request body chunks
+        analyze: Awaitable batch scorer taking a list of tweets
+        plain_text: Whether input lines are raw text instead of JSON
+        batch_size: Input lines per inference call
+        endpoint: Endpoint name for metrics
+
+    Yields:
+        UTF-8 encoded NDJSON lines
+    """
+    start_time = time.time()
+    processed = errors = 0
+    sentiment_counts: Dict[str, int] = {}
+
+    batches = scored_batches(chunks, analyze, plain_text, batch_size, endpoint)
+    success = False
+    try:
+        async for batch, results in batches:
+            for item, result in zip(batch, results):
+                record = result_record(item, result)
+                if result is None:
+                    errors += 1
+                else:
+                    processed += 1
+                    sentiment_counts[result['sentiment']] = sentiment_counts.get(result['sentiment'], 0) + 1
+                yield encode_record(record)
+
+        processing_time = (time.time() - start_time) * 1000
+        yield encode_record({"summary": {
+            "total_processed": processed,
+            "errors": errors,
+            "processing_time_ms": round(processing_time, 2),
+            "average_time_per_tweet_ms": round(processing_time / processed, 2) if processed else None
+        }})
+        success = True
+    except ClientDisconnect:
+        logger.info(f"Client disconnected from {endpoint} after {processed} tweets")
+    finally:
+        await batches.aclose()
+        metrics.record_request(endpoint, (time.time() - start_time) * 1000, success=success)
+        metrics.record_sentiments(sentiment_counts)
+
+
+class SentimentSummary:
+    """
+    Constant-memory aggregates over a stream of predictions.
+
+    Keeps sentiment counts, confidence sums, a fixed-width confidence
+    histogram and, if ``top_k`` is set, min-heaps of the ``top_k`` most
+    confident positive and negative tweets.
+    """
+
+    def __init__(self, bins: int = 10, top_k: int = 0):
+        self.bins = max(1, bins)
+        self.top_k = max(0, top_k)
+        self.processed = 0
+        self.errors = 0
+        self.sentiment_counts: Dict[str, int] = {}
+        self.confidence_sums: Dict[str, float] = {}
+        self.histogram = [0] * self.bins
+        self._top: Dict[str, List[Tuple[float, int, Any, str]]] = {"positive": [], "negative": []}
+
+    def add(self, item: StreamItem, result: Optional[Dict[str, Any]]):
+        """Add one input line and its result (None = error)."""
+        if result is None:
+            self.errors += 1
+            return
+        sentiment = result['sentiment']
+        confidence = float(result['confidence'])
+        self.processed += 1
+        self.sentiment_counts[sentiment] = self.sentiment_counts.get(sentiment, 0) + 1
+        self.confidence_sums[sentiment] = self.confidence_sums.get(sentiment, 0.0) + confidence
+        self.histogram[min(max(int(confidence * self.bins), 0), self.bins - 1)] += 1
+
+        heap = self._top.get(sentiment)
+        if heap is not None and self.top_k:
+            line_number, tweet_id, text, _ = item
+            # Earlier lines win ties
+            entry = (confidence, -line_number, tweet_id, text)
+            if len(heap) < self.top_k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+
+    def _examples(self, sentiment: str) -> List[Dict[str, Any]]:
+        examples = []
+        for confidence, negative_line, tweet_id, text in sorted(self._top[sentiment], key=lambda entry: entry[:2], reverse=True):
+            example: Dict[str, Any] = {"line": -negative_line}
+            if tweet_id is not None:
+                example["id"] = tweet_id
+            example.update(tweet_text=text, confidence=round(confidence, 4))
+            examples.append(example)
+        return examples
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary as a JSON-serialisable dict."""
+        total_confidence = sum(self.confidence_sums.values())
+        summary: Dict[str, Any] = {
+            "total_processed": self.processed,
+            "errors": self.errors,
+            "sentiment_distribution": dict(self.sentiment_counts),
+            "mean_confidence": round(total_confidence / self.processed, 4) if self.processed else None,
+            "mean_confidence_by_sentiment": {
+                sentiment: round(self.confidence_sums[sentiment] / count, 4)
+                for sentiment, count in self.sentiment_counts.items()
+            },
+            "confidence_histogram": {
+                "bin_edges": [round(i / self.bins, 4) for i in range(self.bins + 1)],
+                "counts": list(self.histogram)
+            }
+        }
+        if self.top_k:
+            summary["top_positive"] = self._examples("positive")
+            summary["top_negative"] = self._examples("negative")
+        return summary
+
+
+async def summarize_predictions(
+    chunks: AsyncIterator[bytes],
+    analyze: Callable[[List[str]], Any],
+    plain_text: bool = False,
+    bins: int = 10,
+    top_k: int = 0,
+    batch_size: int = STREAM_BATCH_SIZE,
+    endpoint: str = "/predict/summary"
+) -> Dict[str, Any]:
+    """
+    Score a streamed request body and return only corpus-level aggregates.
+
+    Input is read and scored like ``stream_predictions``, but no per-tweet
+    rows are kept, so memory use does not depend on the input size.
+
+    Args:
+        chunks: Request body chunks
+        analyze: Awaitable batch scorer taking a list of tweets
+        plain_text: Whether input lines are raw text instead of JSON
+        bins: Number of equal-width confidence histogram bins over [0, 1]
+        top_k: Most confident positive and negative tweets to return
+        batch_size: Input lines per inference call
+        endpoint: Endpoint name for metrics
+
+    Returns:
+        SentimentSummary.to_dict() plus processing_time_ms
+    """
+    start_time = time.time()
+    summary = SentimentSummary(bins=bins, top_k=top_k)
+    batches = scored_batches(chunks, analyze, plain_text, batch_size, endpoint)
+    success = False
+    try:
+        async for batch, results in batches:
+            for item, result in zip(batch, results):
+                summary.add(item, result)
+        success = True
+    finally:
+        await batches.aclose()
+        metrics.record_request(endpoint, (time.time() - start_time) * 1000, success=success)
+        metrics.record_sentiments(summary.sentiment_counts)
+
+    return {**summary.to_dict(), "processing_time_ms": round((time.time() - start_time) * 1000, 2)}
+
+
+async def spool_output(
+    content: AsyncIterator[bytes],
+    max_memory_bytes: int = STREAM_SPOOL_MEMORY_BYTES
+) -> Any:
+    """
+    Drain a response body into a temporary spool.
+
+    Lets an endpoint finish reading its request body (which ``content``
+    consumes) before the response starts, for clients that only read the
+    response once their upload is complete.
+
+    Args:
+        content: Response body chunks
+        max_memory_bytes: Size above which the spool moves to disk
+
+    Returns:
+        SpooledTemporaryFile positioned at the start (see ``iter_spool``)
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes, prefix="tweetmood_")
+    try:
+        block: List[bytes] = []
+        block_size = 0
+        async for chunk in content:
+            block.append(chunk)
+            block_size += len(chunk)
+            if block_size >= SPOOL_BLOCK_BYTES:
+                await asyncio.to_thread(spool.write, b"".join(block))
+                block, block_size = [], 0
+        if block:
+            await asyncio.to_thread(spool.write, b"".join(block))
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+async def iter_spool(spool: Any, block_size: int = SPOOL_BLOCK_BYTES) -> AsyncIterator[bytes]:
+    """Stream a spool from ``spool_output`` and close it."""
+    try:
+        while True:
+            block = await asyncio.to_thread(spool.read, block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        spool.close()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator may still be reading the request.
+
+    StreamingResponse normally listens on ``receive`` for a disconnect while
+    streaming, which would swallow request body chunks. Here the body
+    iterator owns ``receive`` and notices disconnects itself. ``on_close``
+    runs once the response has finished, failed or been abandoned.
+
+    Results are sent while the client is still uploading, so the client
+    must read the response concurrently (e.g. httpx with a streamed request
+    body); a client that only reads after its upload completes stalls once
+    the socket buffers fill.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    def __init__(self, content: AsyncIterator[bytes], on_close: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            try:
+                await self.stream_response(send)
+            except OSError:
+                raise ClientDisconnect()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+            if hasattr(self.body_iterator, "aclose"):
+                await self.body_iterator.aclose()
+
+
+__all__ = [
+    "stream_predictions",
+    "summarize_predictions",
+    "scored_batches",
+    "SentimentSummary",
+    "DuplexStreamingResponse",
+    "spool_output",
+    "iter_spool",
+    "iter_lines",
+    "parse_line",
+    "parse_record",
+    "result_record",
+    "encode_record",
+    "NDJSON_MEDIA_TYPE",
+    "PLAIN_TEXT_MEDIA_TYPES"
+]
@@ -0,0 +1,315 @@
+"""
+Tweet file parsing for TweetMoodAI
+Reads uploaded CSV, JSON and NDJSON files record by record and finds the
+tweet text the same way the Streamlit file upload tab does
+(ui/app.py load_tweets_from_csv / extract_tweet_texts)
+"""
+import asyncio
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from app.monitoring import metrics
+from app.streaming import MAX_TWEET_LENGTH, STREAM_BATCH_SIZE, StreamItem, encode_record, result_record
+
+logger = logging.getLogger(__name__)
+
+# Largest upload accepted by /predict/file (larger files go to /jobs)
+FILE_MAX_UPLOAD_MB = float(os.getenv("FILE_MAX_UPLOAD_MB", "50"))
+
+# CSV columns tried in order for the tweet text (first column otherwise)
+TEXT_COLUMNS = ['text', 'tweet_text', 'content', 'tweet', 'message', 'body']
+# JSON/NDJSON fields tried in order for the tweet text
+TEXT_FIELDS = ['cleaned_text', 'content', 'text', 'tweet_text', 'tweet', 'message', 'body']
+# Fields echoed back as the record id
+ID_FIELDS = ['id', 'tweet_id']
+
+FILE_FORMATS = ("csv", "json", "ndjson")
+_CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson"
+}
+_EXTENSION_FORMATS = {".csv": "csv", ".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# Columns of annotated CSV output (see streaming.result_record)
+RESULT_COLUMNS = ["line", "id", "tweet_text", "sentiment", "confidence", "label", "tier", "error"]
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds its size limit."""
+
+
+def detect_format(content_type: Optional[str] = None, filename: Optional[str] = None) -> Optional[str]:
+    """
+    Work out the file format from the Content-Type header or the file name.
+
+    Args:
+        content_type: Request Content-Type (parameters are ignored)
+        filename: Uploaded file name
+
+    Returns:
+        "csv", "json" or "ndjson", or None if unknown
+    """
+    if content_type:
+        media_type = content_type.split(";")[0].strip().lower()
+        if media_type in _CONTENT_TYPE_FORMATS:
+            return _CONTENT_TYPE_FORMATS[media_type]
+    if filename:
+        return _EXTENSION_FORMATS.get(Path(filename).suffix.lower())
+    return None
+
+
+def find_text_column(columns: List[str]) -> Optional[str]:
+    """Pick the tweet text column of a CSV header."""
+    for column in TEXT_COLUMNS:
+        if column in columns:
+            return column
+    return columns[0] if columns else None
+
+
+def _record_id(item: Dict[str, Any]) -> Any:
+    for field in ID_FIELDS:
+        if item.get(field) not in (None, ""):
+            return item[field]
+    return None
+
+
+def _record_text(item: Any) -> Optional[str]:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        for field in TEXT_FIELDS:
+            value = item.get(field)
+            if value and isinstance(value, str) and value.strip():
+                return value
+    return None
+
+
+def _make_item(number: int, tweet_id: Any, text: Optional[str]) -> Optional[StreamItem]:
+    """Validate a record's text; records without text are skipped like in the UI."""
+    if text is None or not text.strip():
+        return None
+    text = text.strip()
+    if len(text) > MAX_TWEET_LENGTH:
+        return number, tweet_id, None, f"Tweet exceeds {MAX_TWEET_LENGTH} characters"
+    return number, tweet_id, text, None
+
+
+def _json_records(data: Any) -> List[Any]:
+    """Find the list of tweets in a JSON document (see load_tweets_from_json)."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ('tweets', 'data'):
+            if isinstance(data.get(key), list):
+                return data[key]
+        for value in data.values():
+            if isinstance(value, list):
+                return value
+    return []
+
+
+def iter_tweet_records(path: Path, file_format: str) -> Iterator[StreamItem]:
+    """
+    Read tweets from a CSV, JSON or NDJSON file.
+
+    CSV and NDJSON files are read one record at a time. JSON documents are
+    loaded whole, since their list can sit anywhere in the document, so
+    large uploads should be sent as NDJSON.
+
+    Args:
+        path: File to read
+        file_format: "csv", "json" or "ndjson"
+
+    Yields:
+        (record number, record id, tweet text or None, error or None);
+        record numbers are 1-based and records without text are skipped
+
+    Raises:
+        ValueError: If the file cannot be parsed as ``file_format``
+    """
+    if file_format == "csv":
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            column = find_text_column(reader.fieldnames or [])
+            if column is None:
+                raise ValueError("CSV file has no header row")
+            try:
+                for number, row in enumerate(reader, start=1):
+                    item = _make_item(number, _record_id(row), row.get(column))
+                    if item is not None:
+                        yield item
+            except csv.Error as e:
+                raise ValueError(f"Invalid CSV file: {e}")
+
+    elif file_format == "ndjson":
+        with open(path, 'r', encoding='utf-8') as f:
+            number = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    value = json.loads(line)
+                except ValueError:
+                    yield number, None, None, "Line is not valid JSON"
+                    continue
+                tweet_id = _record_id(value) if isinstance(value, dict) else None
+                item = _make_item(number, tweet_id, _record_text(value))
+                if item is not None:
+                    yield item
+
+    elif file_format == "json":
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON file: {e}")
+        for number, value in enumerate(_json_records(data), start=1):
+            tweet_id = _record_id(value) if isinstance(value, dict) else None
+            item = _make_item(number, tweet_id, _record_text(value))
+            if item is not None:
+                yield item
+
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+
+async def spool_upload(
+    chunks: AsyncIterator[bytes],
+    file_format: str,
+    max_bytes: int = int(FILE_MAX_UPLOAD_MB * 1024 * 1024)
+) -> Path:
+    """
+    Write an upload to a temporary file as it arrives.
+
+    Args:
+        chunks: Request body chunks
+        file_format: "csv", "json" or "ndjson" (used as the file suffix)
+        max_bytes: Largest upload accepted
+
+    Returns:
+        Path of the temporary file; the caller deletes it
+
+    Raises:
+        UploadTooLargeError: If the upload exceeds max_bytes
+    """
+    fd, name = tempfile.mkstemp(prefix="tweetmood_", suffix=f".{file_format}")
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+                f.write(chunk)
+    except BaseException:
+        os.unlink(name)
+        raise
+    return Path(name)
+
+
+def encode_csv_record(record: Dict[str, Any]) -> bytes:
+    """Encode a result record as one CSV row of RESULT_COLUMNS."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if record.get(column) is None else record[column] for column in RESULT_COLUMNS])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _take(records: Iterator[StreamItem], count: int) -> List[StreamItem]:
+    return list(itertools.islice(records, count))
+
+
+async def score_records(
+    records: Iterator[StreamItem],
+    analyze: Callable[[List[str]], Any],
+    output: str = "ndjson",
+    batch_size: int = STREAM_BATCH_SIZE,
+    endpoint: str = "/predict/file"
+) -> AsyncIterator[bytes]:
+    """
+    Score file records in sub-batches and yield annotated output.
+
+    Records are read from the file ``batch_size`` at a time, off the event
+    loop, so only one sub-batch is held in memory.
+
+    If the file turns out to be malformed after output has started, a final
+    trailer record reports it, since the response status can no longer
+    change: ``{"error": ..., "records_scored": n}`` in NDJSON, or a CSV row
+    with only the ``error`` column set (``Stopped after n records: ...``).
+
+    Args:
+        records: Records from iter_tweet_records
+        analyze: Awaitable batch scorer taking a list of tweets
+        output: "csv" (header row, then RESULT_COLUMNS per record) or "ndjson"
+        batch_size: Records per inference call
+        endpoint: Endpoint name for metrics
+
+    Yields:
+        UTF-8 encoded CSV rows or NDJSON lines, one per record in file order,
+        then the error trailer if the file could not be read to the end
+    """
+    start_time = time.time()
+    encode = encode_csv_record if output == "csv" else encode_record
+    processed = errors = 0
+    sentiment_counts: Dict[str, int] = {}
+    success = False
+    try:
+        if output == "csv":
+            yield encode_csv_record({column: column for column in RESULT_COLUMNS})
+        while True:
+            batch = await asyncio.to_thread(_take, records, batch_size)
+            if not batch:
+                break
+            texts = [item[2] for item in batch if item[2] is not None]
+            try:
+                scored = iter(await analyze(texts) if texts else [])
+            except Exception as e:
+                logger.error(f"Error analyzing file sub-batch: {e}", exc_info=True)
+                metrics.record_error(endpoint, str(e))
+                scored = iter([None] * len(texts))
+            for item in batch:
+                result = next(scored) if item[2] is not None else None
+                if result is None:
+                    errors += 1
+                else:
+                    processed += 1
+                    sentiment_counts[result['sentiment']] = sentiment_counts.get(result['sentiment'], 0) + 1
+                yield encode(result_record(item, result))
+        success = True
+    except ValueError as e:
+        # The file turned out to be malformed after the response started
+        logger.warning(f"Stopped scoring file after {processed + errors} records: {e}")
+        metrics.record_error(endpoint, str(e))
+        if output == "csv":
+            yield encode_csv_record({"error": f"Stopped after {processed + errors} records: {e}"})
+        else:
+            yield encode_record({"error": str(e), "records_scored": processed + errors})
+    finally:
+        metrics.record_request(endpoint, (time.time() - start_time) * 1000, success=success)
+        metrics.record_sentiments(sentiment_counts)
+        logger.info(f"Scored file: {processed} tweets, {errors} errors")
+
+
+__all__ = [
+    "iter_tweet_records",
+    "detect_format",
+    "find_text_column",
+    "spool_upload",
+    "score_records",
+    "encode_csv_record",
+    "UploadTooLargeError",
+    "FILE_FORMATS",
+    "RESULT_COLUMNS"
+]
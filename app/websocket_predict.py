@@ -0,0 +1,175 @@
+"""
+WebSocket scoring for TweetMoodAI
+Live collectors keep one connection open and push tweets as they arrive.
+Each tweet goes through the shared micro-batcher, so tweets from all
+connections (and /predict calls) are batched together. Results are sent
+back as soon as they are ready, possibly out of order. A per-connection
+credit window bounds how much work one connection can have outstanding.
+"""
+import asyncio
+import json
+import os
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from app.batching import InferenceOverloadedError
+from app.monitoring import metrics
+from app.streaming import StreamItem, parse_record, result_record
+
+logger = logging.getLogger(__name__)
+
+# WebSocket configuration
+# Tweets a connection may have outstanding (received, result not yet sent)
+WS_CREDIT = int(os.getenv("WS_CREDIT", "256"))
+# Largest text frame accepted
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", "1048576"))
+
+# Close codes (RFC 6455)
+WS_CLOSE_POLICY_VIOLATION = 1008
+WS_CLOSE_TOO_BIG = 1009
+
+
+class CreditExceededError(Exception):
+    """Raised when a client sends more tweets than its credit allows."""
+
+
+class PredictionSession:
+    """
+    One /ws/predict connection.
+
+    Client frames are JSON: a tweet (string or ``{"id": ..., "tweet_text":
+    ...}`` object) or an array of tweets. Every tweet gets exactly one
+    result frame, shaped like a /predict/stream record (``line`` is the
+    tweet's 1-based position on the connection). Each result frame returns
+    one credit. A client that goes over its credit is disconnected, so the
+    server never holds more than ``credit`` tweets or results per
+    connection, however slowly the client reads.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        submit: Callable[[str], Awaitable[Dict[str, Any]]],
+        credit: int = WS_CREDIT,
+        endpoint: str = "/ws/predict"
+    ):
+        self.websocket = websocket
+        self.submit = submit
+        self.credit = max(1, credit)
+        self.endpoint = endpoint
+
+        self.received = 0
+        self.outstanding = 0
+        self.processed = 0
+        self.errors = 0
+        self._results: asyncio.Queue = asyncio.Queue()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def run(self):
+        """Serve the connection until the client disconnects or breaks the protocol."""
+        await self.websocket.send_json({"type": "ready", "credit": self.credit})
+        sender = asyncio.ensure_future(self._send_results())
+        close_code = close_reason = None
+        try:
+            while True:
+                for item in self._parse_frame(await self._receive()):
+                    self._accept(item)
+        except WebSocketDisconnect:
+            pass
+        except CreditExceededError as e:
+            close_code, close_reason = WS_CLOSE_POLICY_VIOLATION, str(e)
+        except ValueError as e:
+            close_code, close_reason = WS_CLOSE_TOO_BIG, str(e)
+        finally:
+            sender.cancel()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(sender, *self._tasks, return_exceptions=True)
+            logger.info(
+                f"{self.endpoint} connection closed: {self.processed} tweets, "
+                f"{self.errors} errors, {self.outstanding} unanswered"
+            )
+
+        if close_code is not None:
+            logger.warning(f"Closing {self.endpoint} connection: {close_reason}")
+            try:
+                await self.websocket.close(code=close_code, reason=close_reason)
+            except (RuntimeError, WebSocketDisconnect):
+                pass
+
+    async def _receive(self) -> str:
+        """Next text (or UTF-8 binary) frame."""
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("text") is not None:
+            return message["text"]
+        return (message.get("bytes") or b"").decode("utf-8", errors="replace")
+
+    def _parse_frame(self, message: str) -> List[StreamItem]:
+        if len(message) > WS_MAX_FRAME_BYTES:
+            raise ValueError(f"Frame exceeds {WS_MAX_FRAME_BYTES} bytes")
+        try:
+            value = json.loads(message)
+        except ValueError:
+            self.received += 1
+            return [(self.received, None, None, "Frame is not valid JSON")]
+        items = []
+        for record in value if isinstance(value, list) else [value]:
+            self.received += 1
+            items.append(parse_record(record, self.received))
+        return items
+
+    def _accept(self, item: StreamItem):
+        """Take one tweet against the connection's credit."""
+        if self.outstanding >= self.credit:
+            raise CreditExceededError(f"Credit of {self.credit} outstanding tweets exceeded")
+        self.outstanding += 1
+        if item[2] is None:
+            self._results.put_nowait((item, None))
+            return
+        task = asyncio.ensure_future(self._score(item))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, item: StreamItem):
+        start_time = time.time()
+        try:
+            result: Optional[Dict[str, Any]] = await self.submit(item[2])  # type: ignore[arg-type]
+        except InferenceOverloadedError as e:
+            # Only this tweet is rejected; the client may send it again
+            item = (item[0], item[1], None, str(e))
+            result = None
+        except Exception as e:
+            logger.error(f"Error analyzing {self.endpoint} tweet: {e}", exc_info=True)
+            metrics.record_error(self.endpoint, str(e))
+            result = None
+        metrics.record_request(
+            self.endpoint,
+            (time.time() - start_time) * 1000,
+            sentiment=result['sentiment'] if result else None,
+            success=result is not None
+        )
+        self._results.put_nowait((item, result))
+
+    async def _send_results(self):
+        """Send results as they complete; sending returns the tweet's credit."""
+        while True:
+            item, result = await self._results.get()
+            # The credit is back once the client can see the result
+            self.outstanding -= 1
+            await self.websocket.send_text(json.dumps(result_record(item, result), ensure_ascii=False))
+            if result is None:
+                self.errors += 1
+            else:
+                self.processed += 1
+
+
+__all__ = [
+    "PredictionSession",
+    "CreditExceededError",
+    "WS_CREDIT"
+]
@@ -0,0 +1,105 @@
+"""
+Response Serialization Benchmark
+Compares the cost of turning engine results into a /predict/batch JSON body
+the old way (pydantic response models, response-model validation and
+Starlette's JSONResponse) with the fast path (plain dicts and
+FastJSONResponse), per batch size. No model is loaded.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+# Make the app package importable when run as a script
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from app.encodings import ORJSON_AVAILABLE, FastJSONResponse
+from app.main import BatchSentimentResponse, SentimentResponse, _result_dict
+
+SENTIMENTS = [("positive", "POS"), ("negative", "NEG"), ("neutral", "NEU")]
+
+
+def make_batch(size: int):
+    """Synthetic tweets and engine results."""
+    tweets = [f"Tweet number {i} about the new phone launch, honestly not sure yet 🤔 #tech" for i in range(size)]
+    results = [
+        {"sentiment": SENTIMENTS[i % 3][0], "label": SENTIMENTS[i % 3][1], "confidence": 0.5 + (i % 50) / 101, "tier": "model"}
+        for i in range(size)
+    ]
+    return tweets, results
+
+
+def serialize_models(tweets: List[str], results: List[dict]) -> bytes:
+    """Previous path: build response models, validate them against the route's response model, render."""
+    response = BatchSentimentResponse(
+        results=[
+            SentimentResponse(
+                tweet_text=tweet,
+                sentiment=result['sentiment'],
+                confidence=round(result['confidence'], 4),
+                label=result['label'],
+                tier=result.get('tier')
+            )
+            for tweet, result in zip(tweets, results)
+        ],
+        total_processed=len(results),
+        unique_processed=len(results),
+        processing_time_ms=12.34,
+        average_time_per_tweet_ms=0.12
+    )
+    value = RESPONSE_ADAPTER.validate_python(response)
+    return JSONResponse(RESPONSE_ADAPTER.dump_python(value, mode="json")).body
+
+
+def serialize_fast(tweets: List[str], results: List[dict]) -> bytes:
+    """Fast path: plain dicts rendered by FastJSONResponse."""
+    return FastJSONResponse({
+        "results": [_result_dict(tweet, result) for tweet, result in zip(tweets, results)],
+        "total_processed": len(results),
+        "unique_processed": len(results),
+        "processing_time_ms": 12.34,
+        "average_time_per_tweet_ms": 0.12
+    }).body
+
+
+RESPONSE_ADAPTER = TypeAdapter(BatchSentimentResponse)
+
+
+def time_per_call(fn: Callable, tweets: List[str], results: List[dict], iterations: int) -> float:
+    """Best-of-3 mean time per call in microseconds."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(tweets, results)
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark /predict/batch response serialization (model-based vs fast path)"
+    )
+    parser.add_argument("--sizes", default="1,10,32,100", help="Comma-separated batch sizes")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per measurement")
+    args = parser.parse_args()
+
+    print(f"JSON renderer: {'orjson' if ORJSON_AVAILABLE else 'stdlib json'}")
+    print(f"{'batch':>6} {'models (us)':>12} {'fast (us)':>10} {'speedup':>8}")
+    for size in [int(value) for value in args.sizes.split(",")]:
+        tweets, results = make_batch(size)
+        # Both paths must produce the same document
+        assert RESPONSE_ADAPTER.validate_json(serialize_fast(tweets, results)) == \
+            RESPONSE_ADAPTER.validate_json(serialize_models(tweets, results))
+        iterations = max(10, args.iterations // max(1, size // 10))
+        before = time_per_call(serialize_models, tweets, results, iterations)
+        after = time_per_call(serialize_fast, tweets, results, iterations)
+        print(f"{size:>6} {before:>12.1f} {after:>10.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
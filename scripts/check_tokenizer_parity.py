@@ -0,0 +1,88 @@
+"""
+Tokenizer Parity Check
+Verifies the fast (Rust) tokenizer produces exactly the same token ids as the
+slow Python tokenizer on the labeled tweet dataset
+"""
+import json
+import argparse
+import sys
+from pathlib import Path
+
+# Make the app package importable when run as a script
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.sentiment_analyzer import MODEL_PATH, check_tokenizer_parity
+
+
+def load_texts(data_path: Path):
+    """Load raw and cleaned tweet texts from a JSON dataset."""
+    with open(data_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict) and 'tweets' in data:
+        tweets = data['tweets']
+    elif isinstance(data, list):
+        tweets = data
+    else:
+        raise ValueError("Invalid data format")
+
+    texts = []
+    for tweet in tweets:
+        if isinstance(tweet, dict):
+            # Check both what the API receives and what training saw
+            for field in ('content', 'text', 'cleaned_text'):
+                if tweet.get(field):
+                    texts.append(tweet[field])
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check fast/slow tokenizer parity on labeled tweets",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python scripts/check_tokenizer_parity.py
+  python scripts/check_tokenizer_parity.py --input data/tweets_labeled.json --model models/sentiment_model
+        """
+    )
+
+    parser.add_argument(
+        '--input', '-i',
+        type=str,
+        default='data/tweets_labeled.json',
+        help='Input JSON file with tweets (default: data/tweets_labeled.json)'
+    )
+
+    parser.add_argument(
+        '--model', '-m',
+        type=str,
+        default=str(MODEL_PATH),
+        help='Model directory with vocab.txt (default: models/sentiment_model)'
+    )
+
+    args = parser.parse_args()
+
+    texts = load_texts(Path(args.input))
+    print(f"Checking tokenizer parity on {len(texts)} texts...")
+
+    report = check_tokenizer_parity(texts, Path(args.model))
+    print(f"Fast tokenizer: {report['fast_tokenizer']}")
+    print(f"Slow tokenizer: {report['slow_tokenizer']}")
+    print(f"Matched: {report['matched']}/{report['total']}")
+
+    for mismatch in report['mismatches'][:10]:
+        print(f"❌ Mismatch: {mismatch['text'][:80]!r}")
+        print(f"   fast: {mismatch['fast']}")
+        print(f"   slow: {mismatch['slow']}")
+
+    if report['mismatches']:
+        print("❌ Fast tokenizer does not match the slow tokenizer")
+        return 1
+
+    print("✅ Fast tokenizer token ids match the slow tokenizer exactly")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
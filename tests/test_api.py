@@ -6,6 +6,7 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 import json
+import time
 import os
 
 @pytest.fixture(scope="module")
@@ -70,6 +71,7 @@ class TestPredictEndpoint:
             assert "label" in data
             assert data["sentiment"] in ["positive", "negative", "neutral"]
             assert data["label"] in ["POS", "NEG", "NEU"]
+            assert data["tier"] in ["fast", "model", "placeholder"]
             assert 0.0 <= data["confidence"] <= 1.0
             assert data["tweet_text"] == payload["tweet_text"]
     
@@ -243,6 +245,18 @@ class TestPredictBatchEndpoint:
                 assert "confidence" in result
                 assert "label" in result
     
+    def test_predict_batch_reports_unique(self, test_client):
+        """Test duplicate tweets are answered per position but run once"""
+        tweets = ["Copypasta campaign!", "Something else", "Copypasta campaign!"]
+        response = test_client.post("/predict/batch", json={"tweets": tweets})
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["total_processed"] == 3
+        assert data["unique_processed"] <= 2
+        assert [result["tweet_text"] for result in data["results"]] == tweets
+        assert data["results"][0]["sentiment"] == data["results"][2]["sentiment"]
+    
     def test_predict_batch_empty_list(self, test_client):
         """Test /predict/batch endpoint rejects empty list"""
         payload = {
@@ -274,6 +288,388 @@ class TestPredictBatchEndpoint:
         payload = {}
         response = test_client.post("/predict/batch", json=payload)
         assert response.status_code == 422  # Validation error
+    
+    def test_predict_batch_compact(self, test_client):
+        """Test the compact response has parallel arrays and echoes ids, not tweets"""
+        tweets = ["This is great!", "I hate this.", "This is great!"]
+        payload = {"tweets": tweets, "ids": ["a", 2, "c"]}
+        full = test_client.post("/predict/batch", json=payload).json()
+        response = test_client.post("/predict/batch", params={"format": "compact"}, json=payload)
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert "results" not in data
+        assert data["ids"] == ["a", 2, "c"]
+        assert data["total_processed"] == 3
+        assert [data["sentiments"][code] for code in data["sentiment_codes"]] == [
+            result["sentiment"] for result in full["results"]
+        ]
+        assert data["confidences"] == [result["confidence"] for result in full["results"]]
+    
+    def test_predict_batch_ids_length(self, test_client):
+        """Test ids must line up with the tweets"""
+        payload = {"tweets": ["one", "two"], "ids": [1]}
+        response = test_client.post("/predict/batch", params={"format": "compact"}, json=payload)
+        assert response.status_code == 422
+
+
+class TestPredictStreamEndpoint:
+    """Test cases for /predict/stream endpoint"""
+    
+    def test_stream_ndjson(self, test_client):
+        """Test NDJSON input yields one result per line plus a summary"""
+        body = '{"id": "a1", "tweet_text": "This is great!"}\n"I hate this."\n\n'
+        response = test_client.post(
+            "/predict/stream", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == 3
+        assert lines[0]["id"] == "a1"
+        assert lines[0]["tweet_text"] == "This is great!"
+        assert lines[1]["line"] == 2
+        assert "sentiment" in lines[1] and "confidence" in lines[1]
+        assert lines[2]["summary"]["total_processed"] == 2
+    
+    def test_stream_plain_text_beyond_batch_limit(self, test_client):
+        """Test a streamed plain text body is not capped at 100 tweets"""
+        def body():
+            for i in range(300):
+                yield f"tweet number {i}\n".encode()
+        
+        response = test_client.post("/predict/stream", content=body(), headers={"Content-Type": "text/plain"})
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["line"] for line in lines[:-1]] == list(range(1, 301))
+        assert lines[-1]["summary"]["total_processed"] == 300
+    
+    def test_stream_invalid_lines_reported(self, test_client):
+        """Test invalid lines get an error without failing the stream"""
+        body = 'not json\n{"tweet_text": "   "}\n' + json.dumps("x" * 1001) + '\n"fine"\n'
+        response = test_client.post(
+            "/predict/stream", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert ["error" in line for line in lines[:4]] == [True, True, True, False]
+        assert lines[-1]["summary"]["total_processed"] == 1
+        assert lines[-1]["summary"]["errors"] == 3
+    
+    def test_stream_overloaded_returns_503(self, test_client, monkeypatch):
+        """Test /predict/stream fails fast when capacity is exhausted"""
+        from app.batching import inference_executor
+        monkeypatch.setattr(inference_executor, "max_inflight", 0)
+        
+        response = test_client.post("/predict/stream", content="a\n", headers={"Content-Type": "text/plain"})
+        assert response.status_code == 503
+    
+    def test_stream_releases_slot(self, test_client):
+        """Test the in-flight slot is released once the stream ends"""
+        from app.batching import inference_executor
+        test_client.post("/predict/stream", content="a\nb\n", headers={"Content-Type": "text/plain"})
+        assert inference_executor.inflight == 0
+    
+    def test_stream_duplex_opt_in(self, test_client):
+        """Test duplex=true still streams results while reading the body"""
+        response = test_client.post(
+            "/predict/stream", params={"duplex": "true"}, content="a\nb\n", headers={"Content-Type": "text/plain"}
+        )
+        assert response.status_code == 200
+        assert json.loads(response.text.splitlines()[-1])["summary"]["total_processed"] == 2
+    
+    @pytest.mark.slow
+    @pytest.mark.integration
+    def test_half_duplex_client_large_upload(self, monkeypatch):
+        """Test a client that reads only after uploading gets the results of a large body"""
+        import http.client
+        import socket
+        import threading
+        import uvicorn
+        from app import sentiment_analyzer
+        monkeypatch.setattr(
+            sentiment_analyzer, "analyze_batch_optimized",
+            lambda texts: [{"sentiment": "neutral", "confidence": 0.5, "label": "NEU", "tier": "model"} for _ in texts]
+        )
+        
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+        thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+        thread.start()
+        try:
+            while not server.started:
+                time.sleep(0.05)
+            # http.client sends the whole body before reading the response; with
+            # duplex=true this body outgrows the socket buffers and stalls
+            body = "".join(f"tweet number {i} {'x' * 120}\n" for i in range(100000)).encode()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            connection.request("POST", "/predict/stream", body=body, headers={"Content-Type": "text/plain"})
+            response = connection.getresponse()
+            assert response.status == 200
+            lines = response.read().splitlines()
+            assert len(lines) == 100001
+            assert json.loads(lines[-1])["summary"]["total_processed"] == 100000
+        finally:
+            server.should_exit = True
+            thread.join(timeout=30)
+            sock.close()
+
+
+class TestPredictSummaryEndpoint:
+    """Test cases for /predict/summary endpoint"""
+    
+    def test_summary_aggregates_only(self, test_client):
+        """Test the summary has aggregates and top-k examples but no per-tweet rows"""
+        body = "".join(f"tweet number {i}\n" for i in range(150))
+        response = test_client.post(
+            "/predict/summary", params={"top_k": 3, "bins": 5}, content=body, headers={"Content-Type": "text/plain"}
+        )
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["total_processed"] == 150
+        assert sum(data["sentiment_distribution"].values()) == 150
+        assert sum(data["confidence_histogram"]["counts"]) == 150
+        assert len(data["confidence_histogram"]["bin_edges"]) == 6
+        assert len(data["top_positive"]) <= 3 and len(data["top_negative"]) <= 3
+        assert "results" not in data
+    
+    def test_summary_invalid_params(self, test_client):
+        """Test out-of-range histogram and top-k parameters are rejected"""
+        response = test_client.post(
+            "/predict/summary", params={"bins": 0}, content="a\n", headers={"Content-Type": "text/plain"}
+        )
+        assert response.status_code == 422
+
+
+class TestPredictFileEndpoint:
+    """Test cases for /predict/file endpoint"""
+    
+    def test_csv_annotated(self, test_client):
+        """Test a CSV upload comes back as annotated CSV in file order"""
+        import csv
+        import io
+        body = "id,date,text\n" + "".join(f"{i},2024,tweet number {i}\n" for i in range(300)) + "300,2024,\n"
+        response = test_client.post("/predict/file", content=body, headers={"Content-Type": "text/csv"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 300
+        assert rows[0]["id"] == "0" and rows[0]["tweet_text"] == "tweet number 0"
+        assert [int(row["line"]) for row in rows] == list(range(1, 301))
+        assert all(row["sentiment"] in ("positive", "negative", "neutral") for row in rows)
+    
+    def test_json_to_ndjson(self, test_client):
+        """Test a JSON upload is read like the UI and returned as NDJSON"""
+        body = json.dumps({"tweets": [{"id": 9, "cleaned_text": "great day", "content": "great day @x"}, "ok then"]})
+        response = test_client.post(
+            "/predict/file", params={"filename": "tweets.json"}, content=body,
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [(line["line"], line.get("id"), line["tweet_text"]) for line in lines] == [(1, 9, "great day"), (2, None, "ok then")]
+    
+    def test_invalid_file(self, test_client):
+        """Test malformed files and unknown formats are rejected before streaming"""
+        response = test_client.post("/predict/file", content="{not json", headers={"Content-Type": "application/json"})
+        assert response.status_code == 400
+        response = test_client.post("/predict/file", content=b"\x89PNG", headers={"Content-Type": "image/png"})
+        assert response.status_code == 415
+    
+    def test_malformed_after_start_adds_trailer(self, test_client):
+        """Test a file that breaks after streaming started ends with an error trailer"""
+        import csv
+        import io
+        # Invalid UTF-8 past the reader's first buffer, so the first records parse
+        body = ("text\n" + "".join(f"tweet number {i}\n" for i in range(3000))).encode("utf-8") + b"\xff\xfe\n"
+        response = test_client.post(
+            "/predict/file", params={"output": "ndjson"}, content=body, headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        trailer = lines[-1]
+        assert set(trailer) == {"error", "records_scored"}
+        assert trailer["records_scored"] == len(lines) - 1 > 0
+        
+        response = test_client.post("/predict/file", content=body, headers={"Content-Type": "text/csv"})
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert rows[-1]["line"] == ""
+        assert rows[-1]["error"].startswith(f"Stopped after {len(rows) - 1} records")
+    
+    def test_upload_size_limit(self, test_client, monkeypatch):
+        """Test oversized uploads are sent to /jobs"""
+        from app import tweet_files
+        original = tweet_files.spool_upload
+        monkeypatch.setattr(tweet_files, "spool_upload", lambda chunks, fmt: original(chunks, fmt, max_bytes=10))
+        response = test_client.post("/predict/file", content="text\n" + "x\n" * 10, headers={"Content-Type": "text/csv"})
+        assert response.status_code == 413
+
+
+class TestOverload:
+    """Test cases for inference overload handling"""
+    
+    def test_predict_overloaded_returns_503(self, test_client, monkeypatch):
+        """Test /predict fails fast with Retry-After when capacity is exhausted"""
+        from app.batching import inference_executor
+        monkeypatch.setattr(inference_executor, "max_inflight", 0)
+        
+        response = test_client.post("/predict", json={"tweet_text": "Busy server"})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+    
+    def test_batch_overloaded_returns_503(self, test_client, monkeypatch):
+        """Test /predict/batch fails fast when capacity is exhausted"""
+        from app.batching import inference_executor
+        monkeypatch.setattr(inference_executor, "max_inflight", 0)
+        
+        response = test_client.post("/predict/batch", json={"tweets": ["a", "b"]})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+    
+    def test_health_available_when_overloaded(self, test_client, monkeypatch):
+        """Test health and metrics endpoints are not subject to the limit"""
+        from app.batching import inference_executor
+        monkeypatch.setattr(inference_executor, "max_inflight", 0)
+        
+        assert test_client.get("/metrics").status_code == 200
+        assert test_client.get("/healthz").status_code in [200, 503]
+
+
+class TestAdminReload:
+    """Test cases for the model hot-swap admin endpoint"""
+    
+    def test_disabled_without_token(self, test_client, monkeypatch):
+        """Test admin endpoints are off unless ADMIN_TOKEN is configured"""
+        import app.main as main
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "")
+        response = test_client.post("/admin/reload-model", headers={"X-Admin-Token": "anything"})
+        assert response.status_code == 403
+    
+    def test_wrong_token_rejected(self, test_client, monkeypatch):
+        """Test a wrong admin token is rejected"""
+        import app.main as main
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+        response = test_client.post("/admin/reload-model", headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == 401
+    
+    def test_reload_runs_in_background(self, monkeypatch):
+        """Test a reload is accepted and its outcome is reported"""
+        import time
+        import app.main as main
+        from app import hot_swap
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+        monkeypatch.setattr(hot_swap, "hot_swap_model", lambda warmup: {"version": "abc123", "load_time_ms": 1.0})
+        headers = {"X-Admin-Token": "secret"}
+        
+        with TestClient(app) as client:
+            response = client.post("/admin/reload-model", headers=headers)
+            assert response.status_code == 202
+            assert response.json()["state"] == "loading"
+            
+            for _ in range(100):
+                status_data = client.get("/admin/reload-model", headers=headers).json()
+                if status_data["state"] != "loading":
+                    break
+                time.sleep(0.02)
+        assert status_data["state"] == "swapped"
+        assert status_data["version"] == "abc123"
+    
+    def test_prefork_worker_forwards_to_master(self, test_client, monkeypatch):
+        """Test a pre-fork worker asks the master to reload instead of swapping itself"""
+        import app.main as main
+        from app import prefork
+        requests_sent = []
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+        monkeypatch.setattr(prefork, "_worker_index", 0)
+        monkeypatch.setattr(prefork, "request_master_reload", lambda: requests_sent.append(True))
+        response = test_client.post("/admin/reload-model", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 202
+        assert response.json()["state"] == "forwarded"
+        assert requests_sent == [True]
+    
+    def test_health_reports_model_version(self, test_client):
+        """Test /health reports the model version and load time"""
+        data = test_client.get("/health").json()
+        assert "model_version" in data
+        assert "model_load_time_ms" in data
+
+
+class TestStartupWarmup:
+    """Test cases for the startup warm-up and readiness"""
+    
+    @pytest.fixture
+    def loaded_model(self, monkeypatch):
+        """Pretend a model is loaded so readiness depends on warm-up"""
+        from app import sentiment_analyzer
+        model_data = {"version": "test"}
+        monkeypatch.setattr(sentiment_analyzer, "get_model", lambda: model_data)
+        return model_data
+    
+    def test_healthz_not_ready_until_warm(self, loaded_model, monkeypatch):
+        """Test /healthz reports 503 while warming up and 200 afterwards"""
+        import threading
+        import time
+        from app import sentiment_analyzer
+        from app.monitoring import MetricsCollector
+        import app.main as main
+        collector = MetricsCollector()
+        monkeypatch.setattr(main, "metrics", collector)
+        release = threading.Event()
+        calls = []
+        
+        def fake_warm_up(model_data, batch_sizes):
+            calls.append(batch_sizes)
+            release.wait(5)
+            return 12.5
+        
+        monkeypatch.setattr(sentiment_analyzer, "warm_up_model", fake_warm_up)
+        with TestClient(app) as client:
+            response = client.get("/healthz")
+            assert response.status_code == 503
+            assert response.json()["reason"] == "Warming up"
+            
+            release.set()
+            for _ in range(100):
+                response = client.get("/healthz")
+                if response.status_code == 200:
+                    break
+                time.sleep(0.02)
+            assert response.status_code == 200
+        
+        assert calls == [sentiment_analyzer.WARMUP_BATCH_SIZES]
+        assert collector.get_stats()["startup"]["warmup_ms"] == 12.5
+    
+    def test_warmup_disabled(self, loaded_model, monkeypatch):
+        """Test the API is ready right after loading when warm-up is off"""
+        import app.main as main
+        monkeypatch.setattr(main, "STARTUP_WARMUP_ENABLED", False)
+        with TestClient(app) as client:
+            assert client.get("/healthz").status_code == 200
+    
+    def test_grpc_not_imported_when_disabled(self, monkeypatch):
+        """Test startup does not import the gRPC module unless GRPC_ENABLED is set"""
+        import sys
+        import app.main as main
+        monkeypatch.setattr(main, "GRPC_ENABLED", False)
+        # Any import of app.grpc_server would now raise ImportError
+        monkeypatch.setitem(sys.modules, "app.grpc_server", None)
+        with TestClient(app) as client:
+            assert client.get("/health").status_code == 200
+    
+    def test_first_inference_recorded(self):
+        """Test only the first model forward pass is kept as a startup metric"""
+        from app.monitoring import MetricsCollector
+        collector = MetricsCollector()
+        collector.record_request("/health", 1.0)
+        assert collector.get_stats()["startup"]["first_inference_ms"] is None
+        collector.record_model_inference(80.0)
+        collector.record_model_inference(5.0)
+        assert collector.get_stats()["startup"]["first_inference_ms"] == 80.0
 
 
 class TestErrorHandling:
@@ -290,6 +686,13 @@ class TestErrorHandling:
         # FastAPI usually returns 404 for root, or redirects to docs
         assert response.status_code in [200, 404, 307, 308]
     
+    def test_root_reports_inference_engine(self, test_client):
+        """Test root and health endpoints report the active inference engine"""
+        for path in ("/", "/health"):
+            response = test_client.get(path)
+            assert response.status_code == 200
+            assert response.json()["inference_engine"] in ["torch", "onnx", "placeholder"]
+    
     def test_docs_endpoint(self, test_client):
         """Test /docs endpoint is accessible"""
         response = test_client.get("/docs")
@@ -317,6 +720,36 @@ class TestAPIStructure:
         assert "/predict" in schema["paths"]
         assert "/healthz" in schema["paths"]
     
+    def test_response_models_documented(self, test_client):
+        """Test hot endpoints still document their pydantic response models"""
+        paths = test_client.get("/openapi.json").json()["paths"]
+        predict = paths["/predict"]["post"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert predict["$ref"].endswith("/SentimentResponse")
+        batch = paths["/predict/batch"]["post"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert any(option["$ref"].endswith("/BatchSentimentResponse") for option in batch["anyOf"])
+    
+    def test_server_timing_header(self, test_client):
+        """Test prediction responses break their latency down by stage"""
+        response = test_client.post("/predict", json={"tweet_text": "Timing this request"})
+        stages = [metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")]
+        assert stages[0] == "validation"
+        assert stages[-2:] == ["serialize", "total"]
+        
+        latency = test_client.get("/metrics").json()["stages"]["latency"]
+        assert latency["serialize"]["count"] >= 1
+    
+    def test_fast_json_matches_response_models(self, test_client):
+        """Test fast-path JSON responses validate against the documented models"""
+        from app.main import SentimentResponse, BatchSentimentResponse
+        single = test_client.post("/predict", json={"tweet_text": "Great game tonight ✨"})
+        assert single.headers["content-type"] == "application/json"
+        assert SentimentResponse.model_validate(single.json()).tweet_text == "Great game tonight ✨"
+        assert "✨".encode("utf-8") in single.content
+        
+        batch = test_client.post("/predict/batch", json={"tweets": ["one", "two"]})
+        assert BatchSentimentResponse.model_validate(batch.json()).total_processed == 2
+        assert list(batch.json()["results"][0]) == list(SentimentResponse.model_fields)
+    
     def test_api_version(self, test_client):
         """Test API version is in OpenAPI schema"""
         response = test_client.get("/openapi.json")
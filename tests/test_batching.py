@@ -0,0 +1,284 @@
+"""
+Pytest tests for request micro-batching
+Tests for MicroBatcher and InferenceExecutor in app/batching.py
+"""
+import asyncio
+import threading
+import time
+import pytest
+from app.batching import MicroBatcher, InferenceExecutor, InferenceOverloadedError
+from app.monitoring import MetricsCollector, current_timings, start_timings, timed_stage
+
+
+def echo_batch(calls):
+    """Build a batch function that records batch sizes and echoes inputs"""
+    def batch_fn(texts):
+        calls.append(list(texts))
+        return [{"text": text} for text in texts]
+    return batch_fn
+
+
+class TestMicroBatcher:
+    """Test cases for MicroBatcher"""
+
+    def test_concurrent_requests_coalesced(self):
+        """Test requests arriving together share one batch"""
+        calls = []
+        batcher = MicroBatcher(echo_batch(calls), max_batch_size=32, max_wait_ms=20)
+
+        async def run():
+            results = await asyncio.gather(*(batcher.submit(f"tweet {i}") for i in range(10)))
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert [result["text"] for result in results] == [f"tweet {i}" for i in range(10)]
+        assert len(calls) == 1
+        assert len(calls[0]) == 10
+
+    def test_max_batch_size(self):
+        """Test batches are capped at max_batch_size"""
+        calls = []
+        batcher = MicroBatcher(echo_batch(calls), max_batch_size=4, max_wait_ms=20)
+
+        async def run():
+            results = await asyncio.gather(*(batcher.submit(str(i)) for i in range(10)))
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert [result["text"] for result in results] == [str(i) for i in range(10)]
+        assert [len(call) for call in calls] == [4, 4, 2]
+
+    def test_single_request_waits_at_most_window(self):
+        """Test a lone request is dispatched once the wait window closes"""
+        calls = []
+        batcher = MicroBatcher(echo_batch(calls), max_batch_size=32, max_wait_ms=1)
+
+        async def run():
+            result = await asyncio.wait_for(batcher.submit("alone"), timeout=2)
+            await batcher.stop()
+            return result
+
+        assert asyncio.run(run()) == {"text": "alone"}
+        assert calls == [["alone"]]
+
+    def test_batch_error_propagates(self):
+        """Test an inference failure is raised to every caller in the batch"""
+        def failing_batch(texts):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(failing_batch, max_batch_size=8, max_wait_ms=5)
+
+        async def run():
+            results = await asyncio.gather(
+                batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+            )
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    def test_batch_sizes_recorded(self, monkeypatch):
+        """Test achieved batch sizes are reported by MetricsCollector"""
+        from app import batching
+        collector = MetricsCollector()
+        monkeypatch.setattr(batching, "metrics", collector)
+        batcher = MicroBatcher(echo_batch([]), max_batch_size=3, max_wait_ms=20)
+
+        async def run():
+            await asyncio.gather(*(batcher.submit(str(i)) for i in range(5)))
+            await batcher.stop()
+
+        asyncio.run(run())
+        stats = collector.get_stats()["microbatch"]
+        assert stats["total_batches"] == 2
+        assert stats["max_batch_size"] == 3
+        assert stats["avg_batch_size"] == 2.5
+
+    def test_restarts_on_new_event_loop(self):
+        """Test the batcher keeps working across event loops"""
+        calls = []
+        batcher = MicroBatcher(echo_batch(calls), max_batch_size=8, max_wait_ms=1)
+
+        assert asyncio.run(batcher.submit("first")) == {"text": "first"}
+        assert asyncio.run(batcher.submit("second")) == {"text": "second"}
+        assert calls == [["first"], ["second"]]
+
+    def test_batches_run_off_event_loop(self):
+        """Test batch inference runs in the executor, not the loop thread"""
+        threads = []
+
+        def batch_fn(texts):
+            threads.append(threading.current_thread().name)
+            return [{} for _ in texts]
+
+        batcher = MicroBatcher(batch_fn, max_wait_ms=1, executor=InferenceExecutor(max_workers=1))
+
+        async def run():
+            await batcher.submit("tweet")
+            await batcher.stop()
+
+        asyncio.run(run())
+        assert threads[0].startswith("inference")
+
+    def test_full_batches_overlap(self):
+        """Test the next batch runs while the previous one is still in the executor"""
+        # Each batch waits for the other; serial processing would time out
+        barrier = threading.Barrier(2, timeout=5)
+        calls = []
+
+        def overlapping_batch(texts):
+            calls.append(list(texts))
+            barrier.wait()
+            return [{"text": text} for text in texts]
+
+        batcher = MicroBatcher(
+            overlapping_batch, max_batch_size=2, max_wait_ms=20, executor=InferenceExecutor(max_workers=2)
+        )
+
+        async def run():
+            results = await asyncio.gather(*(batcher.submit(str(i)) for i in range(4)))
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert [result["text"] for result in results] == ["0", "1", "2", "3"]
+        assert sorted(len(call) for call in calls) == [2, 2]
+
+    def test_stop_fails_running_batches(self):
+        """Test stopping while a batch is in the executor fails its callers"""
+        release = threading.Event()
+
+        def slow_batch(texts):
+            release.wait(5)
+            return [{} for _ in texts]
+
+        batcher = MicroBatcher(slow_batch, max_wait_ms=1, executor=InferenceExecutor(max_workers=1))
+
+        async def run():
+            pending = asyncio.ensure_future(batcher.submit("running"))
+            await asyncio.sleep(0.05)
+            await batcher.stop()
+            release.set()
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(pending, timeout=1)
+
+        asyncio.run(run())
+
+    def test_staggered_arrivals_all_resolved(self):
+        """Test requests arriving while the window is open are never lost"""
+        calls = []
+        batcher = MicroBatcher(echo_batch(calls), max_batch_size=8, max_wait_ms=1)
+
+        async def submit_later(i):
+            await asyncio.sleep(i * 0.0005)
+            return await batcher.submit(str(i))
+
+        async def run():
+            results = await asyncio.wait_for(asyncio.gather(*(submit_later(i) for i in range(200))), timeout=10)
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert [result["text"] for result in results] == [str(i) for i in range(200)]
+        assert sum(len(call) for call in calls) == 200
+
+    def test_stop_fails_collected_requests(self):
+        """Test stopping mid-window fails requests already taken off the queue"""
+        batcher = MicroBatcher(echo_batch([]), max_batch_size=32, max_wait_ms=1000)
+
+        async def run():
+            pending = asyncio.ensure_future(batcher.submit("waiting"))
+            await asyncio.sleep(0.05)
+            await batcher.stop()
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(pending, timeout=1)
+
+        asyncio.run(run())
+
+    def test_stage_timings_reach_callers(self):
+        """Test every caller gets its queue wait and the shared batch's stages"""
+        def timed_batch(texts):
+            with timed_stage("forward"):
+                time.sleep(0.01)
+            return [{"text": text} for text in texts]
+
+        batcher = MicroBatcher(timed_batch, max_batch_size=32, max_wait_ms=20)
+
+        async def caller(text):
+            timings = start_timings()
+            await batcher.submit(text)
+            return timings.stages
+
+        async def run():
+            stages = await asyncio.gather(*(caller(str(i)) for i in range(3)))
+            await batcher.stop()
+            return stages
+
+        for stages in asyncio.run(run()):
+            assert stages["forward"] >= 10
+            assert stages["queue"] > 0
+
+
+class TestInferenceExecutor:
+    """Test cases for InferenceExecutor"""
+
+    def test_run_in_pool(self):
+        """Test work runs in the dedicated thread pool"""
+        executor = InferenceExecutor(max_workers=1)
+        name = asyncio.run(executor.run(lambda: threading.current_thread().name))
+        executor.shutdown()
+        assert name.startswith("inference")
+
+    def test_run_sees_caller_timings(self):
+        """Test stages timed in the pool are added to the caller's timings"""
+        executor = InferenceExecutor(max_workers=1)
+
+        def work():
+            with timed_stage("tokenize"):
+                pass
+            return current_timings()
+
+        async def run():
+            timings = start_timings()
+            return timings, await executor.run(work)
+
+        timings, seen = asyncio.run(run())
+        executor.shutdown()
+        assert seen is timings
+        assert "tokenize" in timings.stages
+
+    def test_admit_limit(self):
+        """Test requests beyond max_inflight fail fast"""
+        executor = InferenceExecutor(max_inflight=2)
+        with executor.admit():
+            with executor.admit():
+                assert executor.inflight == 2
+                with pytest.raises(InferenceOverloadedError) as exc_info:
+                    with executor.admit():
+                        pass
+                assert exc_info.value.retry_after >= 0
+        assert executor.inflight == 0
+
+    def test_loop_responsive_during_inference(self):
+        """Test the event loop keeps running while inference is busy"""
+        executor = InferenceExecutor(max_workers=1)
+        release = threading.Event()
+
+        async def run():
+            inference = asyncio.ensure_future(executor.run(release.wait, 5))
+            ticks = 0
+            for _ in range(3):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            release.set()
+            await inference
+            return ticks
+
+        assert asyncio.run(run()) == 3
+        executor.shutdown()
+
+
+# Run tests with: pytest tests/test_batching.py -v
@@ -0,0 +1,170 @@
+"""
+Pytest tests for binary batch encodings
+Tests for MessagePack and Arrow IPC bodies on /predict/batch (app/encodings.py)
+"""
+import pytest
+from fastapi.testclient import TestClient
+from app import encodings
+from app.encodings import negotiate_media_type, MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE
+from app.main import app
+
+msgpack = pytest.importorskip("msgpack")
+pa = pytest.importorskip("pyarrow")
+
+TWEETS = ["This is great!", "I hate this.", "This is great!"]
+
+
+@pytest.fixture(scope="module")
+def test_client():
+    """Create a test client for the FastAPI app"""
+    return TestClient(app)
+
+
+def arrow_body(column: str = "tweets") -> bytes:
+    """Arrow IPC stream with one string column"""
+    table = pa.table({column: TWEETS})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class TestFastJSON:
+    """Test cases for the fast JSON response class"""
+
+    def test_same_bytes_as_json_response(self):
+        """Test FastJSONResponse renders like Starlette's JSONResponse"""
+        from starlette.responses import JSONResponse
+        content = {"tweet_text": "ünïcode 🚀", "confidence": 0.9123, "tier": None, "results": [1, 2.5, True]}
+        assert encodings.FastJSONResponse(content).body == JSONResponse(content).body
+
+    def test_stdlib_fallback(self, monkeypatch):
+        """Test the stdlib fallback produces the same JSON"""
+        content = {"a": [1, 0.5, None], "b": "é"}
+        fast = encodings.dumps_json(content)
+        monkeypatch.setattr(encodings, "ORJSON_AVAILABLE", False)
+        assert encodings.dumps_json(content) == fast
+
+
+class TestNegotiation:
+    """Test cases for Accept header negotiation"""
+
+    def test_default_is_json(self):
+        """Test missing or generic Accept headers keep JSON"""
+        assert negotiate_media_type(None) == "application/json"
+        assert negotiate_media_type("*/*") == "application/json"
+
+    def test_quality_order(self):
+        """Test the highest quality available encoding wins"""
+        accept = f"application/json;q=0.5, {ARROW_MEDIA_TYPE};q=0.9, {MSGPACK_MEDIA_TYPE}"
+        assert negotiate_media_type(accept) == MSGPACK_MEDIA_TYPE
+        assert negotiate_media_type("application/x-msgpack") == MSGPACK_MEDIA_TYPE
+        assert negotiate_media_type(f"{ARROW_MEDIA_TYPE};q=0") == "application/json"
+
+    def test_unavailable_encoding_falls_back(self, monkeypatch):
+        """Test encodings without their library installed are not chosen"""
+        monkeypatch.setattr(encodings, "ARROW_AVAILABLE", False)
+        assert negotiate_media_type(ARROW_MEDIA_TYPE) == "application/json"
+
+
+class TestBinaryBatch:
+    """Test cases for binary /predict/batch requests and responses"""
+
+    def test_msgpack_round_trip(self, test_client):
+        """Test a MessagePack body gets a MessagePack response shaped like JSON"""
+        response = test_client.post(
+            "/predict/batch",
+            content=msgpack.packb({"tweets": TWEETS}),
+            headers={"Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+        data = msgpack.unpackb(response.content)
+
+        expected = test_client.post("/predict/batch", json={"tweets": TWEETS}).json()
+        assert set(data) == set(expected)
+        assert [result["tweet_text"] for result in data["results"]] == TWEETS
+        assert set(data["results"][0]) == set(expected["results"][0])
+        assert data["total_processed"] == 3
+
+    def test_arrow_round_trip(self, test_client):
+        """Test an Arrow body gets a columnar Arrow response without texts"""
+        response = test_client.post(
+            "/predict/batch",
+            content=arrow_body("text"),
+            headers={"Content-Type": ARROW_MEDIA_TYPE, "Accept": ARROW_MEDIA_TYPE}
+        )
+        assert response.status_code == 200
+        table = pa.ipc.open_stream(response.content).read_all()
+
+        assert table.column_names == ["sentiment", "confidence", "tier"]
+        assert table.num_rows == 3
+        sentiments = table.column("sentiment").to_pylist()
+        assert sentiments[0] == sentiments[2]
+        assert set(sentiments) <= set(encodings.SENTIMENTS)
+        assert table.schema.metadata[b"total_processed"] == b"3"
+
+    def test_arrow_ids_echoed(self, test_client):
+        """Test request ids come back as an Arrow id column"""
+        response = test_client.post(
+            "/predict/batch",
+            json={"tweets": TWEETS, "ids": [7, 8, 9]},
+            headers={"Accept": ARROW_MEDIA_TYPE}
+        )
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.column_names == ["id", "sentiment", "confidence", "tier"]
+        assert table.column("id").to_pylist() == [7, 8, 9]
+
+        table = pa.table({"tweets": TWEETS, "id": ["a", "b", "c"]})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        response = test_client.post(
+            "/predict/batch",
+            content=sink.getvalue().to_pybytes(),
+            headers={"Content-Type": ARROW_MEDIA_TYPE, "Accept": ARROW_MEDIA_TYPE}
+        )
+        assert pa.ipc.open_stream(response.content).read_all().column("id").to_pylist() == ["a", "b", "c"]
+
+    def test_json_response_for_binary_request(self, test_client):
+        """Test binary bodies still get JSON without an Accept header"""
+        response = test_client.post(
+            "/predict/batch", content=arrow_body(), headers={"Content-Type": ARROW_MEDIA_TYPE}
+        )
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == 3
+
+    def test_validation_applies(self, test_client):
+        """Test decoded bodies are validated like JSON bodies"""
+        response = test_client.post(
+            "/predict/batch",
+            content=msgpack.packb({"tweets": []}),
+            headers={"Content-Type": MSGPACK_MEDIA_TYPE}
+        )
+        assert response.status_code == 422
+
+    def test_invalid_body(self, test_client):
+        """Test undecodable bodies return 400"""
+        response = test_client.post(
+            "/predict/batch", content=b"not arrow", headers={"Content-Type": ARROW_MEDIA_TYPE}
+        )
+        assert response.status_code == 400
+
+    def test_unavailable_request_encoding(self, test_client, monkeypatch):
+        """Test bodies in an encoding the server cannot read return 415"""
+        monkeypatch.setattr(encodings, "MSGPACK_AVAILABLE", False)
+        response = test_client.post(
+            "/predict/batch",
+            content=b"\x81",
+            headers={"Content-Type": MSGPACK_MEDIA_TYPE}
+        )
+        assert response.status_code == 415
+
+    def test_openapi_schema(self, test_client):
+        """Test the JSON request schema is unchanged and binary responses are listed"""
+        operation = test_client.get("/openapi.json").json()["paths"]["/predict/batch"]["post"]
+        assert "application/json" in operation["requestBody"]["content"]
+        assert MSGPACK_MEDIA_TYPE in operation["responses"]["200"]["content"]
+
+
+# Run tests with: pytest tests/test_encodings.py -v
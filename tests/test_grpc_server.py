@@ -0,0 +1,137 @@
+"""
+Pytest tests for the gRPC server
+Tests for SentimentServicer in app/grpc_server.py over a local channel
+"""
+import asyncio
+import importlib
+import sys
+import pytest
+
+grpc = pytest.importorskip("grpc")
+
+from app import grpc_server
+from app.batching import InferenceOverloadedError
+from app.monitoring import MetricsCollector
+from app.protos import sentiment_pb2, sentiment_pb2_grpc
+
+
+@pytest.fixture(autouse=True)
+def collector(monkeypatch):
+    """Record gRPC metrics in a fresh collector"""
+    collector = MetricsCollector()
+    monkeypatch.setattr(grpc_server, "metrics", collector)
+    return collector
+
+
+async def fake_submit(text):
+    """Scorer where tweets starting with 'slow' take longer"""
+    if text == "overloaded":
+        raise InferenceOverloadedError()
+    await asyncio.sleep(0.2 if text.startswith("slow") else 0)
+    return {"sentiment": "negative", "confidence": 0.8, "label": "NEG", "tier": "model"}
+
+
+def call(test, servicer=None):
+    """Run ``test(stub)`` against a server on a free local port"""
+    async def run():
+        server, port = await grpc_server.start_grpc_server(
+            "127.0.0.1", 0, servicer or grpc_server.SentimentServicer(fake_submit)
+        )
+        try:
+            async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                return await test(sentiment_pb2_grpc.SentimentServiceStub(channel))
+        finally:
+            await server.stop(None)
+    return asyncio.run(run())
+
+
+def request(request_id, text):
+    return sentiment_pb2.PredictRequest(id=request_id, tweet_text=text)
+
+
+class TestPredict:
+    """Test cases for the unary Predict RPC"""
+
+    def test_predict(self, collector):
+        """Test a tweet is scored and its id echoed"""
+        response = call(lambda stub: stub.Predict(request("t1", "  bad service  ")))
+        assert (response.id, response.sentiment, response.label, response.tier) == ("t1", "negative", "NEG", "model")
+        assert response.confidence == pytest.approx(0.8)
+        assert collector.get_stats()["sentiment_distribution"] == {"negative": 1}
+
+    @pytest.mark.parametrize("text,code", [
+        ("   ", "INVALID_ARGUMENT"),
+        ("x" * 1001, "INVALID_ARGUMENT"),
+        ("overloaded", "RESOURCE_EXHAUSTED")
+    ])
+    def test_predict_rejected(self, text, code):
+        """Test rejected tweets map to gRPC status codes"""
+        with pytest.raises(grpc.aio.AioRpcError) as exc_info:
+            call(lambda stub: stub.Predict(request("t1", text)))
+        assert exc_info.value.code() == getattr(grpc.StatusCode, code)
+
+
+class TestPredictStream:
+    """Test cases for the bidirectional PredictStream RPC"""
+
+    def test_stream_out_of_order(self):
+        """Test responses are sent as they finish and errors keep the stream open"""
+        async def test(stub):
+            requests = [request("a", "slow tweet"), request("b", "fast tweet"), request("c", "")]
+            return [response async for response in stub.PredictStream(iter(requests))]
+
+        responses = call(test)
+        assert sorted(response.id for response in responses) == ["a", "b", "c"]
+        assert responses[-1].id == "a"
+        assert [response.error != "" for response in responses if response.id == "c"] == [True]
+
+    def test_stream_window(self):
+        """Test no more than the window of tweets is in flight"""
+        in_flight = []
+        peak = []
+
+        async def tracked(text):
+            in_flight.append(text)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(text)
+            return await fake_submit(text)
+
+        async def test(stub):
+            requests = (request(str(i), f"tweet {i}") for i in range(20))
+            return [response async for response in stub.PredictStream(requests)]
+
+        responses = call(test, grpc_server.SentimentServicer(tracked, stream_window=3))
+        assert len(responses) == 20
+        assert max(peak) <= 3
+
+
+
+class TestAvailability:
+    """Test cases for the optional dependency guard"""
+
+    def test_stale_stubs_disable_grpc(self, monkeypatch):
+        """Test a version check failing in the generated stubs disables gRPC instead of the import"""
+        class StaleStubs:
+            def find_spec(self, name, path=None, target=None):
+                if name == "app.protos.sentiment_pb2_grpc":
+                    raise RuntimeError("grpcio is older than the generated code")
+                return None
+
+        import app.protos
+        monkeypatch.delitem(sys.modules, "app.protos.sentiment_pb2_grpc")
+        monkeypatch.delattr(app.protos, "sentiment_pb2_grpc")
+        monkeypatch.setattr(sys, "meta_path", [StaleStubs()] + sys.meta_path)
+        try:
+            importlib.reload(grpc_server)
+            assert grpc_server.GRPC_AVAILABLE is False
+            assert "RuntimeError" in grpc_server.GRPC_UNAVAILABLE_REASON
+            with pytest.raises(RuntimeError, match="not available"):
+                asyncio.run(grpc_server.start_grpc_server("127.0.0.1", 0))
+        finally:
+            monkeypatch.undo()
+            importlib.reload(grpc_server)
+        assert grpc_server.GRPC_AVAILABLE is True
+
+
+# Run tests with: pytest tests/test_grpc_server.py -v
@@ -0,0 +1,112 @@
+"""
+Pytest tests for zero-downtime model hot-swap
+Tests for ModelSwapper in app/hot_swap.py
+"""
+import asyncio
+import pytest
+from app import hot_swap
+from app.hot_swap import ModelSwapper
+from app.sentiment_analyzer import ModelSwapInProgressError
+
+
+@pytest.fixture
+def swaps(monkeypatch):
+    """Replace the real hot-swap with one that records its calls"""
+    calls = []
+
+    def fake_hot_swap(warmup):
+        calls.append(warmup)
+        return {"version": f"v{len(calls)}", "load_time_ms": 1.0, "warmup_ms": 2.0}
+
+    monkeypatch.setattr(hot_swap, "hot_swap_model", fake_hot_swap)
+    return calls
+
+
+class TestModelSwapper:
+    """Test cases for background swaps"""
+
+    def test_background_swap(self, swaps, tmp_path):
+        """Test a requested swap runs and reports the new version"""
+        swapper = ModelSwapper(model_path=tmp_path)
+
+        async def run():
+            assert swapper.request_swap(reason="admin")
+            assert swapper.status["state"] == "loading"
+            await swapper.wait()
+
+        asyncio.run(run())
+        assert swaps == [True]
+        assert swapper.status["state"] == "swapped"
+        assert swapper.status["version"] == "v1"
+        assert swapper.status["reason"] == "admin"
+
+    def test_one_swap_at_a_time(self, swaps, tmp_path):
+        """Test a second request is refused while a swap is running"""
+        swapper = ModelSwapper(model_path=tmp_path)
+
+        async def run():
+            assert swapper.request_swap()
+            assert not swapper.request_swap()
+            await swapper.wait()
+
+        asyncio.run(run())
+        assert len(swaps) == 1
+
+    def test_failed_swap_reported(self, monkeypatch, tmp_path):
+        """Test load failures and concurrent swaps are reported, not raised"""
+        swapper = ModelSwapper(model_path=tmp_path)
+
+        async def run(result):
+            def fake_hot_swap(warmup):
+                if isinstance(result, Exception):
+                    raise result
+                return result
+            monkeypatch.setattr(hot_swap, "hot_swap_model", fake_hot_swap)
+            swapper.request_swap()
+            await swapper.wait()
+            return swapper.status["state"]
+
+        assert asyncio.run(run(None)) == "failed"
+        assert asyncio.run(run(RuntimeError("boom"))) == "failed"
+        assert asyncio.run(run(ModelSwapInProgressError("busy"))) == "skipped"
+
+
+class TestModelWatcher:
+    """Test cases for the model directory watcher"""
+
+    def test_swaps_after_files_settle(self, swaps, tmp_path):
+        """Test new model files trigger exactly one swap once they stop changing"""
+        (tmp_path / "config.json").write_text("{}")
+        swapper = ModelSwapper(model_path=tmp_path, interval_seconds=0.05)
+
+        async def run():
+            swapper.start_watching()
+            await asyncio.sleep(0.12)
+            assert swaps == []
+
+            (tmp_path / "model.safetensors").write_bytes(b"new weights")
+            await asyncio.sleep(0.4)
+            await swapper.stop()
+
+        asyncio.run(run())
+        assert swaps == [True]
+        assert swapper.status["reason"] == "watcher"
+
+    def test_generated_files_ignored(self, swaps, tmp_path):
+        """Test files written while loading a model do not trigger swaps"""
+        (tmp_path / "config.json").write_text("{}")
+        swapper = ModelSwapper(model_path=tmp_path, interval_seconds=0.05)
+
+        async def run():
+            swapper.start_watching()
+            await asyncio.sleep(0.05)
+            (tmp_path / "tokenizer.json").write_text("{}")
+            (tmp_path / "model.onnx").write_bytes(b"export")
+            await asyncio.sleep(0.3)
+            await swapper.stop()
+
+        asyncio.run(run())
+        assert swaps == []
+
+
+# Run tests with: pytest tests/test_hot_swap.py -v
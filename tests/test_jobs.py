@@ -0,0 +1,269 @@
+"""
+Pytest tests for background bulk scoring jobs
+Tests for JobManager in app/jobs.py and file parsing in app/tweet_files.py
+"""
+import asyncio
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app import jobs
+from app.jobs import JobManager, JobUploadTooLargeError
+from app.monitoring import MetricsCollector
+from app.tweet_files import detect_format, iter_tweet_records
+
+CSV_BODY = "id,text,date\n" + "".join(f"{i},tweet number {i},2024\n" for i in range(10))
+
+
+async def chunked(body: str):
+    """Async iterator over an upload"""
+    yield body.encode("utf-8")
+
+
+def fake_analyze(calls):
+    """Batch scorer that records batch sizes"""
+    async def analyze(texts):
+        calls.append(len(texts))
+        return [{"sentiment": "neutral", "confidence": 0.5, "label": "NEU", "tier": "model"} for _ in texts]
+    return analyze
+
+
+@pytest.fixture(autouse=True)
+def collector(monkeypatch):
+    """Record job metrics in a fresh collector"""
+    collector = MetricsCollector()
+    monkeypatch.setattr(jobs, "metrics", collector)
+    return collector
+
+
+def run_job(manager: JobManager, body: str, file_format: str) -> dict:
+    """Create a job, run the workers until it finishes and return its state"""
+    async def run():
+        manager.start()
+        job = await manager.create(chunked(body), file_format)
+        await manager._queue.join()
+        await manager.stop()
+        return manager.get(job["job_id"])
+    return asyncio.run(run())
+
+
+class TestTweetFiles:
+    """Test cases for upload parsing"""
+
+    def test_detect_format(self):
+        """Test the format comes from the content type, then the extension"""
+        assert detect_format("text/csv; charset=utf-8") == "csv"
+        assert detect_format("application/octet-stream", "tweets.jsonl") == "ndjson"
+        assert detect_format(None, "tweets.xlsx") is None
+
+    def test_csv_text_column(self, tmp_path):
+        """Test the CSV text column is picked like in the UI"""
+        path = tmp_path / "tweets.csv"
+        path.write_text("date,content,text\n2024,ignored,hello there\n2024,x,\n", encoding="utf-8")
+        assert list(iter_tweet_records(path, "csv")) == [(1, None, "hello there", None)]
+
+    def test_json_fields(self, tmp_path):
+        """Test JSON tweets are read from the tweets list with cleaned text first"""
+        path = tmp_path / "tweets.json"
+        path.write_text(json.dumps({"tweets": [
+            {"id": 5, "content": "raw @user", "cleaned_text": "raw"},
+            "plain string",
+            {"id": 6}
+        ]}), encoding="utf-8")
+        assert list(iter_tweet_records(path, "json")) == [(1, 5, "raw", None), (2, None, "plain string", None)]
+
+    def test_invalid_json(self, tmp_path):
+        """Test unparsable files raise ValueError"""
+        path = tmp_path / "tweets.json"
+        path.write_text("{not json", encoding="utf-8")
+        with pytest.raises(ValueError):
+            list(iter_tweet_records(path, "json"))
+
+
+class TestJobManager:
+    """Test cases for job scoring, persistence and resume"""
+
+    def test_job_scored_in_batches(self, tmp_path, collector):
+        """Test an upload is scored in sub-batches with results on disk"""
+        calls = []
+        manager = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze(calls))
+        job = run_job(manager, CSV_BODY, "csv")
+
+        assert job["state"] == jobs.JOB_COMPLETED
+        assert job["total"] == job["processed"] == 10
+        assert calls == [4, 4, 2]
+        results, more = manager.read_results(job["job_id"], offset=8, limit=5)
+        assert [result["id"] for result in results] == ["8", "9"]
+        assert more is False
+        assert collector.get_stats()["sentiment_distribution"] == {"neutral": 10}
+
+    def test_parse_error_fails_job(self, tmp_path):
+        """Test an unparsable upload fails the job with a reason"""
+        manager = JobManager(jobs_dir=tmp_path, analyze=fake_analyze([]))
+        job = run_job(manager, "{not json", "json")
+        assert job["state"] == jobs.JOB_FAILED
+        assert "Invalid JSON" in job["error"]
+
+    def test_upload_size_limit(self, tmp_path):
+        """Test oversized uploads are rejected and leave nothing behind"""
+        manager = JobManager(jobs_dir=tmp_path, max_upload_bytes=10)
+        with pytest.raises(JobUploadTooLargeError):
+            asyncio.run(manager.create(chunked(CSV_BODY), "csv"))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_resume_after_restart(self, tmp_path):
+        """Test an interrupted job resumes from its saved progress"""
+        calls = []
+        first = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze(calls))
+
+        async def interrupted():
+            job = await first.create(chunked(CSV_BODY), "csv")
+            original = first.analyze
+
+            async def crash_on_second(texts):
+                if len(calls) == 1:
+                    # Interrupted before the second sub-batch is saved
+                    raise asyncio.CancelledError()
+                return await original(texts)
+
+            first.analyze = crash_on_second
+            try:
+                await first._run(job["job_id"])
+            except asyncio.CancelledError:
+                pass
+            return job["job_id"]
+
+        job_id = asyncio.run(interrupted())
+        assert first.get(job_id)["records_done"] == 4
+
+        second = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze(calls))
+
+        async def resume():
+            second.start()
+            await second._queue.join()
+            await second.stop()
+
+        asyncio.run(resume())
+        job = second.get(job_id)
+        assert job["state"] == jobs.JOB_COMPLETED
+        results, _ = second.read_results(job_id, limit=100)
+        assert [result["line"] for result in results] == list(range(1, 11))
+
+    def test_retention_cleanup(self, tmp_path):
+        """Test finished jobs past the retention period are deleted"""
+        manager = JobManager(jobs_dir=tmp_path, retention_hours=1, analyze=fake_analyze([]))
+        job = run_job(manager, CSV_BODY, "csv")
+        state = manager._load(job["job_id"])
+        state["finished_at"] = time.time() - 7200
+        manager._save(state)
+
+        manager.cleanup()
+        assert manager.get(job["job_id"]) is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_state_shared_between_processes(self, tmp_path):
+        """Test a job created by one manager is visible to another on the same directory"""
+        first = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze([]))
+        other = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze([]))
+        job_id = asyncio.run(first.create(chunked(CSV_BODY), "csv"))["job_id"]
+        assert other.get(job_id)["state"] == jobs.JOB_QUEUED
+
+        asyncio.run(first._run(job_id))
+        assert other.get(job_id)["state"] == jobs.JOB_COMPLETED
+        results, more = other.read_results(job_id, limit=100)
+        assert len(results) == 10
+        assert more is False
+
+    def test_claimed_job_not_run_twice(self, tmp_path):
+        """Test a job locked by one worker is skipped by the others"""
+        first_calls, second_calls = [], []
+        first = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze(first_calls))
+        second = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze(second_calls))
+        job_id = asyncio.run(first.create(chunked(CSV_BODY), "csv"))["job_id"]
+
+        release = first._claim(job_id)
+        assert release is not None
+        asyncio.run(second._run(job_id))
+        assert second_calls == []
+        assert second.get(job_id)["state"] == jobs.JOB_QUEUED
+
+        release()
+        asyncio.run(second._run(job_id))
+        asyncio.run(first._run(job_id))
+        assert second_calls == [4, 4, 2]
+        assert first_calls == []
+
+    def test_pages_seek_to_checkpoints(self, tmp_path):
+        """Test result pages start from the nearest sub-batch checkpoint"""
+        manager = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze([]))
+        job_id = run_job(manager, CSV_BODY, "csv")["job_id"]
+        state = manager._load(job_id)
+
+        assert manager._checkpoint(job_id, state["_index_bytes"], 3) == (0, 0)
+        records, position = manager._checkpoint(job_id, state["_index_bytes"], 9)
+        assert records == 8
+        with open(manager.results_path(job_id), 'rb') as f:
+            f.seek(position)
+            assert json.loads(f.readline())["id"] == "8"
+
+        pages = [manager.read_results(job_id, offset=offset, limit=3)[0] for offset in range(0, 10, 3)]
+        assert [result["id"] for page in pages for result in page] == [str(i) for i in range(10)]
+
+
+class TestJobEndpoints:
+    """Test cases for the /jobs API"""
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        """API client with jobs stored in a temporary directory"""
+        from app.main import app
+        manager = JobManager(jobs_dir=tmp_path, batch_size=4, analyze=fake_analyze([]))
+        monkeypatch.setattr(jobs, "job_manager", manager)
+        with TestClient(app) as client:
+            yield client
+
+    def wait(self, client, job_id):
+        for _ in range(100):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["state"] in jobs.FINISHED_STATES:
+                return job
+            time.sleep(0.05)
+        raise AssertionError("job did not finish")
+
+    def test_submit_and_download(self, client):
+        """Test a CSV job is accepted, scored and downloadable"""
+        response = client.post("/jobs", content=CSV_BODY, headers={"Content-Type": "text/csv"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        assert self.wait(client, job_id)["processed"] == 10
+        page = client.get(f"/jobs/{job_id}/results", params={"limit": 6}).json()
+        assert len(page["results"]) == 6
+        assert page["next_offset"] == 6
+        assert client.get(f"/jobs/{job_id}/results", params={"offset": 6}).json()["next_offset"] is None
+
+        download = client.get(f"/jobs/{job_id}/results", params={"format": "ndjson"})
+        assert download.headers["content-type"].startswith("application/x-ndjson")
+        assert len(download.text.splitlines()) == 10
+
+    def test_format_from_filename(self, client):
+        """Test the format can come from the filename query parameter"""
+        response = client.post(
+            "/jobs", params={"filename": "tweets.ndjson"}, content='"hello"\n',
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        assert response.status_code == 202
+        assert response.json()["format"] == "ndjson"
+
+    def test_unsupported_format(self, client):
+        """Test unknown upload formats are rejected"""
+        response = client.post("/jobs", content=b"\x89PNG", headers={"Content-Type": "image/png"})
+        assert response.status_code == 415
+
+    def test_unknown_job(self, client):
+        """Test unknown and malformed job ids return 404"""
+        assert client.get("/jobs/" + "0" * 32).status_code == 404
+        assert client.get("/jobs/not-a-job/results").status_code == 404
+
+
+# Run tests with: pytest tests/test_jobs.py -v
@@ -0,0 +1,90 @@
+"""
+Pytest tests for request stage timings
+Tests for StageTimings, per-stage histograms and ServerTimingMiddleware in app/monitoring.py
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.monitoring import (
+    MetricsCollector,
+    ServerTimingMiddleware,
+    StageTimings,
+    mark_stage,
+    timed_stage,
+    STAGE_BUCKETS_MS
+)
+
+
+def timed_app(collector: MetricsCollector, enabled: bool = True) -> FastAPI:
+    """App with one instrumented and one plain endpoint"""
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware, collector=collector, enabled=enabled)
+
+    @app.get("/timed")
+    async def timed():
+        mark_stage("validation")
+        with timed_stage("forward"):
+            pass
+        with timed_stage("forward"):
+            pass
+        return {"ok": True}
+
+    @app.get("/plain")
+    async def plain():
+        return {"ok": True}
+
+    return app
+
+
+class TestStageTimings:
+    """Test cases for StageTimings and the stage histograms"""
+
+    def test_stages_add_up(self):
+        """Test repeated stages accumulate and format as Server-Timing"""
+        timings = StageTimings()
+        timings.add("tokenize", 0.5)
+        timings.merge({"tokenize": 0.25, "forward": 12})
+        assert timings.stages == {"tokenize": 0.75, "forward": 12}
+        assert timings.server_timing(20) == "tokenize;dur=0.75, forward;dur=12.00, total;dur=20.00"
+
+    def test_record_stages_histogram(self):
+        """Test stage durations land in buckets with bucket-bound percentiles"""
+        collector = MetricsCollector()
+        for duration_ms in (0.05, 3, 4, 4000):
+            collector.record_stages({"forward": duration_ms})
+
+        stages = collector.get_stats()["stages"]
+        assert stages["buckets_ms"] == list(STAGE_BUCKETS_MS)
+        forward = stages["latency"]["forward"]
+        assert forward["count"] == 4
+        assert sum(forward["histogram"]) == 4
+        assert forward["histogram"][0] == 1 and forward["histogram"][-1] == 1
+        assert forward["p50_ms"] == 5
+        assert forward["p99_ms"] is None
+
+
+class TestServerTimingMiddleware:
+    """Test cases for the Server-Timing header"""
+
+    def test_header_and_metrics(self):
+        """Test instrumented requests report their stages and feed the histograms"""
+        collector = MetricsCollector()
+        with TestClient(timed_app(collector)) as client:
+            header = client.get("/timed").headers["server-timing"]
+            names = [metric.split(";")[0] for metric in header.split(", ")]
+            assert names == ["validation", "forward", "total"]
+
+            assert client.get("/plain").headers["server-timing"].startswith("total;dur=")
+
+        latency = collector.get_stats()["stages"]["latency"]
+        assert latency["total"]["count"] == 1
+        assert set(latency) == {"validation", "forward", "total"}
+
+    def test_header_disabled(self):
+        """Test the header can be turned off while stages are still recorded"""
+        collector = MetricsCollector()
+        with TestClient(timed_app(collector, enabled=False)) as client:
+            assert "server-timing" not in client.get("/timed").headers
+        assert collector.get_stats()["stages"]["latency"]["forward"]["count"] == 1
+
+
+# Run tests with: pytest tests/test_monitoring.py -v
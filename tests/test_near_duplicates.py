@@ -0,0 +1,117 @@
+"""
+Pytest tests for near-duplicate prediction reuse
+Tests for the MinHash/LSH index in app/near_duplicates.py
+"""
+import pytest
+from app import near_duplicates
+from app.monitoring import MetricsCollector
+from app.near_duplicates import NearDuplicateIndex, normalize_for_similarity
+
+pytest.importorskip("numpy")
+
+TWEET = "Just watched the new episode and honestly it was the best one this season"
+RESULT = {"sentiment": "positive", "label": 0, "confidence": 0.93, "tier": "model"}
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    """Record near-duplicate events in a fresh metrics collector"""
+    collector = MetricsCollector()
+    monkeypatch.setattr(near_duplicates, "metrics", collector)
+    return collector
+
+
+@pytest.fixture
+def index(collector):
+    """Enabled index holding one scored tweet"""
+    index = NearDuplicateIndex(threshold=0.9, max_entries=100, enabled=True)
+    index.add(TWEET, RESULT, version="v1")
+    return index
+
+
+class TestNormalization:
+    """Test cases for the shared tweet cleaning"""
+
+    def test_urls_and_mentions_ignored(self):
+        """Test URLs, mentions and case do not affect the normalized text"""
+        assert normalize_for_similarity(f"@alice {TWEET} https://t.co/abc123") == \
+            normalize_for_similarity(TWEET.upper())
+
+
+class TestNearDuplicateIndex:
+    """Test cases for lookups, bounds and versioning"""
+
+    def test_reuses_near_duplicate(self, index):
+        """Test a retweet with a link and mention reuses the prediction"""
+        match = index.lookup(f"RT @bob: {TWEET} https://t.co/xyz", version="v1")
+        assert match is not None
+        result, similarity = match
+        assert result == RESULT
+        assert similarity >= 0.9
+
+    def test_small_edit_reused(self, index):
+        """Test a one-character difference still passes the threshold"""
+        assert index.lookup(TWEET + "!", version="v1") is not None
+
+    def test_different_tweet_not_reused(self, index):
+        """Test an unrelated tweet of similar length gets no prediction"""
+        assert index.lookup("The train was late again this morning and I missed my meeting", version="v1") is None
+
+    def test_negation_not_reused(self, index):
+        """Test a meaning-changing edit falls below the strict threshold"""
+        assert index.lookup(TWEET.replace("honestly it was the best", "honestly it was not the best"), version="v1") is None
+
+    def test_short_texts_never_match(self, collector):
+        """Test short tweets are neither indexed nor matched"""
+        index = NearDuplicateIndex(enabled=True)
+        index.add("not bad", RESULT)
+        assert len(index) == 0
+        assert index.lookup("not bad") is None
+
+    def test_other_version_not_reused(self, index):
+        """Test predictions from another model version are ignored"""
+        assert index.lookup(TWEET, version="v2") is None
+
+    def test_returns_copy(self, index):
+        """Test callers cannot mutate the indexed prediction"""
+        result, _ = index.lookup(TWEET, version="v1")
+        result["sentiment"] = "negative"
+        assert index.lookup(TWEET, version="v1")[0]["sentiment"] == "positive"
+
+    def test_bounded_lru(self, collector):
+        """Test the least recently used entry and its bands are evicted"""
+        index = NearDuplicateIndex(max_entries=2, enabled=True)
+        texts = [TWEET, "The train was late again this morning and I missed my meeting",
+                 "Cannot believe how good the weather has been all week long"]
+        for text in texts:
+            index.add(text, RESULT)
+        assert len(index) == 2
+        assert index.lookup(texts[0]) is None
+        assert index.lookup(texts[2]) is not None
+        assert sum(len(bucket) for bucket in index._bands.values()) == 2 * index.num_bands
+
+    def test_clear(self, index):
+        """Test clearing empties the index"""
+        index.clear()
+        assert len(index) == 0
+        assert index.lookup(TWEET, version="v1") is None
+
+    def test_disabled(self, collector):
+        """Test a disabled index stores nothing and records no lookups"""
+        index = NearDuplicateIndex(enabled=False)
+        index.add(TWEET, RESULT)
+        assert index.lookup(TWEET) is None
+        assert collector.get_stats()["near_duplicates"]["lookups"] == 0
+
+    def test_reuse_rate_recorded(self, index, collector):
+        """Test lookups and reuses are exposed through the metrics collector"""
+        index.lookup(TWEET, version="v1")
+        index.lookup("The train was late again this morning and I missed my meeting", version="v1")
+        stats = collector.get_stats()["near_duplicates"]
+        assert stats["lookups"] == 2
+        assert stats["reused"] == 1
+        assert stats["reuse_rate"] == 50.0
+        assert stats["agreement_rate"] is None
+
+
+# Run tests with: pytest tests/test_near_duplicates.py -v
@@ -0,0 +1,233 @@
+"""
+Pytest tests for pre-fork multi-worker serving
+Tests for app/prefork.py and per-process memory reporting
+"""
+import gc
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from app import prefork
+from app.hot_swap import ModelChangeDetector
+from app.monitoring import read_process_memory
+from app.prefork import PreforkServer, bind_socket, load_shared_model, memory_report
+
+linux_only = pytest.mark.skipif(
+    not Path("/proc/self/smaps_rollup").exists(),
+    reason="requires /proc/self/smaps_rollup"
+)
+
+
+@linux_only
+class TestProcessMemory:
+    """Test cases for RSS/PSS reporting"""
+
+    def test_read_self(self):
+        """Test the current process memory is reported"""
+        usage = read_process_memory()
+        assert usage["pid"] == os.getpid()
+        assert usage["rss_mb"] > 0
+        assert 0 < usage["pss_mb"] <= usage["rss_mb"]
+        assert usage["shared_mb"] + usage["private_mb"] == pytest.approx(usage["rss_mb"], abs=0.2)
+
+    def test_missing_process(self):
+        """Test an unknown pid yields an empty report"""
+        assert read_process_memory("999999999") == {}
+
+    def test_report_totals(self):
+        """Test the report sums RSS/PSS and derives the shared savings"""
+        report = memory_report([os.getpid(), 999999999])
+        assert len(report["processes"]) == 1
+        assert report["total_rss_mb"] == report["processes"][0]["rss_mb"]
+        assert report["shared_savings_mb"] == pytest.approx(
+            report["total_rss_mb"] - report["total_pss_mb"], abs=0.2
+        )
+
+
+class TestSharedModel:
+    """Test cases for master-side model preparation"""
+
+    def test_load_freezes_heap(self, monkeypatch):
+        """Test objects allocated before fork are moved out of GC tracking"""
+        from app import sentiment_analyzer
+        monkeypatch.setattr(sentiment_analyzer, "_model", None)
+        monkeypatch.setattr(sentiment_analyzer, "load_model", lambda **kwargs: None)
+        try:
+            assert load_shared_model() is None
+            assert gc.get_freeze_count() > 0
+        finally:
+            gc.unfreeze()
+
+    def test_bind_free_port(self):
+        """Test the shared listening socket can be inherited by workers"""
+        sock = bind_socket("127.0.0.1", 0)
+        try:
+            assert sock.getsockname()[1] > 0
+            assert sock.get_inheritable()
+        finally:
+            sock.close()
+
+
+class TestModelReload:
+    """Test cases for master-side model reloads"""
+
+    @pytest.fixture
+    def server(self, monkeypatch):
+        """Server with two fake workers; forks and kills are recorded"""
+        from app import sentiment_analyzer
+        monkeypatch.setattr(sentiment_analyzer, "_model", None)
+        monkeypatch.setattr(sentiment_analyzer, "_load_timed_model", lambda **kwargs: {"version": "v2", "model": object()})
+        server = PreforkServer(app=None, sock=None, workers=2)
+        server.children = {111: 0, 222: 1}
+        server.spawned = []
+        server.killed = []
+        monkeypatch.setattr(server, "_spawn", server.spawned.append)
+        monkeypatch.setattr(prefork.os, "kill", lambda pid, sig: server.killed.append(pid))
+        yield server
+        gc.unfreeze()
+
+    def test_reload_rolls_workers(self, server):
+        """Test the master loads the model once and replaces every worker"""
+        from app import sentiment_analyzer
+        assert server.reload()
+        assert sentiment_analyzer._model["version"] == "v2"
+        assert server.spawned == [0, 1]
+        assert server.killed == [111, 222]
+        assert server.retiring == {111: 0, 222: 1}
+
+    def test_failed_reload_keeps_workers(self, server, monkeypatch):
+        """Test workers are kept when the new model cannot be loaded"""
+        from app import sentiment_analyzer
+        monkeypatch.setattr(sentiment_analyzer, "_load_timed_model", lambda **kwargs: None)
+        assert not server.reload()
+        assert server.spawned == [] and server.killed == []
+
+    def test_workers_do_not_watch(self, monkeypatch):
+        """Test only processes outside pre-fork workers run their own watcher"""
+        assert not prefork.is_prefork_worker()
+        monkeypatch.setattr(prefork, "_worker_index", 0)
+        assert prefork.is_prefork_worker()
+
+    def test_change_detector_waits_for_settled_files(self):
+        """Test a change is reported once it stopped changing for one poll"""
+        detector = ModelChangeDetector("v1")
+        assert not detector.settled_change("v1")
+        assert not detector.settled_change("v2-partial")
+        assert not detector.settled_change("v2")
+        assert detector.settled_change("v2")
+        detector.accept()
+        assert not detector.settled_change("v2")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+class TestForkAfterLoad:
+    """Test cases for inference in workers forked after the master loaded the model"""
+
+    @pytest.fixture
+    def saved_model(self, tmp_path, monkeypatch):
+        """Tiny randomly initialized DistilBERT saved with the repo tokenizer files"""
+        import shutil
+        from app import sentiment_analyzer
+        torch = pytest.importorskip("torch")
+        transformers = pytest.importorskip("transformers")
+
+        torch.manual_seed(0)
+        config = transformers.DistilBertConfig(dim=32, hidden_dim=64, n_layers=2, n_heads=2, num_labels=3)
+        target = tmp_path / "sentiment_model"
+        shutil.copytree(sentiment_analyzer.MODEL_PATH, target)
+        (target / sentiment_analyzer.TOKENIZER_JSON_NAME).unlink(missing_ok=True)
+        transformers.DistilBertForSequenceClassification(config).save_pretrained(str(target))
+
+        monkeypatch.setattr(sentiment_analyzer, "MODEL_PATH", target)
+        monkeypatch.setattr(sentiment_analyzer, "_model", None)
+        monkeypatch.setattr(sentiment_analyzer, "prediction_cache", sentiment_analyzer.PredictionCache(max_size=0))
+        # The random model may disagree with its int8 version; serve it anyway
+        monkeypatch.setattr(sentiment_analyzer, "QUANTIZATION_MIN_AGREEMENT", 0.0)
+        monkeypatch.setenv("QUANTIZATION_MIN_AGREEMENT", "0")
+        yield target
+        gc.unfreeze()
+
+    @pytest.mark.parametrize("engine", ["torch", "torch-int8", "onnx"])
+    def test_forked_worker_infers(self, saved_model, engine, monkeypatch):
+        """Test the master never runs the model and a forked child can"""
+        from app import sentiment_analyzer
+        if engine == "onnx":
+            pytest.importorskip("onnxruntime")
+            pytest.importorskip("onnx")
+        monkeypatch.setattr(sentiment_analyzer, "INFERENCE_ENGINE", engine)
+
+        def ran_in_master(*args, **kwargs):
+            raise AssertionError("the model ran in the master")
+
+        # The spawned preparation process is not affected by these
+        monkeypatch.setattr(sentiment_analyzer, "check_label_agreement", ran_in_master)
+        monkeypatch.setattr(sentiment_analyzer, "export_onnx_model", ran_in_master)
+
+        model_data = load_shared_model()
+        assert sentiment_analyzer.get_inference_engine(model_data) == engine
+
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                prefork._reinit_worker(1)
+                result = sentiment_analyzer.analyze_batch_optimized(["What a great day"])[0]
+                exit_code = 0 if result["tier"] == sentiment_analyzer.TIER_MODEL else 2
+            finally:
+                os._exit(exit_code)
+
+        deadline = time.monotonic() + 60
+        status = None
+        while status is None and time.monotonic() < deadline:
+            finished, code = os.waitpid(pid, os.WNOHANG)
+            if finished:
+                status = code
+            else:
+                time.sleep(0.05)
+        if status is None:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+            pytest.fail("forked worker hung during inference")
+        assert os.waitstatus_to_exitcode(status) == 0
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_workers_serve_shared_socket():
+    """Test forked workers answer requests on the master's socket"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.prefork", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "2", "--memory-report-delay", "0"],
+        cwd=Path(__file__).parent.parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        response = None
+        deadline = time.time() + 60
+        while response is None and time.time() < deadline:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=5)
+            except httpx.HTTPError:
+                time.sleep(0.5)
+        assert response is not None and response.status_code == 200
+        # Requests are served by a forked worker, not the master
+        assert response.json()["process_memory"].get("pid") not in (None, process.pid)
+        assert process.poll() is None
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+    assert process.returncode == 0
+
+
+# Run tests with: pytest tests/test_prefork.py -v
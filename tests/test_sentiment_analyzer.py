@@ -0,0 +1,698 @@
+"""
+Pytest tests for the sentiment analysis engine
+Tests for batched inference and input handling in app/sentiment_analyzer.py
+"""
+import json
+import shutil
+import pytest
+from pathlib import Path
+from app import near_duplicates, sentiment_analyzer
+
+DATA_PATH = Path(__file__).parent.parent / "data" / "tweets_labeled.json"
+
+
+@pytest.fixture
+def tiny_model(monkeypatch):
+    """Install a small randomly initialized DistilBERT as the loaded model"""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    torch.manual_seed(0)
+    config = transformers.DistilBertConfig(
+        dim=32,
+        hidden_dim=64,
+        n_layers=2,
+        n_heads=2,
+        num_labels=3
+    )
+    model = transformers.DistilBertForSequenceClassification(config)
+    model.eval()
+    tokenizer = transformers.DistilBertTokenizer.from_pretrained(str(sentiment_analyzer.MODEL_PATH))
+
+    model_data = {
+        'model': model,
+        'tokenizer': tokenizer,
+        'label_map': {"0": "positive", "1": "negative", "2": "neutral"}
+    }
+    monkeypatch.setattr(sentiment_analyzer, "_model", model_data)
+    # Every test starts without cached predictions (cache tests enable it)
+    monkeypatch.setattr(sentiment_analyzer, "prediction_cache", sentiment_analyzer.PredictionCache(max_size=0))
+    return model_data
+
+
+@pytest.fixture
+def saved_model_dir(tiny_model, tmp_path):
+    """Save the tiny model with the repo tokenizer files to a model directory"""
+    target = tmp_path / "sentiment_model"
+    shutil.copytree(sentiment_analyzer.MODEL_PATH, target)
+    (target / sentiment_analyzer.TOKENIZER_JSON_NAME).unlink(missing_ok=True)
+    tiny_model['model'].save_pretrained(str(target))
+    return target
+
+
+@pytest.fixture
+def no_model(monkeypatch):
+    """Force the placeholder path by making model loading fail"""
+    monkeypatch.setattr(sentiment_analyzer, "_model", None)
+    monkeypatch.setattr(sentiment_analyzer, "load_model", lambda **kwargs: None)
+
+
+class TestBatchInference:
+    """Test cases for analyze_batch_optimized"""
+
+    TEXTS = [
+        "This is a great day! I love it!",
+        "I hate this.",
+        "The weather is okay today, nothing special happening around here at all.",
+        "ok",
+    ]
+
+    def test_batch_matches_single(self, tiny_model):
+        """Test batched results match per-text inference"""
+        batch_results = sentiment_analyzer.analyze_batch_optimized(self.TEXTS)
+        single_results = [sentiment_analyzer.analyze_text(text) for text in self.TEXTS]
+
+        assert len(batch_results) == len(self.TEXTS)
+        for batch_result, single_result in zip(batch_results, single_results):
+            assert batch_result["sentiment"] == single_result["sentiment"]
+            assert batch_result["label"] == single_result["label"]
+            assert batch_result["confidence"] == pytest.approx(single_result["confidence"], abs=1e-4)
+
+    def test_batch_uses_single_forward_pass(self, tiny_model, monkeypatch):
+        """Test a batch smaller than the chunk size runs one forward pass"""
+        calls = []
+        original_forward = tiny_model['model'].forward
+
+        def counting_forward(*args, **kwargs):
+            calls.append(kwargs.get("input_ids").shape[0])
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", counting_forward)
+        texts = [f"{text} {i}" for i in range(5) for text in self.TEXTS]
+        sentiment_analyzer.analyze_batch_optimized(texts, batch_size=32)
+        assert calls == [len(texts)]
+
+    def test_batch_chunking(self, tiny_model, monkeypatch):
+        """Test large batches are split into chunks of batch_size"""
+        calls = []
+        original_forward = tiny_model['model'].forward
+
+        def counting_forward(*args, **kwargs):
+            calls.append(kwargs.get("input_ids").shape[0])
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", counting_forward)
+        texts = [f"{text} {i}" for i in range(3) for text in self.TEXTS]
+        results = sentiment_analyzer.analyze_batch_optimized(texts, batch_size=5)
+        assert len(results) == 12
+        assert calls == [5, 5, 2]
+
+    def test_invalid_texts_keep_placeholder(self, tiny_model):
+        """Test invalid texts get neutral/0.0 without breaking the batch"""
+        texts = ["I love it!", "", "   ", None, "I hate it."]
+        results = sentiment_analyzer.analyze_batch_optimized(texts)
+
+        assert len(results) == len(texts)
+        for index in (1, 2, 3):
+            assert results[index] == sentiment_analyzer.INVALID_TEXT_RESULT
+        for index in (0, 4):
+            assert results[index]["sentiment"] in ["positive", "negative", "neutral"]
+            assert 0.0 < results[index]["confidence"] <= 1.0
+
+    def test_batch_without_model(self, no_model):
+        """Test batch falls back to placeholder analysis without a model"""
+        results = sentiment_analyzer.analyze_batch_optimized(["I love this", "I hate this", ""])
+        assert [result["sentiment"] for result in results] == ["positive", "negative", "neutral"]
+        assert results[2]["confidence"] == 0.0
+
+
+class TestDeduplication:
+    """Test cases for intra-batch deduplication"""
+
+    def test_duplicates_run_once(self, tiny_model, monkeypatch):
+        """Test each unique text is run once and fanned out to every position"""
+        rows = []
+        original_forward = tiny_model['model'].forward
+
+        def counting_forward(*args, **kwargs):
+            rows.append(kwargs.get("input_ids").shape[0])
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", counting_forward)
+        texts = ["RT great game", "boring", "RT great game", "RT  great game ", "", "boring"]
+        results, stats = sentiment_analyzer.analyze_batch_with_stats(texts)
+
+        assert rows == [2]
+        assert stats == {"total_texts": 6, "unique_texts": 2, "fast_tier_texts": 0, "inferred_texts": 2}
+        assert results[0] == results[2] == results[3]
+        assert results[1] == results[5]
+        assert results[4] == sentiment_analyzer.INVALID_TEXT_RESULT
+
+    def test_fanned_out_results_are_copies(self, tiny_model):
+        """Test duplicate positions do not share one mutable result"""
+        results = sentiment_analyzer.analyze_batch_optimized(["same", "same"])
+        results[0]["confidence"] = -1
+        assert results[1]["confidence"] != -1
+
+    def test_cached_texts_not_counted(self, tiny_model, monkeypatch):
+        """Test inferred_texts excludes texts served from the prediction cache"""
+        monkeypatch.setattr(sentiment_analyzer, "prediction_cache", sentiment_analyzer.PredictionCache(max_size=100))
+        sentiment_analyzer.analyze_batch_optimized(["seen before"])
+        _, stats = sentiment_analyzer.analyze_batch_with_stats(["seen before", "new", "new"])
+        assert stats["unique_texts"] == 2
+        assert stats["inferred_texts"] == 1
+
+    def test_placeholder_dedup(self, no_model):
+        """Test duplicates are also collapsed without a model"""
+        results, stats = sentiment_analyzer.analyze_batch_with_stats(["I love it"] * 3)
+        assert stats["unique_texts"] == 1
+        assert [result["sentiment"] for result in results] == ["positive"] * 3
+
+
+class TestSequenceBuckets:
+    """Test cases for dynamic padding with sequence length buckets"""
+
+    def test_parse_buckets(self):
+        """Test bucket parsing sorts, caps and always includes the max length"""
+        assert sentiment_analyzer._parse_sequence_buckets("64, 16,500") == (16, 64, 128)
+        assert sentiment_analyzer._parse_sequence_buckets("") == (128,)
+
+    def test_select_bucket(self, monkeypatch):
+        """Test the smallest fitting bucket is selected"""
+        monkeypatch.setattr(sentiment_analyzer, "SEQUENCE_BUCKETS", (16, 32, 64, 128))
+        assert sentiment_analyzer._select_sequence_bucket(3) == 16
+        assert sentiment_analyzer._select_sequence_bucket(16) == 16
+        assert sentiment_analyzer._select_sequence_bucket(17) == 32
+        assert sentiment_analyzer._select_sequence_bucket(128) == 128
+
+    def test_batch_padded_to_bucket(self, tiny_model, monkeypatch):
+        """Test short batches are padded to a bucket instead of 128 tokens"""
+        monkeypatch.setattr(sentiment_analyzer, "SEQUENCE_BUCKETS", (16, 32, 64, 128))
+        shapes = []
+        original_forward = tiny_model['model'].forward
+
+        def recording_forward(*args, **kwargs):
+            shapes.append(tuple(kwargs.get("input_ids").shape))
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", recording_forward)
+        sentiment_analyzer.analyze_batch_optimized(["short tweet", "another one"])
+        sentiment_analyzer.analyze_batch_optimized(["word " * 40])
+        assert shapes == [(2, 16), (1, 64)]
+
+    def test_bucket_hits_recorded(self, tiny_model, monkeypatch):
+        """Test bucket hit counts are exposed through the metrics collector"""
+        from app.monitoring import MetricsCollector
+        collector = MetricsCollector()
+        monkeypatch.setattr(sentiment_analyzer, "metrics", collector)
+        monkeypatch.setattr(sentiment_analyzer, "SEQUENCE_BUCKETS", (16, 32, 64, 128))
+
+        sentiment_analyzer.analyze_batch_optimized(["short tweet"])
+        sentiment_analyzer.analyze_text("another short tweet")
+        assert collector.get_stats()["sequence_bucket_hits"] == {16: 2}
+
+
+class TestTokenBudgetBatching:
+    """Test cases for length-sorted, token-budget sub-batches"""
+
+    @pytest.fixture(autouse=True)
+    def buckets(self, monkeypatch):
+        monkeypatch.setattr(sentiment_analyzer, "SEQUENCE_BUCKETS", (16, 32, 64, 128))
+
+    def test_batches_sorted_by_length(self):
+        """Test similar lengths are grouped and the budget caps padded tokens"""
+        batches = sentiment_analyzer.form_token_budget_batches([100, 5, 50, 6, 7], token_budget=128)
+        assert batches == [[1, 3, 4], [2], [0]]
+
+    def test_oversized_text_gets_own_batch(self):
+        """Test a text longer than the budget still forms a batch"""
+        assert sentiment_analyzer.form_token_budget_batches([120, 3], token_budget=64) == [[1], [0]]
+
+    def test_max_batch_size(self):
+        """Test the optional row cap splits batches within the budget"""
+        batches = sentiment_analyzer.form_token_budget_batches([4] * 5, token_budget=4096, max_batch_size=2)
+        assert batches == [[0, 1], [2, 3], [4]]
+
+    def test_mixed_lengths_restore_order(self, tiny_model, monkeypatch):
+        """Test short texts skip long padding and results keep input order"""
+        monkeypatch.setattr(sentiment_analyzer, "INFERENCE_TOKEN_BUDGET", 64)
+        shapes = []
+        original_forward = tiny_model['model'].forward
+
+        def recording_forward(*args, **kwargs):
+            shapes.append(tuple(kwargs.get("input_ids").shape))
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", recording_forward)
+        texts = ["word " * 40, "ok", "I love it", "fine " * 20, "meh"]
+        batch_results = sentiment_analyzer.analyze_batch_optimized(texts)
+
+        assert shapes == [(3, 16), (1, 32), (1, 64)]
+        monkeypatch.setattr(tiny_model['model'], "forward", original_forward)
+        for text, batch_result in zip(texts, batch_results):
+            single_result = sentiment_analyzer.analyze_text(text)
+            assert batch_result["label"] == single_result["label"]
+            assert batch_result["confidence"] == pytest.approx(single_result["confidence"], abs=1e-4)
+
+    def test_padding_efficiency_recorded(self, tiny_model, monkeypatch):
+        """Test real and padded token counts are exposed as a metric"""
+        from app.monitoring import MetricsCollector
+        collector = MetricsCollector()
+        monkeypatch.setattr(sentiment_analyzer, "metrics", collector)
+
+        # "ok" is [CLS] ok [SEP] = 3 real tokens padded to the 16 bucket
+        sentiment_analyzer.analyze_batch_optimized(["ok", "no"])
+        padding = collector.get_stats()["padding"]
+        assert padding["real_tokens"] == 6
+        assert padding["padded_tokens"] == 32
+        assert padding["efficiency"] == 18.75
+
+
+class TestCascade:
+    """Test cases for the TF-IDF/LogisticRegression fast tier"""
+
+    TEXTS = ["I love it", "I hate it", "It is a table"]
+
+    @pytest.fixture
+    def fast_tier_files(self, tmp_path):
+        """Train a small fast tier the way scripts/train_model.py saves it"""
+        pytest.importorskip("sklearn")
+        joblib = pytest.importorskip("joblib")
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        with open(DATA_PATH, 'r', encoding='utf-8') as f:
+            tweets = json.load(f)['tweets']
+        texts = [tweet['cleaned_text'] for tweet in tweets]
+        labels = [tweet['sentiment_label'] for tweet in tweets]
+
+        vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
+        classifier = LogisticRegression(max_iter=1000, random_state=42)
+        classifier.fit(vectorizer.fit_transform(texts), labels)
+
+        model_path, vectorizer_path = tmp_path / "sentiment_model.pkl", tmp_path / "vectorizer.pkl"
+        joblib.dump(classifier, model_path)
+        joblib.dump(vectorizer, vectorizer_path)
+        return model_path, vectorizer_path
+
+    @pytest.fixture
+    def cascade_model(self, tiny_model, fast_tier_files, monkeypatch):
+        """Attach the fast tier to the tiny model and count model rows"""
+        tiny_model['fast_tier'] = sentiment_analyzer.load_fast_tier(*fast_tier_files)
+        rows = []
+        original_forward = tiny_model['model'].forward
+
+        def counting_forward(*args, **kwargs):
+            rows.append(kwargs.get("input_ids").shape[0])
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", counting_forward)
+        return rows
+
+    def test_load_fast_tier(self, fast_tier_files):
+        """Test the saved classifier and vectorizer are loaded with labels"""
+        fast_tier = sentiment_analyzer.load_fast_tier(*fast_tier_files)
+        assert sorted(fast_tier['label_map'].values()) == ["negative", "neutral", "positive"]
+
+    def test_missing_fast_tier(self, tmp_path):
+        """Test missing files disable the cascade instead of failing"""
+        assert sentiment_analyzer.load_fast_tier(tmp_path / "a.pkl", tmp_path / "b.pkl") is None
+
+    def test_confident_texts_skip_model(self, cascade_model, monkeypatch):
+        """Test texts at or above the threshold are answered by the fast tier"""
+        monkeypatch.setattr(sentiment_analyzer, "CASCADE_CONFIDENCE_THRESHOLD", 0.0)
+        results, stats = sentiment_analyzer.analyze_batch_with_stats(self.TEXTS)
+        assert [result["tier"] for result in results] == [sentiment_analyzer.TIER_FAST] * 3
+        assert results[0]["sentiment"] == "positive"
+        assert results[1]["sentiment"] == "negative"
+        assert cascade_model == []
+        # Fast-tier answers are not counted as model inferences
+        assert stats["fast_tier_texts"] == 3
+        assert stats["inferred_texts"] == 0
+
+    def test_uncertain_texts_escalate(self, cascade_model, monkeypatch):
+        """Test texts below the threshold are escalated to DistilBERT"""
+        monkeypatch.setattr(sentiment_analyzer, "CASCADE_CONFIDENCE_THRESHOLD", 1.01)
+        results = sentiment_analyzer.analyze_batch_optimized(self.TEXTS)
+        assert [result["tier"] for result in results] == [sentiment_analyzer.TIER_MODEL] * 3
+        assert cascade_model == [3]
+
+    def test_escalation_rate_recorded(self, cascade_model, monkeypatch):
+        """Test the escalation rate is exposed through the metrics collector"""
+        from app.monitoring import MetricsCollector
+        collector = MetricsCollector()
+        monkeypatch.setattr(sentiment_analyzer, "metrics", collector)
+        fast_tier = sentiment_analyzer._model['fast_tier']
+        confidences = [result["confidence"] for result in sentiment_analyzer.predict_fast_tier(fast_tier, self.TEXTS)]
+        monkeypatch.setattr(sentiment_analyzer, "CASCADE_CONFIDENCE_THRESHOLD", sorted(confidences)[1])
+
+        results = sentiment_analyzer.analyze_batch_optimized(self.TEXTS)
+        cascade = collector.get_stats()["cascade"]
+        assert [result["tier"] for result in results].count(sentiment_analyzer.TIER_FAST) == 2
+        assert cascade["scored"] == 3
+        assert cascade["escalated"] == 1
+        assert cascade["escalation_rate"] == 33.33
+        assert cascade_model == [1]
+
+
+class TestNearDuplicates:
+    """Test cases for near-duplicate reuse in batch prediction"""
+
+    TWEET = "Just watched the new episode and honestly it was the best one this season"
+
+    @pytest.fixture
+    def index(self, tiny_model, monkeypatch):
+        """Enable a fresh near-duplicate index and metrics collector"""
+        pytest.importorskip("numpy")
+        from app.monitoring import MetricsCollector
+        collector = MetricsCollector()
+        monkeypatch.setattr(sentiment_analyzer, "metrics", collector)
+        monkeypatch.setattr(near_duplicates, "metrics", collector)
+        index = near_duplicates.NearDuplicateIndex(enabled=True)
+        monkeypatch.setattr(sentiment_analyzer, "near_duplicate_index", index)
+        return index, collector
+
+    def test_retweet_reuses_prediction(self, index, tiny_model, monkeypatch):
+        """Test a near-duplicate is answered without running the model"""
+        monkeypatch.setattr(near_duplicates, "NEAR_DUP_AGREEMENT_SAMPLE_RATE", 0.0)
+        first = sentiment_analyzer.analyze_batch_optimized([self.TWEET])[0]
+
+        rows = []
+        original_forward = tiny_model['model'].forward
+
+        def counting_forward(*args, **kwargs):
+            rows.append(kwargs.get("input_ids").shape[0])
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", counting_forward)
+        results, stats = sentiment_analyzer.analyze_batch_with_stats([f"RT @bob: {self.TWEET} https://t.co/x"])
+        assert results[0]["sentiment"] == first["sentiment"]
+        assert results[0]["confidence"] == first["confidence"]
+        assert stats["inferred_texts"] == 0
+        assert rows == []
+        assert index[1].get_stats()["near_duplicates"]["reused"] == 1
+
+    def test_sampled_agreement(self, index, monkeypatch):
+        """Test sampled reuses are re-run and their agreement recorded"""
+        monkeypatch.setattr(near_duplicates, "NEAR_DUP_AGREEMENT_SAMPLE_RATE", 1.0)
+        sentiment_analyzer.analyze_batch_optimized([self.TWEET])
+        _, stats = sentiment_analyzer.analyze_batch_with_stats([self.TWEET + "!"])
+        assert stats["inferred_texts"] == 1
+        near_dup = index[1].get_stats()["near_duplicates"]
+        assert near_dup["agreement_samples"] == 1
+        assert near_dup["agreement_rate"] == 100.0
+
+    def test_placeholder_not_indexed(self, index, no_model):
+        """Test placeholder results are never reused"""
+        sentiment_analyzer.analyze_batch_optimized([self.TWEET])
+        assert len(index[0]) == 0
+
+    def test_swap_clears_index(self, index, tiny_model):
+        """Test predictions of a swapped-out model are dropped"""
+        sentiment_analyzer.analyze_batch_optimized([self.TWEET])
+        assert len(index[0]) == 1
+        sentiment_analyzer.swap_model(dict(tiny_model, version="v2"))
+        assert len(index[0]) == 0
+
+
+class TestTokenizer:
+    """Test cases for the fast tokenizer serving path"""
+
+    @pytest.fixture
+    def model_dir(self, tmp_path):
+        """Copy the tokenizer files so tests don't write into models/"""
+        pytest.importorskip("transformers")
+        target = tmp_path / "sentiment_model"
+        shutil.copytree(sentiment_analyzer.MODEL_PATH, target)
+        (target / sentiment_analyzer.TOKENIZER_JSON_NAME).unlink(missing_ok=True)
+        return target
+
+    def test_fast_tokenizer_cached(self, model_dir):
+        """Test tokenizer.json is generated when missing and reused"""
+        tokenizer = sentiment_analyzer.load_tokenizer(model_dir, use_fast=True)
+        assert tokenizer.is_fast
+        assert (model_dir / sentiment_analyzer.TOKENIZER_JSON_NAME).exists()
+
+        reloaded = sentiment_analyzer.load_tokenizer(model_dir, use_fast=True)
+        assert reloaded("I love this")["input_ids"] == tokenizer("I love this")["input_ids"]
+
+    def test_parity_on_labeled_tweets(self, model_dir):
+        """Test fast and slow tokenizers produce identical ids on the dataset"""
+        with open(DATA_PATH, 'r', encoding='utf-8') as f:
+            tweets = json.load(f)["tweets"]
+        texts = [tweet["content"] for tweet in tweets] + [tweet["cleaned_text"] for tweet in tweets]
+
+        report = sentiment_analyzer.check_tokenizer_parity(texts, model_dir)
+        assert report["total"] == len(texts)
+        assert report["mismatches"] == []
+
+
+class TestPredictionCache:
+    """Test cases for the LRU+TTL prediction cache"""
+
+    @pytest.fixture
+    def collector(self, monkeypatch):
+        """Record cache events in a fresh metrics collector"""
+        from app.monitoring import MetricsCollector
+        collector = MetricsCollector()
+        monkeypatch.setattr(sentiment_analyzer, "metrics", collector)
+        return collector
+
+    def test_lru_eviction(self, collector):
+        """Test least recently used entries are evicted when full"""
+        cache = sentiment_analyzer.PredictionCache(max_size=2, ttl_seconds=0)
+        cache.put("a", {"label": "POS"})
+        cache.put("b", {"label": "NEG"})
+        assert cache.get("a") == {"label": "POS"}
+        cache.put("c", {"label": "NEU"})
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert len(cache) == 2
+        stats = collector.get_stats()["prediction_cache"]
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+
+    def test_ttl_expiration(self, collector, monkeypatch):
+        """Test entries older than the TTL are treated as misses"""
+        now = [1000.0]
+        monkeypatch.setattr(sentiment_analyzer.time, "monotonic", lambda: now[0])
+        cache = sentiment_analyzer.PredictionCache(max_size=10, ttl_seconds=60)
+        cache.put("a", {"label": "POS"})
+
+        now[0] += 30
+        assert cache.get("a") is not None
+        now[0] += 61
+        assert cache.get("a") is None
+        assert collector.get_stats()["prediction_cache"]["expirations"] == 1
+
+    def test_normalization(self):
+        """Test keys ignore surrounding/extra whitespace and case for uncased models"""
+        key = sentiment_analyzer._cache_key
+        assert key("  I  love\tthis ", lowercase=True) == key("i LOVE this", lowercase=True)
+        assert key("I love this", lowercase=False) != key("i love this", lowercase=False)
+        assert key("I  love this", lowercase=False) == key("I love this", lowercase=False)
+
+    def test_repeated_texts_skip_model(self, tiny_model, monkeypatch, collector):
+        """Test cached texts are not run through the model again"""
+        monkeypatch.setattr(sentiment_analyzer, "prediction_cache", sentiment_analyzer.PredictionCache(max_size=100))
+        tiny_model['lowercase'] = True
+        calls = []
+        original_forward = tiny_model['model'].forward
+
+        def counting_forward(*args, **kwargs):
+            calls.append(kwargs.get("input_ids").shape[0])
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", counting_forward)
+        first = sentiment_analyzer.analyze_batch_optimized(["Great news", "Bad news"])
+        second = sentiment_analyzer.analyze_batch_optimized(["great   NEWS", "Fresh text", "Bad news"])
+
+        assert calls == [2, 1]
+        assert second[0] == first[0]
+        assert second[2] == first[1]
+        assert collector.get_stats()["prediction_cache"]["hits"] == 2
+
+    def test_swap_invalidates_cache(self, monkeypatch):
+        """Test swapping the model clears cached predictions"""
+        cache = sentiment_analyzer.PredictionCache(max_size=10)
+        cache.put("a", {"label": "POS"})
+        monkeypatch.setattr(sentiment_analyzer, "prediction_cache", cache)
+        monkeypatch.setattr(sentiment_analyzer, "_model", None)
+
+        sentiment_analyzer.swap_model({"version": "next"})
+        assert len(cache) == 0
+
+
+class TestHotSwap:
+    """Test cases for model versioning, warm-up and hot-swap"""
+
+    def test_warm_up_covers_buckets(self, tiny_model, monkeypatch):
+        """Test warm-up runs every batch size in every bucket without metrics"""
+        from app.monitoring import MetricsCollector
+        collector = MetricsCollector()
+        monkeypatch.setattr(sentiment_analyzer, "metrics", collector)
+        shapes = []
+        original_forward = tiny_model['model'].forward
+
+        def recording_forward(*args, **kwargs):
+            shapes.append(tuple(kwargs.get("input_ids").shape))
+            return original_forward(*args, **kwargs)
+
+        monkeypatch.setattr(tiny_model['model'], "forward", recording_forward)
+        duration = sentiment_analyzer.warm_up_model(tiny_model, batch_sizes=(1, 4), buckets=(16, 64))
+
+        assert shapes == [(1, 16), (4, 16), (1, 64), (4, 64)]
+        assert duration > 0
+        assert collector.get_stats()["sequence_bucket_hits"] == {}
+        assert collector.get_stats()["startup"]["first_inference_ms"] is None
+
+        sentiment_analyzer.analyze_batch_optimized(["The first real tweet"])
+        assert collector.get_stats()["startup"]["first_inference_ms"] > 0
+
+    def test_swap_keeps_inflight_reference(self, tiny_model):
+        """Test requests holding the old model are unaffected by a swap"""
+        old = sentiment_analyzer.get_model()
+        new = dict(tiny_model, version="v2")
+        assert sentiment_analyzer.swap_model(new) is old
+        assert sentiment_analyzer.get_model() is new
+        assert sentiment_analyzer._predict_with_cache(old, ["still works"])[0]["tier"] == "model"
+
+    def test_hot_swap_warms_and_swaps(self, tiny_model, monkeypatch):
+        """Test a hot-swap loads, warms up and installs the new model"""
+        new = dict(tiny_model, version="v2")
+        monkeypatch.setattr(sentiment_analyzer, "load_model", lambda **kwargs: new)
+        monkeypatch.setattr(sentiment_analyzer, "WARMUP_BATCH_SIZES", (1,))
+
+        assert sentiment_analyzer.hot_swap_model() is new
+        assert sentiment_analyzer.get_model() is new
+        assert new["warmup_ms"] > 0
+        assert new["load_time_ms"] >= 0
+
+    def test_failed_load_keeps_current_model(self, tiny_model, monkeypatch):
+        """Test the serving model stays in place if the new one fails to load"""
+        monkeypatch.setattr(sentiment_analyzer, "load_model", lambda **kwargs: None)
+        assert sentiment_analyzer.hot_swap_model() is None
+        assert sentiment_analyzer.get_model() is tiny_model
+
+    def test_concurrent_swap_rejected(self, tiny_model):
+        """Test only one hot-swap runs at a time"""
+        with sentiment_analyzer._swap_lock:
+            with pytest.raises(sentiment_analyzer.ModelSwapInProgressError):
+                sentiment_analyzer.hot_swap_model()
+
+    def test_version_follows_weights(self, saved_model_dir):
+        """Test the model version changes when new weights are written"""
+        version = sentiment_analyzer.model_version(saved_model_dir)
+        (saved_model_dir / "model.safetensors").write_bytes(b"retrained")
+        assert sentiment_analyzer.model_version(saved_model_dir) != version
+
+    def test_cache_keys_per_version(self):
+        """Test cached predictions are not shared between model versions"""
+        key = sentiment_analyzer._cache_key
+        assert key("I love this", version="v1") != key("I love this", version="v2")
+
+
+class TestOnnxEngine:
+    """Test cases for the ONNX Runtime inference engine"""
+
+    TEXTS = ["I love this so much", "worst day ever", "the meeting is at noon, see the agenda " * 3]
+
+    def test_onnx_matches_torch(self, tiny_model, saved_model_dir, monkeypatch):
+        """Test the exported ONNX model gives the same predictions as torch"""
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("onnx")
+        torch_results = sentiment_analyzer.analyze_batch_optimized(self.TEXTS)
+
+        monkeypatch.setattr(sentiment_analyzer, "MODEL_PATH", saved_model_dir)
+        model_data = sentiment_analyzer._load_onnx_model(saved_model_dir)
+        assert model_data['engine'] == 'onnx'
+        assert (saved_model_dir / sentiment_analyzer.ONNX_MODEL_NAME).exists()
+
+        monkeypatch.setattr(sentiment_analyzer, "_model", model_data)
+        onnx_results = sentiment_analyzer.analyze_batch_optimized(self.TEXTS)
+        for onnx_result, torch_result in zip(onnx_results, torch_results):
+            assert onnx_result["label"] == torch_result["label"]
+            assert onnx_result["confidence"] == pytest.approx(torch_result["confidence"], abs=1e-4)
+
+    def test_load_model_selects_onnx(self, saved_model_dir, monkeypatch):
+        """Test INFERENCE_ENGINE=onnx makes load_model serve through ONNX Runtime"""
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("onnx")
+        monkeypatch.setattr(sentiment_analyzer, "MODEL_PATH", saved_model_dir)
+        monkeypatch.setattr(sentiment_analyzer, "INFERENCE_ENGINE", "onnx")
+
+        model_data = sentiment_analyzer.load_model()
+        assert sentiment_analyzer.get_inference_engine(model_data) == "onnx"
+
+    def test_onnx_unavailable_falls_back_to_torch(self, saved_model_dir, monkeypatch):
+        """Test the torch engine is used when ONNX Runtime is missing"""
+        monkeypatch.setattr(sentiment_analyzer, "MODEL_PATH", saved_model_dir)
+        monkeypatch.setattr(sentiment_analyzer, "INFERENCE_ENGINE", "onnx")
+        monkeypatch.setattr(sentiment_analyzer, "ONNX_AVAILABLE", False)
+
+        model_data = sentiment_analyzer.load_model()
+        assert sentiment_analyzer.get_inference_engine(model_data) == "torch"
+
+
+class TestInt8Engine:
+    """Test cases for the dynamically quantized serving mode"""
+
+    @pytest.fixture
+    def int8_engine(self, saved_model_dir, monkeypatch):
+        """Select the int8 engine for a saved tiny model"""
+        monkeypatch.setattr(sentiment_analyzer, "MODEL_PATH", saved_model_dir)
+        monkeypatch.setattr(sentiment_analyzer, "INFERENCE_ENGINE", "torch-int8")
+        return saved_model_dir
+
+    def test_agreement_texts_are_held_out(self):
+        """Test the agreement check uses a bounded held-out slice"""
+        texts = sentiment_analyzer.load_agreement_texts(limit=20)
+        assert 0 < len(texts) <= 20
+        assert all(isinstance(text, str) and text for text in texts)
+
+    def test_quantized_model_served_and_cached(self, int8_engine, monkeypatch):
+        """Test the int8 model is activated, cached, and reused on next start"""
+        monkeypatch.setattr(sentiment_analyzer, "QUANTIZATION_MIN_AGREEMENT", 0.0)
+        monkeypatch.setattr(sentiment_analyzer, "_model", sentiment_analyzer.load_model())
+        assert sentiment_analyzer.get_inference_engine() == "torch-int8"
+        assert (int8_engine / sentiment_analyzer.QUANTIZED_MODEL_NAME).exists()
+        fresh = sentiment_analyzer.analyze_text("Quantized models are fast")
+
+        def fail_quantize(model):
+            raise AssertionError("cached model should be reused")
+
+        monkeypatch.setattr(sentiment_analyzer, "quantize_model", fail_quantize)
+        monkeypatch.setattr(sentiment_analyzer, "_model", sentiment_analyzer.load_model())
+        assert sentiment_analyzer.get_inference_engine() == "torch-int8"
+        cached = sentiment_analyzer.analyze_text("Quantized models are fast")
+        assert cached["label"] == fresh["label"]
+        assert cached["confidence"] == pytest.approx(fresh["confidence"], abs=1e-6)
+
+    def test_low_agreement_refuses_activation(self, int8_engine, monkeypatch):
+        """Test the fp32 model is served when agreement is below the threshold"""
+        monkeypatch.setattr(sentiment_analyzer, "QUANTIZATION_MIN_AGREEMENT", 0.5)
+        monkeypatch.setattr(sentiment_analyzer, "check_label_agreement", lambda *args: 0.4)
+
+        model_data = sentiment_analyzer.load_model()
+        assert model_data['engine'] == "torch"
+
+
+class TestAnalyzeText:
+    """Test cases for analyze_text"""
+
+    def test_empty_text_raises(self):
+        """Test analyze_text rejects empty input"""
+        with pytest.raises(ValueError):
+            sentiment_analyzer.analyze_text("   ")
+
+    def test_result_structure(self, tiny_model):
+        """Test analyze_text returns the API result format"""
+        result = sentiment_analyzer.analyze_text("What a lovely morning")
+        assert set(result) == {"sentiment", "confidence", "label", "tier"}
+        assert result["label"] in ["POS", "NEG", "NEU"]
+        assert result["tier"] == sentiment_analyzer.TIER_MODEL
+
+
+# Run tests with: pytest tests/test_sentiment_analyzer.py -v
@@ -0,0 +1,164 @@
+"""
+Pytest tests for streaming batch prediction
+Tests for line splitting and sub-batched scoring in app/streaming.py
+"""
+import asyncio
+import json
+import pytest
+from app import streaming
+from app.monitoring import MetricsCollector
+
+
+async def chunked(*chunks):
+    """Async iterator over request body chunks"""
+    for chunk in chunks:
+        yield chunk
+
+
+def collect(aiterator):
+    """Drain an async iterator"""
+    async def run():
+        return [item async for item in aiterator]
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def collector(monkeypatch):
+    """Record stream metrics in a fresh collector"""
+    collector = MetricsCollector()
+    monkeypatch.setattr(streaming, "metrics", collector)
+    return collector
+
+
+class TestIterLines:
+    """Test cases for splitting the request body into lines"""
+
+    def test_lines_across_chunks(self):
+        """Test lines split over chunk boundaries are reassembled"""
+        lines = collect(streaming.iter_lines(chunked(b"first li", b"ne\r\nsec", b"ond\nthird")))
+        assert lines == [b"first line", b"second", b"third"]
+
+    def test_oversized_line_not_buffered(self):
+        """Test an oversized line yields None and the stream continues"""
+        lines = collect(streaming.iter_lines(chunked(b"x" * 6, b"x" * 6, b"\nok\n"), max_line_bytes=8))
+        assert lines == [None, b"ok"]
+
+    def test_many_lines_in_one_chunk(self):
+        """Test a chunk holding many lines is split in order with its partial tail kept"""
+        body = b"".join(b"line %d\n" % i for i in range(20000)) + b"tail"
+        lines = collect(streaming.iter_lines(chunked(body[:-2], body[-2:])))
+        assert len(lines) == 20001
+        assert lines[0] == b"line 0" and lines[-1] == b"tail"
+
+
+class TestParseLine:
+    """Test cases for input line validation"""
+
+    def test_ndjson_object_with_id(self):
+        """Test objects carry their id and tweet text"""
+        assert streaming.parse_line(b'{"id": 7, "text": " hi "}', 3) == (3, 7, "hi", None)
+
+    def test_plain_text_not_parsed(self):
+        """Test plain text lines are used verbatim"""
+        assert streaming.parse_line(b'{"not": "json"}', 1, plain_text=True)[2] == '{"not": "json"}'
+
+    def test_blank_line_skipped(self):
+        """Test blank lines produce no item"""
+        assert streaming.parse_line(b"   ", 1) is None
+
+    @pytest.mark.parametrize("line", [b"{bad", b"42", b'{"id": 1}', b'"   "', b"\xff"])
+    def test_invalid_lines(self, line):
+        """Test invalid lines are turned into errors"""
+        assert streaming.parse_line(line, 1)[3] is not None
+
+
+class TestStreamPredictions:
+    """Test cases for sub-batched scoring"""
+
+    @staticmethod
+    def analyzer(calls):
+        async def analyze(texts):
+            calls.append(len(texts))
+            return [{"sentiment": "neutral", "confidence": 0.5, "label": "NEU"} for _ in texts]
+        return analyze
+
+    def test_sub_batches_in_order(self, collector):
+        """Test input is scored in sub-batches and results keep input order"""
+        calls = []
+        body = "".join(json.dumps(f"tweet {i}") + "\n" for i in range(10)).encode()
+        output = collect(streaming.stream_predictions(chunked(body[:25], body[25:]), self.analyzer(calls), batch_size=4))
+
+        records = [json.loads(line) for line in output]
+        assert calls == [4, 4, 2]
+        assert [record["tweet_text"] for record in records[:-1]] == [f"tweet {i}" for i in range(10)]
+        assert records[-1]["summary"]["total_processed"] == 10
+        assert collector.get_stats()["sentiment_distribution"]["neutral"] == 10
+
+    def test_failed_sub_batch_reported(self, collector):
+        """Test an inference failure is reported per line and the stream goes on"""
+        calls = []
+
+        async def flaky(texts):
+            calls.append(len(texts))
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return await self.analyzer([])(texts)
+
+        output = collect(streaming.stream_predictions(chunked(b"a\nb\nc\n"), flaky, plain_text=True, batch_size=2))
+        records = [json.loads(line) for line in output]
+        assert ["error" in record for record in records[:3]] == [True, True, False]
+        assert records[-1]["summary"]["errors"] == 2
+        assert collector.get_stats()["total_errors"] == 0
+
+
+class TestSpool:
+    """Test cases for spooling a response until the request body is read"""
+
+    def test_spool_round_trip(self):
+        """Test spooled output is streamed back unchanged, from disk past the memory limit"""
+        chunks = [b"%d\n" % i * 50 for i in range(5000)]
+
+        async def run():
+            spool = await streaming.spool_output(chunked(*chunks), max_memory_bytes=1024)
+            assert spool._rolled
+            return b"".join([block async for block in streaming.iter_spool(spool)]), spool
+
+        body, spool = asyncio.run(run())
+        assert body == b"".join(chunks)
+        assert spool.closed
+
+
+class TestSentimentSummary:
+    """Test cases for constant-memory aggregates"""
+
+    def test_aggregates(self):
+        """Test counts, means, histogram and top-k examples"""
+        summary = streaming.SentimentSummary(bins=4, top_k=2)
+        scored = [("positive", 0.9), ("positive", 0.6), ("negative", 0.3), ("positive", 1.0), ("positive", 0.9)]
+        for line, (sentiment, confidence) in enumerate(scored, start=1):
+            summary.add((line, None, f"t{line}", None), {"sentiment": sentiment, "confidence": confidence})
+        summary.add((6, None, None, "bad line"), None)
+
+        data = summary.to_dict()
+        assert data["total_processed"] == 5
+        assert data["errors"] == 1
+        assert data["sentiment_distribution"] == {"positive": 4, "negative": 1}
+        assert data["mean_confidence"] == 0.74
+        assert data["confidence_histogram"]["counts"] == [0, 1, 1, 3]
+        # Ties keep the earlier line
+        assert [example["line"] for example in data["top_positive"]] == [4, 1]
+        assert data["top_negative"] == [{"line": 3, "tweet_text": "t3", "confidence": 0.3}]
+
+    def test_summarize_stream(self, collector):
+        """Test a streamed body is summarised and recorded in metrics"""
+        async def analyze(texts):
+            return [{"sentiment": "neutral", "confidence": 0.5, "label": "NEU"} for _ in texts]
+
+        body = b"".join(f"tweet {i}\n".encode() for i in range(10))
+        data = asyncio.run(streaming.summarize_predictions(chunked(body), analyze, plain_text=True, batch_size=3))
+        assert data["total_processed"] == 10
+        assert "top_positive" not in data
+        assert collector.get_stats()["sentiment_distribution"]["neutral"] == 10
+
+
+# Run tests with: pytest tests/test_streaming.py -v
@@ -0,0 +1,115 @@
+"""
+Pytest tests for WebSocket scoring
+Tests for PredictionSession in app/websocket_predict.py and /ws/predict
+"""
+import asyncio
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app import websocket_predict
+from app.batching import InferenceOverloadedError
+from app.monitoring import MetricsCollector
+from app.websocket_predict import PredictionSession
+
+
+@pytest.fixture(autouse=True)
+def collector(monkeypatch):
+    """Record WebSocket metrics in a fresh collector"""
+    collector = MetricsCollector()
+    monkeypatch.setattr(websocket_predict, "metrics", collector)
+    return collector
+
+
+def session_client(submit, credit: int = 8) -> TestClient:
+    """Client for an app serving PredictionSession with a fake scorer"""
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def endpoint(websocket: WebSocket):
+        await websocket.accept()
+        await PredictionSession(websocket, submit, credit=credit).run()
+
+    return TestClient(app)
+
+
+async def fake_submit(text):
+    """Scorer where tweets starting with 'slow' take longer"""
+    await asyncio.sleep(0.2 if text.startswith("slow") else 0)
+    return {"sentiment": "positive", "confidence": 0.9, "label": "POS", "tier": "model"}
+
+
+class TestPredictionSession:
+    """Test cases for the WebSocket scoring protocol"""
+
+    def test_results_out_of_order(self, collector):
+        """Test results come back as soon as they are ready, matched by id"""
+        with session_client(fake_submit).websocket_connect("/ws") as ws:
+            assert ws.receive_json() == {"type": "ready", "credit": 8}
+            ws.send_json({"id": "a", "tweet_text": "slow tweet"})
+            ws.send_json([{"id": "b", "tweet_text": "fast tweet"}, "also fast"])
+            results = [ws.receive_json() for _ in range(3)]
+
+        assert [result.get("id") for result in results] == ["b", None, "a"]
+        assert results[2]["line"] == 1 and results[2]["sentiment"] == "positive"
+        assert collector.get_stats()["sentiment_distribution"] == {"positive": 3}
+
+    def test_invalid_tweets_answered(self):
+        """Test invalid frames and tweets get an error result each"""
+        with session_client(fake_submit).websocket_connect("/ws") as ws:
+            ws.receive_json()
+            ws.send_text("not json")
+            ws.send_json([{"id": 1, "tweet_text": "   "}, {"id": 2}])
+            results = [ws.receive_json() for _ in range(3)]
+
+        assert all("error" in result for result in results)
+        assert [result.get("id") for result in results] == [None, 1, 2]
+
+    def test_credit_exceeded_closes(self):
+        """Test a client sending past its credit is disconnected"""
+        async def never(text):
+            await asyncio.Event().wait()
+
+        with session_client(never, credit=2).websocket_connect("/ws") as ws:
+            ws.receive_json()
+            ws.send_json(["one", "two", "three"])
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                ws.receive_json()
+        assert exc_info.value.code == 1008
+
+    def test_credit_returned_by_results(self):
+        """Test each result frees one credit for the next tweet"""
+        with session_client(fake_submit, credit=1).websocket_connect("/ws") as ws:
+            ws.receive_json()
+            for i in range(5):
+                ws.send_json({"id": i, "tweet_text": f"tweet {i}"})
+                assert ws.receive_json()["id"] == i
+
+    def test_overloaded_tweet_rejected(self):
+        """Test an overloaded server rejects single tweets, not the connection"""
+        async def overloaded(text):
+            raise InferenceOverloadedError()
+
+        with session_client(overloaded).websocket_connect("/ws") as ws:
+            ws.receive_json()
+            ws.send_json({"id": 7, "tweet_text": "hello"})
+            result = ws.receive_json()
+        assert result["id"] == 7
+        assert "retry" in result["error"]
+
+
+class TestWebSocketEndpoint:
+    """Test cases for /ws/predict"""
+
+    def test_ws_predict(self):
+        """Test the endpoint scores tweets with the real engine"""
+        from app.main import app
+        with TestClient(app).websocket_connect("/ws/predict") as ws:
+            assert ws.receive_json()["type"] == "ready"
+            ws.send_json([{"id": i, "tweet_text": f"live tweet {i}"} for i in range(3)])
+            results = [ws.receive_json() for _ in range(3)]
+        assert sorted(result["id"] for result in results) == [0, 1, 2]
+        assert all(result["sentiment"] in ("positive", "negative", "neutral") for result in results)
+
+
+# Run tests with: pytest tests/test_websocket_predict.py -v
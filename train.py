@@ -14,7 +14,8 @@ from transformers import (
     DistilBertForSequenceClassification,
     Trainer,
     TrainingArguments,
-    EarlyStoppingCallback
+    EarlyStoppingCallback,
+    DataCollatorWithPadding
 )
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support, classification_report
@@ -44,10 +45,10 @@ class SentimentDataset(Dataset):
         text = str(self.texts[idx])
         label = self.labels[idx]
         
+        # Padding is applied per batch by DataCollatorWithPadding
         encoding = self.tokenizer(
             text,
             truncation=True,
-            padding='max_length',
             max_length=self.max_length,
             return_tensors='pt'
         )
@@ -215,6 +216,7 @@ def train_distilbert(
         train_dataset=train_dataset,
         eval_dataset=test_dataset,
         compute_metrics=compute_metrics,
+        data_collator=DataCollatorWithPadding(tokenizer),
         callbacks=[EarlyStoppingCallback(early_stopping_patience=2)]
     )
     
@@ -32,6 +32,8 @@ st.set_page_config(
 # API endpoint configuration from environment variables
 API_URL = os.getenv("API_URL", os.getenv("FASTAPI_URL", "http://localhost:8000"))
 API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))  # Default 30 seconds
+# Files with more tweets are scored as background jobs instead of /predict/file
+FILE_JOB_THRESHOLD = int(os.getenv("FILE_JOB_THRESHOLD", "10000"))
 
 # Custom CSS
 st.markdown("""
@@ -231,6 +233,155 @@ def analyze_batch(tweets: List[str], api_url: Optional[str] = None) -> Optional[
         st.error(f"❌ Unexpected error: {str(e)}")
         return None
 
+def _records_to_results(records: List[Dict]) -> Dict:
+    """Drop records the API could not analyze and warn about them."""
+    results = [record for record in records if 'error' not in record]
+    skipped = len(records) - len(results)
+    if skipped:
+        st.warning(f"⚠️ Skipped {skipped} tweet(s) that could not be analyzed")
+    return {'results': results, 'total_processed': len(results)}
+
+def score_file(file_bytes: bytes, filename: str, api_url: Optional[str] = None) -> Optional[Dict]:
+    """
+    Score a CSV/JSON file with the /predict/file endpoint.
+    
+    The API parses the file and scores it in one request; results are
+    read as NDJSON while they stream back. If the file is malformed part
+    way through, the records scored before the error are returned.
+    
+    Args:
+        file_bytes: Raw uploaded file
+        filename: Uploaded file name (the API detects the format from it)
+        api_url: Optional API URL override
+    
+    Returns:
+        Dict with 'results' and 'total_processed', or None if error
+    """
+    url: str = api_url or st.session_state.get('api_url', API_URL) or API_URL
+    
+    try:
+        with requests.post(
+            f"{url}/predict/file",
+            params={"filename": filename, "output": "ndjson"},
+            data=file_bytes,
+            timeout=max(API_TIMEOUT, 60),
+            headers={"Content-Type": "application/octet-stream"},
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                error_msg = response.json().get('detail', response.text) if response.headers.get('content-type', '').startswith('application/json') else response.text
+                st.error(f"❌ API Error ({response.status_code}): {error_msg}")
+                return None
+            records = [json.loads(line) for line in response.iter_lines() if line.strip()]
+        # A file found to be malformed after the response started ends with an error trailer
+        if records and 'records_scored' in records[-1]:
+            trailer = records.pop()
+            st.error(f"❌ The API stopped reading the file after {trailer['records_scored']} record(s): {trailer['error']}")
+        return _records_to_results(records)
+    
+    except requests.exceptions.Timeout:
+        st.error(f"⏱️ Request timeout - File scoring took too long")
+        return None
+    except requests.exceptions.ConnectionError:
+        st.error(f"🔌 Connection error - Could not connect to API at {url}")
+        st.info("💡 Make sure the FastAPI server is running: `uvicorn app.main:app --reload`")
+        return None
+    except Exception as e:
+        st.error(f"❌ Unexpected error: {str(e)}")
+        return None
+
+def submit_file_job(file_bytes: bytes, filename: str, api_url: Optional[str] = None) -> Optional[Dict]:
+    """
+    Submit a CSV/JSON file to the /jobs endpoint for background scoring.
+    
+    Args:
+        file_bytes: Raw uploaded file
+        filename: Uploaded file name (the API detects the format from it)
+        api_url: Optional API URL override
+    
+    Returns:
+        Job status dict or None if error
+    """
+    url: str = api_url or st.session_state.get('api_url', API_URL) or API_URL
+    
+    try:
+        response = requests.post(
+            f"{url}/jobs",
+            params={"filename": filename},
+            data=file_bytes,
+            timeout=max(API_TIMEOUT, 60),
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        
+        if response.status_code == 202:
+            return response.json()
+        else:
+            error_msg = response.json().get('detail', response.text) if response.headers.get('content-type', '').startswith('application/json') else response.text
+            st.error(f"❌ API Error ({response.status_code}): {error_msg}")
+            return None
+            
+    except requests.exceptions.Timeout:
+        st.error(f"⏱️ Request timeout - File upload took too long")
+        return None
+    except requests.exceptions.ConnectionError:
+        st.error(f"🔌 Connection error - Could not connect to API at {url}")
+        return None
+    except Exception as e:
+        st.error(f"❌ Unexpected error: {str(e)}")
+        return None
+
+def wait_for_job(job_id: str, api_url: Optional[str] = None) -> Optional[Dict]:
+    """
+    Poll a bulk scoring job until it finishes and download its results.
+    
+    The job keeps running on the server if this page is closed; its id is
+    shown so the results can be fetched later from /jobs/{job_id}/results.
+    
+    Args:
+        job_id: Job to wait for
+        api_url: Optional API URL override
+    
+    Returns:
+        Dict with 'results' and 'total_processed', or None if error
+    """
+    url: str = api_url or st.session_state.get('api_url', API_URL) or API_URL
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    try:
+        while True:
+            job = requests.get(f"{url}/jobs/{job_id}", timeout=API_TIMEOUT).json()
+            total = job.get('total') or 0
+            if total:
+                progress_bar.progress(min(job.get('records_done', 0) / total, 1.0))
+            status_text.text(f"Job {job_id}: {job.get('state')} ({job.get('records_done', 0)}/{total or '?'} tweets)")
+            
+            if job.get('state') == 'failed':
+                st.error(f"❌ Job failed: {job.get('error')}")
+                return None
+            if job.get('state') == 'completed':
+                break
+            time.sleep(1)
+        
+        response = requests.get(
+            f"{url}/jobs/{job_id}/results",
+            params={"format": "ndjson"},
+            timeout=max(API_TIMEOUT, 60)
+        )
+        records = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+        return _records_to_results(records)
+    
+    except requests.exceptions.ConnectionError:
+        st.error(f"🔌 Connection error - Could not connect to API at {url}")
+        st.info(f"💡 The job keeps running on the server. Job id: `{job_id}`")
+        return None
+    except Exception as e:
+        st.error(f"❌ Unexpected error: {str(e)}")
+        return None
+    finally:
+        status_text.empty()
+        progress_bar.empty()
+
 def load_tweets_from_json(file_path: Path) -> List[Dict]:
     """Load tweets from JSON file."""
     try:
@@ -611,39 +762,17 @@ def main():
                     
                     # Analysis button
                     if st.button("🚀 Analyze All Tweets", type="primary", use_container_width=True):
-                        # Process in batches if too many
-                        if len(tweet_texts) > 100:
-                            st.warning(f"⚠️ File contains {len(tweet_texts)} tweets. Processing in batches of 100.")
-                            
-                            all_results = []
-                            total_batches = (len(tweet_texts) + 99) // 100
-                            
-                            progress_bar = st.progress(0)
-                            status_text = st.empty()
-                            
-                            for i in range(0, len(tweet_texts), 100):
-                                batch = tweet_texts[i:i+100]
-                                batch_num = (i // 100) + 1
-                                
-                                status_text.text(f"Processing batch {batch_num}/{total_batches}...")
-                                results = analyze_batch(batch)
-                                
-                                if results:
-                                    all_results.extend(results.get('results', []))
-                                
-                                progress_bar.progress(min((i + 100) / len(tweet_texts), 1.0))
-                            
-                            status_text.empty()
-                            progress_bar.empty()
-                            
-                            if all_results:
-                                results = {'results': all_results, 'total_processed': len(all_results)}
-                            else:
-                                st.error("❌ Failed to process tweets")
-                                results = None
+                        # The API parses and scores the file; very large files run as a background job
+                        if len(tweet_texts) > FILE_JOB_THRESHOLD:
+                            st.info(f"ℹ️ File contains {len(tweet_texts)} tweets. Scoring it as a background job.")
+                            job = submit_file_job(uploaded_file.getvalue(), uploaded_file.name)
+                            results = None
+                            if job:
+                                st.caption(f"Job id: `{job['job_id']}` (keeps running if this page is closed)")
+                                results = wait_for_job(job['job_id'])
                         else:
                             with st.spinner(f"🔄 Analyzing {len(tweet_texts)} tweet(s)..."):
-                                results = analyze_batch(tweet_texts)
+                                results = score_file(uploaded_file.getvalue(), uploaded_file.name)
                         
                         if results:
                             results_list = results.get('results', [])